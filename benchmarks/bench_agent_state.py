@@ -0,0 +1,117 @@
+"""
+心跳处理微基准 - 比较旧的字典客户端状态和AgentState
+
+测量每次心跳处理耗时（取多轮最小值）和每个agent的内存占用。
+日志级别调为WARNING、跳过指标历史记录，只比较客户端状态本身的开销。
+
+用法: python benchmarks/bench_agent_state.py [--agents 10000] [--beats 200000]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from server.heartbeat_server import HeartbeatServer, HeartbeatMessage
+
+SYSTEM_INFO = {
+    "type": "system_info",
+    "machine_name": "agent-host",
+    "os_version": "Linux 6.1",
+    "cpu_usage": 12.5,
+    "memory_total": 16 * 1024 ** 3,
+    "memory_used": 6 * 1024 ** 3,
+    "disk_total": 512 * 1024 ** 3,
+    "disk_used": 128 * 1024 ** 3,
+    "network_upload": 12.3,
+    "network_download": 45.6
+}
+
+
+def make_heartbeats(agents: int):
+    """每个agent一条system_info心跳（machine_name各不相同）和一个连接地址"""
+    return [(HeartbeatMessage(code=200, data=json.dumps(dict(SYSTEM_INFO, machine_name=f"agent-{i}"))),
+             ("10.0.0.1", 10000 + i)) for i in range(agents)]
+
+
+def legacy_process_heartbeat(clients: dict, heartbeat: HeartbeatMessage, client_address: tuple):
+    """旧实现：每次心跳两次datetime格式化并用新字典update"""
+    client_id = f"{client_address[0]}:{client_address[1]}"
+    if isinstance(heartbeat.data, dict):
+        data_obj = heartbeat.data
+    elif isinstance(heartbeat.data, str):
+        data_obj = json.loads(heartbeat.data)
+    else:
+        data_obj = None
+
+    if client_id not in clients:
+        clients[client_id] = {}
+    clients[client_id].update({
+        "last_heartbeat": datetime.now().isoformat(),
+        "code": heartbeat.code,
+        "data": data_obj,
+        "client_address": client_address,
+        "server_received_time": datetime.now().isoformat()
+    })
+    if isinstance(data_obj, dict) and data_obj.get('type') == 'system_info':
+        clients[client_id]["system_info"] = data_obj
+
+
+def bench_cpu(process, beats: int, agents: int, rounds: int = 5) -> float:
+    """返回每次心跳的平均耗时（微秒，多轮取最小值）"""
+    heartbeats = make_heartbeats(agents)
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for i in range(beats):
+            process(*heartbeats[i % agents])
+        best = min(best, time.perf_counter() - start)
+    return best / beats * 1e6
+
+
+def bench_memory(process, agents: int) -> float:
+    """返回每个agent状态的平均内存占用（字节）"""
+    heartbeats = make_heartbeats(agents)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for heartbeat, address in heartbeats:
+        process(heartbeat, address)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / agents
+
+
+def main():
+    parser = argparse.ArgumentParser(description="心跳处理微基准")
+    parser.add_argument("--agents", type=int, default=10000, help="agent数量")
+    parser.add_argument("--beats", type=int, default=200000, help="每轮心跳次数")
+    args = parser.parse_args()
+
+    def new_server():
+        server = HeartbeatServer()
+        server.logger.setLevel(logging.WARNING)
+        server.metrics.record = lambda agent_id, system_info: None
+        return server
+
+    legacy_clients = {}
+    legacy = lambda heartbeat, address: legacy_process_heartbeat(legacy_clients, heartbeat, address)
+    current = new_server()._process_heartbeat
+
+    print(f"agents={args.agents}, beats={args.beats}")
+    print(f"每次心跳耗时(us):  旧实现 {bench_cpu(legacy, args.beats, args.agents):.2f}  "
+          f"AgentState {bench_cpu(current, args.beats, args.agents):.2f}")
+
+    legacy_clients = {}
+    print(f"每个agent内存(B):  旧实现 {bench_memory(legacy, args.agents):.0f}  "
+          f"AgentState {bench_memory(new_server()._process_heartbeat, args.agents):.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+心跳服务器负载基准 - 模拟N个agent通过TCP长连接上报带system_info的心跳
+
+被测服务器（run_server.py）在子进程中运行；每个agent一个连接，按固定间隔发送心跳并等待确认，
+测量从发送到收到确认的延迟、确认吞吐量，以及服务器进程的CPU和RSS。
+间隔为0时每个agent收到确认后立即发送下一条（闭环压测，测最大吞吐量）。
+--workers大于1时被测服务器运行多个心跳进程（SO_REUSEPORT），CPU和RSS为所有进程之和。
+--codec binary时使用二进制心跳帧（见src/utils/codec.py），与json比较服务器的编解码开销。
+
+用法: python benchmarks/bench_heartbeat_load.py [--agents 1000] [--interval 1] [--duration 30] [--engine thread]
+      [--workers 4] [--codec binary]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadgen import (ROOT, ResourceSampler, free_port, latency_summary, print_results, raise_fd_limit,
+                     server_process, write_results)
+
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from utils.codec import decode_response, encode_system_info
+
+# 二进制确认帧的长度（帧头 + int32 code）
+BINARY_RESPONSE_SIZE = 8
+
+
+def make_heartbeat(agent_index: int, rng: random.Random, codec: str = "json") -> bytes:
+    """一条system_info心跳（json为换行结尾的JSON，binary为二进制帧），指标随机变化"""
+    memory_total = 16 * 1024 ** 3
+    disk_total = 512 * 1024 ** 3
+    agent_id = f"bench-agent-{agent_index}"
+    message = {
+        "code": 200,
+        "agent_id": agent_id,
+        "data": {
+            "type": "system_info",
+            "machine_name": f"bench-host-{agent_index}",
+            "os_version": "Linux 6.1",
+            "cpu_usage": round(rng.uniform(0, 100), 1),
+            "memory_total": memory_total,
+            "memory_used": int(memory_total * rng.uniform(0.2, 0.9)),
+            "disk_total": disk_total,
+            "disk_used": int(disk_total * rng.uniform(0.1, 0.8)),
+            "network_upload": round(rng.uniform(0, 100), 2),
+            "network_download": round(rng.uniform(0, 500), 2)
+        }
+    }
+    if codec == "binary":
+        return encode_system_info(message["data"], agent_id)
+    return json.dumps(message).encode("utf-8") + b"\n"
+
+
+class HeartbeatLoad:
+    """在一个事件循环中运行所有agent"""
+
+    def __init__(self, host: str, port: int, agents: int, interval: float, duration: float, warmup: float,
+                 codec: str = "json"):
+        self.host = host
+        self.port = port
+        self.agents = agents
+        self.interval = interval
+        self.duration = duration
+        self.warmup = warmup
+        self.codec = codec
+        self.latencies = []
+        self.acks = 0
+        self.errors = 0
+        self.connect_failures = 0
+        self.measure_start = 0.0
+        self.measure_end = 0.0
+        self._attempted = 0  # 已完成的连接尝试数（成功或失败）
+        self._all_attempted = None
+        self._ready = None
+
+    async def _read_ack(self, reader: asyncio.StreamReader) -> bool:
+        """读取一条回复，返回是否为确认；连接关闭时抛出EOFError"""
+        if self.codec == "binary":
+            return decode_response(await reader.readexactly(BINARY_RESPONSE_SIZE)) == 0
+        line = await reader.readline()
+        if not line:
+            raise EOFError
+        return line.startswith(b'{"code": 0')
+
+    def _attempt_done(self):
+        self._attempted += 1
+        if self._attempted == self.agents:
+            self._all_attempted.set()
+
+    async def _agent(self, index: int):
+        rng = random.Random(index)
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        except OSError:
+            self.connect_failures += 1
+            self._attempt_done()
+            return
+        self._attempt_done()
+        try:
+            await self._ready.wait()
+            # 错开各agent的第一次心跳
+            if self.interval > 0:
+                await asyncio.sleep(rng.uniform(0, self.interval))
+            next_send = time.monotonic()
+            while True:
+                now = time.monotonic()
+                if now >= self.measure_end:
+                    break
+                start = time.perf_counter()
+                writer.write(make_heartbeat(index, rng, self.codec))
+                await writer.drain()
+                try:
+                    acked = await self._read_ack(reader)
+                except EOFError:
+                    # 包括asyncio.IncompleteReadError
+                    self.errors += 1
+                    break
+                elapsed = time.perf_counter() - start
+                if now >= self.measure_start:
+                    if acked:
+                        self.acks += 1
+                        self.latencies.append(elapsed)
+                    else:
+                        self.errors += 1
+                if self.interval > 0:
+                    next_send += self.interval
+                    await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+        except OSError:
+            self.errors += 1
+        finally:
+            writer.close()
+
+    async def run(self, on_measure_start):
+        """建立所有连接后开始发送，预热结束时调用on_measure_start（开始采样服务器资源）"""
+        self._all_attempted = asyncio.Event()
+        self._ready = asyncio.Event()
+        tasks = [asyncio.create_task(self._agent(i)) for i in range(self.agents)]
+        await self._all_attempted.wait()
+        self.measure_start = time.monotonic() + self.warmup
+        self.measure_end = self.measure_start + self.duration
+        self._ready.set()
+        await asyncio.sleep(self.warmup)
+        on_measure_start()
+        await asyncio.gather(*tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="心跳服务器负载基准")
+    parser.add_argument("--agents", type=int, default=1000, help="模拟的agent数（每个agent一个连接）")
+    parser.add_argument("--interval", type=float, default=1.0, help="每个agent的心跳间隔（秒），0为闭环压测")
+    parser.add_argument("--duration", type=float, default=30.0, help="测量时长（秒）")
+    parser.add_argument("--warmup", type=float, default=3.0, help="预热时长（秒），不计入结果")
+    parser.add_argument("--engine", choices=("thread", "asyncio"), default="thread", help="被测服务器的运行引擎")
+    parser.add_argument("--workers", type=int, default=1, help="被测服务器的心跳进程数")
+    parser.add_argument("--codec", choices=("json", "binary"), default="json", help="心跳编码")
+    parser.add_argument("--port", type=int, default=0, help="被测服务器端口（默认自动分配）")
+    parser.add_argument("--output", help="结果文件路径（默认 benchmarks/results/ 下）")
+    args = parser.parse_args()
+
+    host = "127.0.0.1"
+    port = args.port or free_port()
+    raise_fd_limit(args.agents + 100)
+    params = {"agents": args.agents, "interval": args.interval, "duration": args.duration,
+              "warmup": args.warmup, "engine": args.engine, "workers": args.workers,
+              "codec": args.codec}
+    print(f"心跳负载基准: {params}")
+
+    server_args = ["--host", host, "--port", str(port), "--engine", args.engine, "--workers", str(args.workers)]
+    with server_process("run_server.py", server_args, host, port) as process:
+        sampler = ResourceSampler(process.pid, include_children=args.workers > 1)
+        client_cpu_start = []
+
+        def measure_start():
+            sampler.start()
+            client_cpu_start.append(time.process_time())
+
+        load = HeartbeatLoad(host, port, args.agents, args.interval, args.duration, args.warmup, args.codec)
+        asyncio.run(load.run(measure_start))
+        server = sampler.stop()
+        # 负载生成器自身接近100%时，结果受客户端限制
+        client_cpu = time.process_time() - client_cpu_start[0]
+
+    results = {
+        "throughput_per_sec": round(load.acks / args.duration, 1),
+        "acks": load.acks,
+        "errors": load.errors,
+        "connect_failures": load.connect_failures,
+        "latency_ms": latency_summary(load.latencies),
+        "server": server,
+        "client_cpu_seconds": round(client_cpu, 3)
+    }
+    print_results(results)
+    print(f"结果已保存: {write_results('heartbeat', params, results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+任务分发负载基准 - 通过 /tasks/add 投递任务，模拟M个worker在 /worker2/command 上长轮询领取并提交结果
+
+被测服务器（run_http_server.py）在子进程中运行。测量任务吞吐量、端到端延迟（投递到结果提交完成）、
+分发延迟（投递到被领取）、投递/领取/提交请求的延迟，以及服务器进程的CPU和RSS。
+--rate为0时按--backlog保持固定数量的未完成任务（闭环压测，测最大吞吐量）。
+
+用法: python benchmarks/bench_worker_poll.py [--workers 8] [--rate 0] [--duration 30] [--dispatch-mode concurrent]
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadgen import ResourceSampler, free_port, latency_summary, print_results, server_process, write_results
+
+
+class WorkerPollLoad:
+    """投递线程和worker线程共享的计数和延迟样本（list.append和dict操作在GIL下是原子的）"""
+
+    def __init__(self, host: str, port: int, args: argparse.Namespace):
+        self.host = host
+        self.port = port
+        self.args = args
+        # 命令 -> 投递时间（perf_counter）；按命令记录，因为worker可能在投递请求返回任务ID之前就领取到任务
+        self.added_at = {}
+        self.completed = 0
+        self.errors = 0
+        self.latencies = {"end_to_end": [], "dispatch": [], "add_request": [], "poll_request": [],
+                          "complete_request": []}
+        self.outstanding = threading.BoundedSemaphore(args.backlog)
+        self.measure_start = 0.0
+        self.measure_end = 0.0
+        self.stopped = threading.Event()
+
+    def _measuring(self, now: float) -> bool:
+        return self.measure_start <= now < self.measure_end
+
+    def _request(self, conn: http.client.HTTPConnection, method: str, path: str, body=None):
+        """发送请求并返回 (状态码, JSON响应, 耗时)"""
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        start = time.perf_counter()
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        return response.status, json.loads(data), time.perf_counter() - start
+
+    def feeder(self):
+        """按rate投递任务；rate为0时在未完成任务少于backlog时立即投递"""
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        interval = 1 / self.args.rate if self.args.rate > 0 else 0
+        next_add = time.monotonic()
+        sequence = 0
+        while not self.stopped.is_set():
+            if interval:
+                next_add += interval
+                delay = next_add - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            elif not self.outstanding.acquire(timeout=0.1):
+                continue
+            sequence += 1
+            command = f"bench-{sequence}"
+            try:
+                self.added_at[command] = time.perf_counter()
+                status, body, elapsed = self._request(conn, "POST", "/tasks/add",
+                                                      {"command": command, "priority": "normal"})
+                if status != 200:
+                    raise ValueError(f"投递失败: {status}")
+                if self._measuring(time.monotonic()):
+                    self.latencies["add_request"].append(elapsed)
+            except (OSError, http.client.HTTPException, ValueError):
+                self.errors += 1
+                self.added_at.pop(command, None)
+                if not interval:
+                    self.outstanding.release()
+                conn.close()
+        conn.close()
+
+    def worker(self, index: int):
+        """长轮询领取任务（--batch大于1时批量领取），立即提交结果"""
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.args.wait + 30)
+        worker_id = f"bench-worker-{index}"
+        query = {"worker_id": worker_id, "wait": self.args.wait}
+        if self.args.batch > 1:
+            query["max"] = self.args.batch
+        poll_path = "/worker2/command?" + urlencode(query)
+        while not self.stopped.is_set():
+            try:
+                status, body, elapsed = self._request(conn, "GET", poll_path)
+                claimed_at = time.perf_counter()
+                if status != 200:
+                    self.errors += 1
+                    continue
+                data = body["data"]
+                tasks = data["tasks"] if "tasks" in data else ([data] if data.get("task_id") else [])
+                if not tasks:
+                    continue
+                measuring = self._measuring(time.monotonic())
+                if measuring:
+                    self.latencies["poll_request"].append(elapsed)
+                    for task in tasks:
+                        added = self.added_at.get(task["command"])
+                        if added is not None:
+                            self.latencies["dispatch"].append(claimed_at - added)
+                self._complete(conn, tasks)
+            except (OSError, http.client.HTTPException, ValueError):
+                self.errors += 1
+                conn.close()
+        conn.close()
+
+    def _complete(self, conn: http.client.HTTPConnection, tasks):
+        if self.args.batch > 1:
+            results = [{"task_id": task["task_id"], "command_result": "ok"} for task in tasks]
+            status, body, elapsed = self._request(conn, "POST", "/worker2/results", {"results": results})
+            done = body["data"]["completed"] if status == 200 else []
+        else:
+            task_id = tasks[0]["task_id"]
+            path = "/worker2/command?" + urlencode({"task_id": task_id, "command_result": "ok"})
+            status, body, elapsed = self._request(conn, "GET", path)
+            done = [task_id] if status == 200 else []
+        finished_at = time.perf_counter()
+        self.errors += len(tasks) - len(done)
+        measuring = self._measuring(time.monotonic())
+        if measuring:
+            self.latencies["complete_request"].append(elapsed)
+        commands = {task["task_id"]: task["command"] for task in tasks}
+        for task_id in done:
+            added = self.added_at.pop(commands.get(task_id), None)
+            if measuring:
+                self.completed += 1
+                if added is not None:
+                    self.latencies["end_to_end"].append(finished_at - added)
+            if self.args.rate <= 0:
+                try:
+                    self.outstanding.release()
+                except ValueError:
+                    pass
+
+    def run(self, on_measure_start):
+        """运行预热和测量，预热结束时调用on_measure_start"""
+        threads = [threading.Thread(target=self.worker, args=(i,), daemon=True) for i in range(self.args.workers)]
+        threads.append(threading.Thread(target=self.feeder, daemon=True))
+        self.measure_start = time.monotonic() + self.args.warmup
+        self.measure_end = self.measure_start + self.args.duration
+        for thread in threads:
+            thread.start()
+        time.sleep(self.args.warmup)
+        on_measure_start()
+        time.sleep(max(0.0, self.measure_end - time.monotonic()))
+        self.stopped.set()
+        for thread in threads:
+            thread.join(timeout=self.args.wait + 5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="任务分发负载基准")
+    parser.add_argument("--workers", type=int, default=8, help="模拟的worker数（每个worker一个线程和连接）")
+    parser.add_argument("--rate", type=float, default=0, help="每秒投递的任务数，0为按backlog闭环投递")
+    parser.add_argument("--backlog", type=int, default=64, help="闭环投递时最多未完成的任务数")
+    parser.add_argument("--batch", type=int, default=1, help="每次最多领取的任务数，大于1时批量领取并批量提交")
+    parser.add_argument("--wait", type=float, default=1.0, help="长轮询等待时间（秒）")
+    parser.add_argument("--duration", type=float, default=30.0, help="测量时长（秒）")
+    parser.add_argument("--warmup", type=float, default=3.0, help="预热时长（秒），不计入结果")
+    parser.add_argument("--dispatch-mode", choices=("serial", "concurrent"), default="concurrent",
+                        help="被测服务器的任务分发模式")
+    parser.add_argument("--max-tasks-per-worker", type=int, default=4, help="concurrent模式下每个worker最多进行中的任务数")
+    parser.add_argument("--task-store", choices=("memory", "sqlite"), default="memory", help="被测服务器的任务存储")
+    parser.add_argument("--port", type=int, default=0, help="被测服务器端口（默认自动分配）")
+    parser.add_argument("--output", help="结果文件路径（默认 benchmarks/results/ 下）")
+    args = parser.parse_args()
+
+    host = "127.0.0.1"
+    port = args.port or free_port()
+    params = {key: value for key, value in vars(args).items() if key not in ("port", "output")}
+    print(f"任务分发负载基准: {params}")
+
+    server_args = ["--host", host, "--port", str(port), "--no-input", "--dispatch-mode", args.dispatch_mode,
+                   "--max-tasks-per-worker", str(args.max_tasks_per_worker), "--task-store", args.task_store]
+    with server_process("run_http_server.py", server_args, host, port) as process:
+        sampler = ResourceSampler(process.pid)
+        client_cpu_start = []
+
+        def measure_start():
+            sampler.start()
+            client_cpu_start.append(time.process_time())
+
+        load = WorkerPollLoad(host, port, args)
+        load.run(measure_start)
+        server = sampler.stop()
+        client_cpu = time.process_time() - client_cpu_start[0]
+
+    results = {
+        "throughput_per_sec": round(load.completed / args.duration, 1),
+        "completed": load.completed,
+        "errors": load.errors,
+        **{f"{name}_ms": latency_summary(samples) for name, samples in load.latencies.items()},
+        "server": server,
+        "client_cpu_seconds": round(client_cpu, 3)
+    }
+    print_results(results)
+    print(f"结果已保存: {write_results('worker_poll', params, results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
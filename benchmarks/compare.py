@@ -0,0 +1,63 @@
+"""
+比较两次负载基准的结果 - 逐项列出数值指标和变化百分比
+
+用法: python benchmarks/compare.py <基线结果.json> <新结果.json>
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Any
+
+# 越大越好的指标，其余（延迟、CPU、内存、错误数）越小越好
+HIGHER_IS_BETTER = ("throughput_per_sec", "acks", "completed", "count")
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """把嵌套的结果展开为 "latency_ms.p99" 形式的键"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较两次负载基准的结果")
+    parser.add_argument("baseline", help="基线结果文件")
+    parser.add_argument("candidate", help="新结果文件")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    if baseline["benchmark"] != candidate["benchmark"]:
+        sys.exit(f"基准类型不同: {baseline['benchmark']} / {candidate['benchmark']}")
+    if baseline["params"] != candidate["params"]:
+        print("注意: 两次运行的参数不同")
+        for key in sorted(set(baseline["params"]) | set(candidate["params"])):
+            if baseline["params"].get(key) != candidate["params"].get(key):
+                print(f"  {key}: {baseline['params'].get(key)} -> {candidate['params'].get(key)}")
+
+    print(f"{baseline['benchmark']}: {baseline['commit']} -> {candidate['commit']}")
+    old, new = flatten(baseline["results"]), flatten(candidate["results"])
+    width = max(len(key) for key in old) if old else 10
+    for key in old:
+        if key not in new:
+            continue
+        before, after = old[key], new[key]
+        if before:
+            change = (after - before) / abs(before) * 100
+            better = (change > 0) == key.endswith(HIGHER_IS_BETTER)
+            mark = "" if abs(change) < 1 else (" +" if better else " -")
+            print(f"{key:<{width}}  {before:>12g}  {after:>12g}  {change:+7.1f}%{mark}")
+        else:
+            print(f"{key:<{width}}  {before:>12g}  {after:>12g}")
+
+
+if __name__ == "__main__":
+    main()
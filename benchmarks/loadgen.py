@@ -0,0 +1,256 @@
+"""
+负载基准公共部分 - 启动被测服务器子进程、采样CPU/RSS、统计延迟分位数、保存和比较结果
+
+被测服务器通过仓库的入口脚本（run_server.py / run_http_server.py）在子进程中启动，
+负载生成器在本进程中运行，两者的CPU互不计入。结果保存为JSON（含git提交），用 compare.py 比较。
+"""
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Sequence
+
+try:
+    import psutil
+except ImportError:  # psutil为可选依赖，未安装时在Linux上读取/proc
+    psutil = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def free_port() -> int:
+    """分配一个本机空闲端口"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(host: str, port: int, process: subprocess.Popen, timeout: float = 15):
+    """等待服务器开始监听，子进程提前退出或超时时抛出RuntimeError"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"被测服务器启动失败（退出码 {process.returncode}）")
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"等待 {host}:{port} 超时")
+
+
+@contextmanager
+def server_process(script: str, args: Sequence[str], host: str, port: int):
+    """在子进程中运行仓库的入口脚本，退出时发送SIGINT（Ctrl+C）并等待结束
+
+    日志目录、SQLite任务存储和多进程模式的agent注册表默认相对于项目根目录（与工作目录无关），
+    这里通过环境变量（LOG_DIR、DB_PATH、AGENT_REGISTRY_DIR）指向子进程专用的临时目录，结束后删除，
+    基准测试不会写入仓库，也不会读到上一次运行留下的任务。
+    """
+    workdir = tempfile.mkdtemp(prefix="mcp-bench-")
+    env = dict(os.environ,
+               LOG_DIR=os.path.join(workdir, "logs"),
+               DB_PATH=os.path.join(workdir, "data", "heartbeat.db"),
+               AGENT_REGISTRY_DIR=os.path.join(workdir, "data", "agent_registry"))
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, script), *args], cwd=workdir, env=env,
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(host, port, process)
+        yield process
+    finally:
+        if process.poll() is None:
+            process.send_signal(2)
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+class ResourceSampler:
+    """后台线程定期采样进程的CPU时间和RSS，include_children时包括所有子进程（多进程心跳服务器）"""
+
+    def __init__(self, pid: int, interval: float = 0.5, include_children: bool = False):
+        self.pid = pid
+        self.interval = interval
+        self.include_children = include_children
+        self.rss_samples: List[int] = []
+        self._cpu_start = None
+        self._cpu_end = None
+        self._wall_start = 0.0
+        self._wall_end = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._process = psutil.Process(pid) if psutil is not None else None
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    @staticmethod
+    def _stat_fields(pid: int) -> List[str]:
+        with open(f"/proc/{pid}/stat") as f:
+            # 第二个字段（进程名）可能包含空格，从右括号之后开始拆分
+            return f.read().rsplit(")", 1)[1].split()
+
+    def _children(self) -> List[int]:
+        """所有子孙进程的pid"""
+        if self._process is not None:
+            return [child.pid for child in self._process.children(recursive=True)]
+        parents = {}
+        for name in os.listdir("/proc"):
+            if name.isdigit():
+                try:
+                    parents[int(name)] = int(self._stat_fields(int(name))[1])
+                except (OSError, IndexError, ValueError):
+                    continue
+        pids = [self.pid]
+        for pid in pids:
+            pids.extend(child for child, parent in parents.items() if parent == pid)
+        return pids[1:]
+
+    def _read_pid(self, pid: int):
+        if psutil is not None:
+            process = self._process if pid == self.pid else psutil.Process(pid)
+            times = process.cpu_times()
+            return times.user + times.system, process.memory_info().rss
+        fields = self._stat_fields(pid)
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+        return (int(fields[11]) + int(fields[12])) / self._ticks, rss_pages * self._page_size
+
+    def _read(self):
+        """返回 (CPU秒数, RSS字节)，无法读取时返回 (None, None)"""
+        try:
+            cpu, rss = self._read_pid(self.pid)
+        except Exception:
+            # 进程已退出（OSError、psutil.NoSuchProcess）或/proc格式不同
+            return None, None
+        if self.include_children:
+            try:
+                children = self._children()
+            except Exception:
+                children = []
+            for child in children:
+                try:
+                    child_cpu, child_rss = self._read_pid(child)
+                except Exception:
+                    continue
+                cpu += child_cpu
+                rss += child_rss
+        return cpu, rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            _, rss = self._read()
+            if rss is not None:
+                self.rss_samples.append(rss)
+
+    def start(self):
+        self._cpu_start, rss = self._read()
+        if rss is not None:
+            self.rss_samples.append(rss)
+        self._wall_start = time.monotonic()
+        self._thread.start()
+
+    def stop(self) -> Dict[str, Any]:
+        """停止采样，返回测量期间的CPU使用率（单核为100%）和RSS"""
+        self._cpu_end, rss = self._read()
+        self._wall_end = time.monotonic()
+        self._stop.set()
+        self._thread.join()
+        if rss is not None:
+            self.rss_samples.append(rss)
+        if self._cpu_start is None or self._cpu_end is None:
+            return {"cpu_seconds": None, "cpu_percent": None, "rss_max_mb": None, "rss_end_mb": None}
+        cpu_seconds = self._cpu_end - self._cpu_start
+        wall = max(self._wall_end - self._wall_start, 1e-9)
+        return {
+            "cpu_seconds": round(cpu_seconds, 3),
+            "cpu_percent": round(cpu_seconds / wall * 100, 1),
+            "rss_max_mb": round(max(self.rss_samples) / 1024 ** 2, 1),
+            "rss_end_mb": round(self.rss_samples[-1] / 1024 ** 2, 1)
+        }
+
+
+def latency_summary(samples: List[float]) -> Dict[str, Any]:
+    """延迟样本（秒）的统计，单位毫秒"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    count = len(ordered)
+
+    def percentile(q: float) -> float:
+        # 最近秩法
+        return round(ordered[min(count - 1, max(0, int(q * count + 0.5) - 1))] * 1000, 3)
+
+    return {
+        "count": count,
+        "mean": round(sum(ordered) / count * 1000, 3),
+        "p50": percentile(0.5),
+        "p99": percentile(0.99),
+        "p999": percentile(0.999),
+        "max": round(ordered[-1] * 1000, 3)
+    }
+
+
+def raise_fd_limit(needed: int):
+    """连接数较多时把打开文件数的软限制提高到硬限制"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard == resource.RLIM_INFINITY else min(hard, needed * 2), hard))
+
+
+def git_commit() -> Optional[str]:
+    """当前仓库的提交（工作区有未提交的修改时加 -dirty）"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if not commit:
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def write_results(name: str, params: Dict[str, Any], results: Dict[str, Any], output: Optional[str] = None) -> str:
+    """保存结果，默认保存到 benchmarks/results/<名称>-<提交>-<时间>.json，返回文件路径"""
+    commit = git_commit()
+    now = datetime.now()
+    record = {
+        "benchmark": name,
+        "commit": commit,
+        "timestamp": now.isoformat(timespec="seconds"),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "params": params,
+        "results": results
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{commit or 'nogit'}-{now:%Y%m%d-%H%M%S}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+    return output
+
+
+def print_results(results: Dict[str, Any]):
+    """在控制台打印结果摘要"""
+    for key, value in results.items():
+        if isinstance(value, dict):
+            print(f"{key}: " + ", ".join(f"{k}={v}" for k, v in value.items()))
+        else:
+            print(f"{key}: {value}")
@@ -11,12 +11,25 @@ class ServerConfig:
     # 服务器基本配置
     HOST = os.getenv("HEARTBEAT_HOST", "localhost")
     PORT = int(os.getenv("HEARTBEAT_PORT", "8888"))
+    HEARTBEAT_ENGINE = os.getenv("HEARTBEAT_ENGINE", "thread")  # 运行引擎：thread / asyncio
+    LISTEN_BACKLOG = 1024  # 监听队列长度
+    # 心跳服务器进程数，大于1时多个进程通过SO_REUSEPORT监听同一端口（吞吐量随核数增长）
+    HEARTBEAT_WORKERS = int(os.getenv("HEARTBEAT_WORKERS", "1"))
+    # 多进程模式下各进程发布agent状态的目录（相对路径相对于项目根目录）
+    AGENT_REGISTRY_DIR = os.getenv("AGENT_REGISTRY_DIR", "data/agent_registry")
+    AGENT_REGISTRY_PUBLISH_INTERVAL = 1.0  # 各进程发布agent状态的间隔（秒）
+    # main.py运行方式：threads（MCP在主线程，Flask和心跳服务器各一个线程）/
+    # asyncio（MCP、ASGI HTTP API和心跳服务器运行在同一个事件循环中）
+    RUNTIME_MODE = os.getenv("RUNTIME_MODE", "threads")
 
     # 日志配置
-    LOG_DIR = "logs"
+    LOG_DIR = os.getenv("LOG_DIR", "logs")  # 日志目录（相对路径相对于项目根目录）
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
-    LOG_MAX_BYTES = 10 * 1024 * 1024  # 10MB
+    LOG_MAX_BYTES = 10 * 1024 * 1024  # 10MB，超过后轮转
     LOG_BACKUP_COUNT = 5
+    LOG_QUEUE_SIZE = 10000  # 等待后台线程写入的日志条数上限，队列满时丢弃
+    LOG_RATE_LIMIT = 20  # 同一类高频日志（心跳、请求/轮询）每秒最多记录的条数，任务审计日志不限速
+    LOG_RATE_BURST = 100  # 同一类高频日志允许的突发条数
 
     # 客户端管理配置
     CLIENT_TIMEOUT = 30  # 客户端超时时间（秒）
@@ -24,16 +37,58 @@ class ServerConfig:
 
     # 心跳配置
     EXPECTED_HEARTBEAT_INTERVAL = 5  # 期望的心跳间隔（秒）
-    MAX_MISSED_HEARTBEATS = 3  # 最大丢失心跳次数
+    MAX_MISSED_HEARTBEATS = 3  # 最大丢失心跳次数，超过后客户端状态为late
+    LIVENESS_CHECK_INTERVAL = 1  # 存活检测间隔（秒），超过CLIENT_TIMEOUT没有心跳的客户端为dead并断开连接
+    AGENT_GRACE_PERIOD = 300  # agent断开连接后保留记录的时间（秒），期间重连沿用原来的状态
+
+    # agent指标时间序列配置（每个agent的内存固定，约 (原始样本数+分钟桶数+小时桶数) × 28 字节）
+    METRICS_RAW_SAMPLES = 120  # 每个agent保留的原始样本数（按5秒心跳约10分钟）
+    METRICS_MINUTE_BUCKETS = 60  # 保留的1分钟平均值个数（1小时）
+    METRICS_HOUR_BUCKETS = 48  # 保留的1小时平均值个数（2天）
+    METRICS_MAX_AGENTS = 10000  # 最多保留指标的agent数，超过时淘汰最久没有上报的agent
+    FLEET_MAX_TOP = 100  # 集群聚合查询（/agents/fleet）单次最多返回的agent数
+
+    # read_file工具配置
+    READ_FILE_MAX_BYTES = 256 * 1024  # 单次读取返回的最大字节数
+    READ_FILE_MAX_MATCHES = 1000  # 单次搜索最多返回的匹配行数
+    READ_FILE_CACHE_SIZE = 16  # 缓存行索引的文件数
+
+    # 性能分析配置（profile工具和 /admin/* 接口）
+    PROFILE_MAX_SECONDS = 60  # 单次分析会话的最长时间（秒）
+    PROFILE_SAMPLE_INTERVAL = 0.01  # 采样间隔（秒）
+    ADMIN_ALLOW_REMOTE = os.getenv("ADMIN_ALLOW_REMOTE", "false").lower() == "true"  # 是否允许非本机地址访问 /admin/* 接口
 
     # 消息配置
-    MAX_MESSAGE_SIZE = 1024  # 最大消息大小（字节）
+    MAX_MESSAGE_SIZE = 64 * 1024  # 单条消息最大大小（字节），超过的消息会被丢弃
+    RECV_BUFFER_SIZE = 16 * 1024  # 每个连接的接收缓冲区大小（字节）
     SOCKET_TIMEOUT = 10  # Socket超时时间（秒）
 
+    # HTTP任务分发配置
+    TASK_DISPATCH_MODE = os.getenv("TASK_DISPATCH_MODE", "serial")  # serial / concurrent
+    WORKER_MAX_INFLIGHT = int(os.getenv("WORKER_MAX_INFLIGHT", "1"))  # concurrent模式下每个worker最多同时进行的任务数
+    LONG_POLL_MAX_WAIT = 30  # /worker2/command 长轮询最大等待时间（秒）
+    BATCH_MAX_TASKS = 100  # /worker2/command 单次批量领取的最大任务数
+    BULK_MAX_TASKS = 10000  # 单次批量添加的最大任务数
+    WORKER_ACTIVE_WINDOW = 120  # 最近多少秒内轮询过的worker视为活跃（广播默认目标）
+    BROADCAST_MAX_RECORDS = 1000  # 最多保留的广播记录数
+    TASK_PRIORITY_AGING = 60  # 任务每等待多少秒提升一级优先级（最多到normal，防止低优先级任务饿死）
+
+    # 任务结果存储配置
+    RESULT_STORE_MAX_ENTRIES = 10000  # 最多保存的任务结果数
+    RESULT_STORE_MAX_BYTES = 64 * 1024 * 1024  # 任务结果总大小上限（字节）
+    RESULT_STORE_TTL = 3600  # 任务结果保存时间（秒）
+    RESULT_MAX_BYTES = 1024 * 1024  # 单条任务结果最大大小（字节），超过的部分被截断
+    TASK_LEASE_TIMEOUT = float(os.getenv("TASK_LEASE_TIMEOUT", "300"))  # 任务租约时长（秒），到期未完成则重新分配
+    TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))  # 任务最多分配次数，超过后标记为失败
+    TASK_STORE_BACKEND = os.getenv("TASK_STORE_BACKEND", "memory")  # 任务队列存储：memory / sqlite（持久化到DB_CONFIG）
+
     # 数据库配置（如果需要持久化）
     DB_CONFIG = {
         "type": "sqlite",
-        "path": "data/heartbeat.db"
+        "path": os.getenv("DB_PATH", "data/heartbeat.db"),  # 相对路径相对于项目根目录
+        "synchronous": "FULL",  # SQLite同步级别，FULL保证每次提交落盘
+        "max_batch": 10000,  # 一次组提交最多包含的写入数
+        "commit_timeout": 5  # 添加任务时等待写入落盘的最长时间（秒）
     }
 
     @classmethod
@@ -42,6 +97,8 @@ class ServerConfig:
         return {
             "host": cls.HOST,
             "port": cls.PORT,
+            "engine": cls.HEARTBEAT_ENGINE,
+            "workers": cls.HEARTBEAT_WORKERS,
             "max_clients": cls.MAX_CLIENTS,
             "client_timeout": cls.CLIENT_TIMEOUT,
             "expected_heartbeat_interval": cls.EXPECTED_HEARTBEAT_INTERVAL,
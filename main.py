@@ -1,95 +1,190 @@
+import asyncio
 import atexit
 import os
 import sys
 import threading
 import time
+from typing import Any
 
 from mcp.server.fastmcp import FastMCP
 
 # 添加src目录到路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
 
+from server.heartbeat_cluster import HeartbeatCluster
 from server.heartbeat_server import HeartbeatServer
 from server.http_server import HTTPServer
+from utils.file_reader import FileReader
+from utils.metrics import REGISTRY, timed
+from utils.profiler import PROFILER
+from config.server_config import ServerConfig
 
 # Create an MCP server
 mcp = FastMCP("Demo", json_response=True)
 
+# MCP工具调用指标（outcome为ok，或工具抛出异常时为error）
+MCP_TOOL_CALLS = REGISTRY.counter("mcp_tool_calls_total", "MCP工具调用次数", ("tool", "outcome"))
+MCP_TOOL_LATENCY = REGISTRY.histogram("mcp_tool_duration_seconds", "MCP工具调用耗时（秒）", ("tool",))
+
+
+def tool():
+    """注册MCP工具，并记录调用次数和耗时"""
+    def decorator(func):
+        return mcp.tool()(timed(MCP_TOOL_LATENCY, MCP_TOOL_CALLS)(func))
+    return decorator
+
 # 全局服务器实例
-heartbeat_server = HeartbeatServer(host="localhost", port=8888)
-http_server = HTTPServer(host="localhost", port=5000)
+heartbeat_server = HeartbeatServer(host="localhost", port=8888, engine=ServerConfig.HEARTBEAT_ENGINE)
+# HEARTBEAT_WORKERS大于1时由多个心跳进程接收心跳，heartbeat_server不监听，agent状态从共享注册表读取
+heartbeat_cluster = HeartbeatCluster(
+    host=heartbeat_server.host,
+    port=heartbeat_server.port,
+    engine=ServerConfig.HEARTBEAT_ENGINE,
+    workers=ServerConfig.HEARTBEAT_WORKERS,
+    registry_dir=ServerConfig.AGENT_REGISTRY_DIR,
+    publish_interval=ServerConfig.AGENT_REGISTRY_PUBLISH_INTERVAL
+) if ServerConfig.HEARTBEAT_WORKERS > 1 else None
+http_server = HTTPServer(host="localhost", port=5000,
+                         dispatch_mode=ServerConfig.TASK_DISPATCH_MODE,
+                         max_tasks_per_worker=ServerConfig.WORKER_MAX_INFLIGHT,
+                         task_store=ServerConfig.TASK_STORE_BACKEND)
+# 多进程模式下集群指标留在各心跳进程中，/agents/fleet 返回不可用
+http_server.fleet_metrics = heartbeat_server.fleet if heartbeat_cluster is None else None
+file_reader = FileReader(max_bytes=ServerConfig.READ_FILE_MAX_BYTES,
+                         max_matches=ServerConfig.READ_FILE_MAX_MATCHES,
+                         cache_size=ServerConfig.READ_FILE_CACHE_SIZE)
 
 
 # Add an addition tool，工具调用
-@mcp.tool()
+@tool()
 def add(a: int, b: int) -> int:
     """Add two numbers"""
     return a + b
 
 
 # 读取文件内容
-@mcp.tool()
-def read_file(file_path: str) -> str:
-    """Read the content of a file"""
-    with open(file_path, "r", encoding="utf-8") as file:
-        return file.read()
+@tool()
+def read_file(file_path: str, offset: int = 0, length: int = 0, start_line: int = 0, line_count: int = 0,
+              tail: int = 0, pattern: str = "", ignore_case: bool = False, max_matches: int = 0) -> dict:
+    """Read part of a file without loading it into memory. Every read returns at most READ_FILE_MAX_BYTES.
+
+    - pattern: regex search (grep); returns matching lines with line numbers. offset/length limit the
+      searched byte range; when truncated, pass next_offset as offset to continue.
+    - tail: the last N lines.
+    - start_line (1-based) and line_count: a line range (line_count 0 = as much as fits).
+    - otherwise offset/length: a byte range (length 0 = as much as fits); next_offset continues the read.
+    """
+    global file_reader
+
+    try:
+        if pattern:
+            data = file_reader.grep(file_path, pattern, max_matches, ignore_case, offset, length)
+        elif tail > 0:
+            data = file_reader.tail(file_path, tail)
+        elif start_line > 0:
+            data = file_reader.read_lines(file_path, start_line, line_count)
+        else:
+            data = file_reader.read_range(file_path, offset, length)
+        return {"status": "success", "file_path": file_path, **data}
+    except ValueError as e:
+        return {"status": "error", "message": f"Invalid request: {str(e)}"}
+    except OSError as e:
+        return {"status": "error", "message": f"Failed to read file: {str(e)}"}
 
 
 # 获取agent状态
-@mcp.tool()
-def get_agent_status() -> dict:
-    """Get all agents status information from heartbeat server"""
-    global heartbeat_server, http_server
+@tool()
+def get_agent_status(since_version: int | None = None) -> dict:
+    """Get all agents status information from heartbeat server.
+
+    Agents are keyed by their agent_id or machine_name (connection address if they send neither).
+    status is active, late (missed MAX_MISSED_HEARTBEATS expected heartbeats), dead
+    (no heartbeat for CLIENT_TIMEOUT seconds; the connection has been closed) or disconnected
+    (kept for AGENT_GRACE_PERIOD seconds so a reconnect keeps its state).
+
+    The result carries a version. Pass it back as since_version to get only the agents whose
+    status, connection or system_info changed since then, plus the ids of removed agents.
+    full is true when every agent is returned (no since_version, or it is too old to answer as a delta).
+
+    With HEARTBEAT_WORKERS > 1 the heartbeat processes' registries are merged into one view: the result
+    is always full, each agent carries the worker that owns its connection, and workers lists every
+    heartbeat process (pid, alive, agents, seconds_since_publish, restarts).
+    """
+    global heartbeat_server
+
+    if heartbeat_cluster is not None:
+        return heartbeat_cluster.read()
+    # 从心跳服务器的状态快照读取，只重新构建变化过的agent
+    return heartbeat_server.snapshot.read(since_version, with_age=True)
+
+
+# 获取agent指标历史
+@tool()
+def get_agent_metrics(metric: str = "cpu_usage", agents: list[str] | None = None, tier: str = "raw",
+                      window: float = 0, summary: bool = False) -> dict:
+    """Get the history of one system_info metric for one or more agents.
+
+    metric is one of cpu_usage, memory_used, disk_used, network_upload, network_download.
+    tier is raw (recent samples), 1m (per-minute averages) or 1h (per-hour averages).
+    Leave agents empty for all agents. window limits the result to the last N seconds (0 = everything kept).
+    With summary=True each agent returns count/min/max/avg/last instead of [timestamp, value] points.
+    Not supported when HEARTBEAT_WORKERS > 1 (the history stays in the heartbeat processes).
+    """
+    global heartbeat_server
+
+    if heartbeat_cluster is not None:
+        return {"status": "error", "message": "get_agent_metrics is not supported when HEARTBEAT_WORKERS > 1"}
+    try:
+        data = heartbeat_server.metrics.query(metric, agents or None, tier, window, summary)
+        return {"status": "success", "metric": metric, "tier": tier, "data": data}
+    except ValueError as e:
+        return {"status": "error", "message": f"Invalid query: {str(e)}"}
+    except Exception as e:
+        return {"status": "error", "message": f"Failed to get agent metrics: {str(e)}"}
+
+
+# 集群指标聚合
+@tool()
+def get_fleet_summary(metric: str = "cpu_usage", top: int = 10, order: str = "desc",
+                      min_value: float | None = None, max_value: float | None = None,
+                      percentiles: list[float] | None = None) -> dict:
+    """Summarize one metric across the whole fleet from the latest system_info of every agent.
+
+    metric is one of cpu_usage, memory_usage, disk_usage (percent), network_upload, network_download.
+    Returns count/mean/min/max and percentiles (default 50, 90, 99) over all agents, plus the top
+    agents sorted by value (order=desc for the hottest, asc for the coolest). min_value/max_value
+    filter the listed agents by threshold; matched is how many agents pass the filter.
+    Not supported when HEARTBEAT_WORKERS > 1 (the metrics stay in the heartbeat processes).
+    """
+    global heartbeat_server
+
+    if heartbeat_cluster is not None:
+        return {"status": "error", "message": "get_fleet_summary is not supported when HEARTBEAT_WORKERS > 1"}
+    try:
+        top = min(max(top, 0), ServerConfig.FLEET_MAX_TOP)
+        data = heartbeat_server.fleet.query(metric, top, order, percentiles or (50, 90, 99), min_value, max_value)
+        return {"status": "success", "data": data}
+    except ValueError as e:
+        return {"status": "error", "message": f"Invalid query: {str(e)}"}
+    except Exception as e:
+        return {"status": "error", "message": f"Failed to get fleet summary: {str(e)}"}
 
-    # 从心跳服务器获取agent状态
-    agents_status = {}
-    if heartbeat_server and heartbeat_server.clients:
-        for client_id, client_info in heartbeat_server.clients.items():
-            # 构建agent状态信息
-            agent_data = {
-                "id": client_id,
-                "address": f"{client_info.get('client_address', ('unknown', 'unknown'))[0]}:{client_info.get('client_address', ('unknown', 'unknown'))[1]}",
-                "last_heartbeat": client_info.get("last_heartbeat", "unknown"),
-                "status": "active",  # 假设存在于clients中的都是活跃的
-            }
-
-            # 如果有系统信息，添加到agent数据中
-            if "system_info" in client_info:
-                sys_info = client_info["system_info"]
-                agent_data["system_info"] = {
-                    "machine_name": sys_info.get("machine_name", "unknown"),
-                    "os_version": sys_info.get("os_version", "unknown"),
-                    "cpu_usage": round(sys_info.get("cpu_usage", 0), 2),
-                    "memory": {
-                        "total": sys_info.get("memory_total", 0),
-                        "used": sys_info.get("memory_used", 0),
-                        "usage_percent": round((sys_info.get("memory_used", 0) / sys_info.get("memory_total", 1)) * 100, 2) if sys_info.get("memory_total") else 0
-                    },
-                    "disk": {
-                        "total": sys_info.get("disk_total", 0),
-                        "used": sys_info.get("disk_used", 0),
-                        "usage_percent": round((sys_info.get("disk_used", 0) / sys_info.get("disk_total", 1)) * 100, 2) if sys_info.get("disk_total") else 0
-                    },
-                    "network": {
-                        "upload": round(sys_info.get("network_upload", 0), 2),
-                        "download": round(sys_info.get("network_download", 0), 2)
-                    }
-                }
-
-            agents_status[client_id] = agent_data
-
-    # 服务器状态信息
-    status = {
-        "agents": agents_status
-    }
-
-    return status
+
+async def run_task_write(func, *args, **kwargs):
+    """添加任务：SQLite存储时要等待落盘，放到线程中执行，不阻塞事件循环；内存存储直接调用（与asgi_app.run_write相同）"""
+    if http_server.task_store is not None:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return func(*args, **kwargs)
 
 
 # 执行命令
-@mcp.tool()
-def agent_execute_command(command: str) -> dict:
-    """Execute a command on the agent"""
+@tool()
+async def agent_execute_command(command: str, target: str = "", priority: str = "") -> dict:
+    """Execute a command on the agent.
+
+    Set target to an agent id to run the command only on that agent; leave it empty to let any agent take it.
+    priority is high/normal/low; built-in commands (init/cleanup/status) default to high, others to normal.
+    """
     global http_server
 
     if not http_server or not http_server.running:
@@ -97,39 +192,146 @@ def agent_execute_command(command: str) -> dict:
 
     try:
         # 将命令添加到任务队列
-        http_server.task_queue.put(command)
+        task_id = await run_task_write(http_server.add_task, command, target=target or None,
+                                       priority=priority or None)
 
         return {
             "status": "success",
             "message": f"Command '{command}' added to queue",
-            "queue_size": http_server.task_queue.qsize(),
+            "task_id": task_id,
+            "queue_size": http_server.get_queue_size(),
         }
+    except ValueError as e:
+        return {"status": "error", "message": f"Invalid command: {str(e)}"}
     except Exception as e:
         return {"status": "error", "message": f"Failed to execute command: {str(e)}"}
 
 
 # 添加任务到队列
-@mcp.tool()
-def add_task_to_queue(command: str) -> dict:
-    """Add a task to the HTTP server task queue"""
+@tool()
+async def add_task_to_queue(command: str, target: str = "", priority: str = "") -> dict:
+    """Add a task to the HTTP server task queue.
+
+    Set target to an agent id to queue the task only for that agent; leave it empty for the shared queue.
+    priority is high/normal/low; built-in commands (init/cleanup/status) default to high, others to normal.
+    """
     global http_server
 
     if not http_server or not http_server.running:
         return {"status": "error", "message": "HTTP server is not running"}
 
     try:
-        http_server.task_queue.put(command)
+        task_id = await run_task_write(http_server.add_task, command, target=target or None,
+                                       priority=priority or None)
         return {
             "status": "success",
             "message": f"Task '{command}' added to queue",
-            "queue_size": http_server.task_queue.qsize(),
+            "task_id": task_id,
+            "queue_size": http_server.get_queue_size(),
         }
+    except ValueError as e:
+        return {"status": "error", "message": f"Invalid task: {str(e)}"}
     except Exception as e:
         return {"status": "error", "message": f"Failed to add task: {str(e)}"}
 
 
+# 批量添加任务到队列
+@tool()
+async def add_tasks_to_queue(tasks: list[str | dict[str, Any]]) -> dict:
+    """Add many tasks to the HTTP server task queue in one call.
+
+    Each task is either a command string or an object
+    {"command": str, "metadata": {...}, "target": agent_id, "priority": "high" | "normal" | "low"}.
+    All tasks are validated and enqueued atomically; returns the assigned task ids in order.
+    """
+    global http_server
+
+    if not http_server or not http_server.running:
+        return {"status": "error", "message": "HTTP server is not running"}
+
+    try:
+        task_ids = await run_task_write(http_server.add_tasks, tasks)
+        return {
+            "status": "success",
+            "message": f"{len(task_ids)} tasks added to queue",
+            "task_ids": task_ids,
+            "queue_size": http_server.get_queue_size(),
+        }
+    except ValueError as e:
+        return {"status": "error", "message": f"Invalid tasks: {str(e)}"}
+    except Exception as e:
+        return {"status": "error", "message": f"Failed to add tasks: {str(e)}"}
+
+
+# 广播命令给多个agent
+@tool()
+async def broadcast_command(command: str, agents: list[str] | None = None, priority: str = "") -> dict:
+    """Run one command on many agents: queues one sub-task per agent.
+
+    agents is a list of agent ids; omit it to target every agent that polled recently.
+    priority is high/normal/low (defaults as for agent_execute_command).
+    Returns a broadcast_id for get_broadcast_status and the sub-task id per agent.
+    """
+    global http_server
+
+    if not http_server or not http_server.running:
+        return {"status": "error", "message": "HTTP server is not running"}
+
+    try:
+        result = await run_task_write(http_server.broadcast_task, command, agents, priority=priority or None)
+        return {
+            "status": "success",
+            "message": f"Command '{command}' broadcast to {len(result['task_ids'])} agents",
+            "data": result,
+        }
+    except ValueError as e:
+        return {"status": "error", "message": f"Invalid broadcast: {str(e)}"}
+    except Exception as e:
+        return {"status": "error", "message": f"Failed to broadcast command: {str(e)}"}
+
+
+# 获取广播状态
+@tool()
+def get_broadcast_status(broadcast_id: int) -> dict:
+    """Get per-agent results and status counts of a broadcast command"""
+    global http_server
+
+    if not http_server or not http_server.running:
+        return {"status": "error", "message": "HTTP server is not running"}
+
+    try:
+        status = http_server.get_broadcast_status(broadcast_id)
+        if status is None:
+            return {"status": "error", "message": f"Broadcast {broadcast_id} not found"}
+        return {"status": "success", "data": status}
+    except Exception as e:
+        return {"status": "error", "message": f"Failed to get broadcast status: {str(e)}"}
+
+
+# 获取任务结果
+@tool()
+async def get_task_result(task_id: int, wait: float = 0) -> dict:
+    """Get the result of a task by id.
+
+    Status is completed/failed once the task has finished, queued/running while it is still
+    in progress, or not_found. Set wait (seconds) to block until the task finishes.
+    """
+    global http_server
+
+    if not http_server or not http_server.running:
+        return {"status": "error", "message": "HTTP server is not running"}
+
+    try:
+        wait = min(max(wait, 0), ServerConfig.LONG_POLL_MAX_WAIT)
+        # 协程中等待，不占用MCP事件循环和线程
+        result = await http_server.get_task_result_async(task_id, wait)
+        return {"status": "success", "data": result}
+    except Exception as e:
+        return {"status": "error", "message": f"Failed to get task result: {str(e)}"}
+
+
 # 获取任务状态
-@mcp.tool()
+@tool()
 def get_task_status() -> dict:
     """Get current task status from HTTP server"""
     global http_server
@@ -140,16 +342,56 @@ def get_task_status() -> dict:
     try:
         return {
             "status": "success",
-            "data": {
-                "queue_size": http_server.task_queue.qsize(),
-                "pending_tasks": len(http_server.pending_tasks),
-                "pending_task_details": http_server.pending_tasks,
-            },
+            "data": http_server.get_task_status(),
         }
     except Exception as e:
         return {"status": "error", "message": f"Failed to get task status: {str(e)}"}
 
 
+# 获取运行指标
+@tool()
+def get_server_metrics(format: str = "json") -> dict:
+    """Get server runtime metrics: HTTP request counts and latency histograms, heartbeat ingest rate,
+    parse errors, active connections, task queue depth, dispatch latency and MCP tool latency.
+
+    format: "json" (counters/gauges as values; histograms as count, sum, avg and bucket-estimated p50/p99
+    upper bounds) or "text" (Prometheus text exposition format, same as GET /metrics on the HTTP server)
+    """
+    if format not in ("json", "text"):
+        return {"status": "error", "message": "format must be json or text"}
+    try:
+        data = REGISTRY.snapshot() if format == "json" else REGISTRY.render()
+        return {"status": "success", "data": data}
+    except Exception as e:
+        return {"status": "error", "message": f"Failed to get server metrics: {str(e)}"}
+
+
+# 性能分析
+@tool()
+async def profile(action: str = "run", seconds: float = 5, mode: str = "sample", interval: float = 0,
+                  thread: str = "", top: int = 30, max_stacks: int = 200) -> dict:
+    """Profile the running server (heartbeat, HTTP and MCP threads) without restarting it.
+
+    action: "run" (profile for `seconds` then return the report), "start" (return immediately),
+    "stop" (stop early and return the report), "status", or "threads" (thread count and stacks
+    of all threads, threads with identical stacks grouped)
+    mode: "sample" (low-overhead stack sampling every `interval` seconds, default from config)
+    or "cprofile" (also runs cProfile for call counts and times; higher overhead)
+    thread: only sample threads whose name contains this string
+    The report has top functions by self/total samples and collapsed stacks
+    ("thread;outer;...;inner count", usable with flamegraph.pl or speedscope).
+    """
+    try:
+        # 分析期间在线程中等待，事件循环（统一事件循环模式下的HTTP和心跳）照常运行并被采样
+        data = await asyncio.to_thread(PROFILER.execute, action, seconds, mode, interval or None, thread,
+                                       top, max_stacks)
+        return {"status": "success", "data": data}
+    except (ValueError, RuntimeError) as e:
+        return {"status": "error", "message": str(e)}
+    except Exception as e:
+        return {"status": "error", "message": f"Failed to profile: {str(e)}"}
+
+
 # region demo
 # Add a dynamic greeting resource，提供资源
 # @mcp.resource("greeting://{name}")
@@ -175,7 +417,11 @@ def get_task_status() -> dict:
 # 启动心跳服务器
 def start_heartbeat_server():
     """启动心跳服务器"""
-    print("启动心跳服务器在 localhost:8888")
+    if heartbeat_cluster is not None:
+        print(f"启动心跳服务器在 localhost:8888 (engine={heartbeat_cluster.engine}, workers={heartbeat_cluster.workers})")
+        heartbeat_cluster.start()
+        return
+    print(f"启动心跳服务器在 localhost:8888 (engine={heartbeat_server.engine})")
     heartbeat_server.start()
 
 
@@ -190,19 +436,44 @@ def cleanup():
     """清理函数，在程序退出时调用"""
     global heartbeat_server, http_server
     try:
+        if heartbeat_cluster is not None:
+            heartbeat_cluster.stop()
         if heartbeat_server and heartbeat_server.running:
             heartbeat_server.stop()
         if http_server and http_server.running:
             http_server.stop_input_listener()
     except Exception:
         pass
+    # 任务存储的写线程是守护线程，退出前写完剩余的领取/完成记录，否则已完成的任务重启后会被再次下发
+    try:
+        if http_server:
+            http_server.close()
+    except Exception:
+        pass
 
 
-# Run with streamable HTTP transport
-if __name__ == "__main__":
-    # 注册清理函数
-    atexit.register(cleanup)
+def print_tools():
+    """打印可用的MCP工具"""
+    print("MCP服务器启动中...")
+    print("可用的MCP工具:")
+    print("- get_agent_status: 获取agent状态（从心跳服务器）")
+    print("- get_agent_metrics: 获取agent指标历史（原始样本/分钟/小时）")
+    print("- get_fleet_summary: 集群指标统计和Top-N")
+    print("- agent_execute_command: 执行命令（添加到HTTP服务器任务队列）")
+    print("- add_task_to_queue: 添加任务到队列")
+    print("- add_tasks_to_queue: 批量添加任务到队列")
+    print("- broadcast_command: 广播命令给多个agent")
+    print("- get_broadcast_status: 获取广播状态")
+    print("- get_task_status: 获取任务状态")
+    print("- get_task_result: 获取任务结果（可等待任务结束）")
+    print("- get_server_metrics: 获取运行指标（请求、心跳、队列深度和延迟直方图）")
+    print("- profile: 性能分析（采样/cProfile、线程调用栈）")
+    print("- stop_servers: 停止服务器")
+    print()
+
 
+def run_threads():
+    """threads模式：心跳服务器和Flask各在一个线程中运行，MCP在主线程中运行"""
     # 在独立线程中启动心跳服务器
     heartbeat_thread = threading.Thread(target=start_heartbeat_server, daemon=True)
     heartbeat_thread.start()
@@ -215,14 +486,61 @@ if __name__ == "__main__":
     time.sleep(10)
     get_agent_status()
 
-    print("MCP服务器启动中...")
-    print("可用的MCP工具:")
-    print("- get_agent_status: 获取agent状态（从心跳服务器）")
-    print("- agent_execute_command: 执行命令（添加到HTTP服务器任务队列）")
-    print("- add_task_to_queue: 添加任务到队列")
-    print("- get_task_status: 获取任务状态")
-    print("- stop_servers: 停止服务器")
-    print()
+    print_tools()
 
     # 启动MCP服务器
     mcp.run(transport="stdio")
+
+
+async def run_unified():
+    """asyncio模式：MCP（stdio）、HTTP API（Starlette + uvicorn）和心跳服务器运行在同一个事件循环中
+
+    所有请求和MCP工具都在事件循环线程中处理，长轮询和等待任务结果使用协程，不占用线程。
+    MCP的stdio会话结束时停止另外两个服务器。
+    """
+    import uvicorn
+    from server.asgi_app import create_asgi_app
+
+    api_server = uvicorn.Server(uvicorn.Config(
+        create_asgi_app(http_server),
+        host=http_server.host,
+        port=http_server.port,
+        log_level="warning",
+        lifespan="off",
+        backlog=ServerConfig.LISTEN_BACKLOG
+    ))
+
+    if heartbeat_cluster is not None:
+        # 心跳进程各自运行，这里只负责启动和停止
+        start_heartbeat_server()
+        heartbeat_task = None
+    else:
+        print(f"启动心跳服务器在 {heartbeat_server.host}:{heartbeat_server.port} (engine=asyncio)")
+        heartbeat_task = asyncio.create_task(heartbeat_server.serve())
+    print(f"启动HTTP服务器在 {http_server.host}:{http_server.port} (ASGI)")
+    api_task = asyncio.create_task(api_server.serve())
+    http_server.running = True
+
+    print_tools()
+    try:
+        await mcp.run_stdio_async()
+    finally:
+        http_server.running = False
+        api_server.should_exit = True
+        await asyncio.to_thread(heartbeat_server.stop)
+        if heartbeat_cluster is not None:
+            await asyncio.to_thread(heartbeat_cluster.stop)
+        await asyncio.gather(*[task for task in (api_task, heartbeat_task) if task is not None],
+                             return_exceptions=True)
+        http_server.close()
+
+
+# Run with streamable HTTP transport
+if __name__ == "__main__":
+    # 注册清理函数
+    atexit.register(cleanup)
+
+    if ServerConfig.RUNTIME_MODE == "asyncio":
+        asyncio.run(run_unified())
+    else:
+        run_threads()
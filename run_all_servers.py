@@ -13,6 +13,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
 from server.heartbeat_server import HeartbeatServer
 from server.http_server import HTTPServer
+from config.server_config import ServerConfig
 
 
 class ServerManager:
@@ -23,9 +24,11 @@ class ServerManager:
         self.http_server = None
         self.running = False
 
-    def start_heartbeat_server(self, host="localhost", port=8888):
+    def start_heartbeat_server(self, host="localhost", port=8888, engine="thread"):
         """启动心跳服务器"""
-        self.heartbeat_server = HeartbeatServer(host=host, port=port)
+        self.heartbeat_server = HeartbeatServer(host=host, port=port, engine=engine)
+        if self.http_server:
+            self.http_server.fleet_metrics = self.heartbeat_server.fleet
         try:
             self.heartbeat_server.start()
         except Exception as e:
@@ -33,7 +36,12 @@ class ServerManager:
 
     def start_http_server(self, host="localhost", port=5000, debug=False):
         """启动HTTP服务器"""
-        self.http_server = HTTPServer(host=host, port=port)
+        self.http_server = HTTPServer(host=host, port=port,
+                                      dispatch_mode=ServerConfig.TASK_DISPATCH_MODE,
+                                      max_tasks_per_worker=ServerConfig.WORKER_MAX_INFLIGHT,
+                                      task_store=ServerConfig.TASK_STORE_BACKEND)
+        if self.heartbeat_server:
+            self.http_server.fleet_metrics = self.heartbeat_server.fleet
         try:
             self.http_server.run(debug=debug)
         except Exception as e:
@@ -51,13 +59,13 @@ class ServerManager:
         print("所有服务器已停止")
 
     def run(self, heartbeat_host="localhost", heartbeat_port=8888,
-            http_host="localhost", http_port=5000, debug=False):
+            http_host="localhost", http_port=5000, debug=False, heartbeat_engine="thread"):
         """同时运行两个服务器"""
         self.running = True
 
         print("启动多服务器系统...")
         print("=" * 50)
-        print(f"心跳服务器: {heartbeat_host}:{heartbeat_port}")
+        print(f"心跳服务器: {heartbeat_host}:{heartbeat_port} (engine={heartbeat_engine})")
         print(f"HTTP服务器:  {http_host}:{http_port}")
         print("=" * 50)
         print("按 Ctrl+C 停止所有服务器")
@@ -66,7 +74,7 @@ class ServerManager:
         # 创建心跳服务器线程
         heartbeat_thread = threading.Thread(
             target=self.start_heartbeat_server,
-            args=(heartbeat_host, heartbeat_port)
+            args=(heartbeat_host, heartbeat_port, heartbeat_engine)
         )
         heartbeat_thread.daemon = True
 
@@ -104,6 +112,8 @@ def main():
     parser = argparse.ArgumentParser(description="同时启动心跳服务器和HTTP服务器")
     parser.add_argument("--heartbeat-host", default="localhost", help="心跳服务器地址")
     parser.add_argument("--heartbeat-port", type=int, default=8888, help="心跳服务器端口")
+    parser.add_argument("--heartbeat-engine", choices=HeartbeatServer.ENGINES, default=ServerConfig.HEARTBEAT_ENGINE,
+                        help="心跳服务器运行引擎")
     parser.add_argument("--http-host", default="localhost", help="HTTP服务器地址")
     parser.add_argument("--http-port", type=int, default=8080, help="HTTP服务器端口")
     parser.add_argument("--debug", action="store_true", help="启用HTTP服务器调试模式")
@@ -115,6 +125,7 @@ def main():
     manager.run(
         heartbeat_host=args.heartbeat_host,
         heartbeat_port=args.heartbeat_port,
+        heartbeat_engine=args.heartbeat_engine,
         http_host=args.http_host,
         http_port=args.http_port,
         debug=args.debug
@@ -9,6 +9,7 @@ import argparse
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
 from server.http_server import HTTPServer
+from config.server_config import ServerConfig
 
 
 def main():
@@ -18,24 +19,37 @@ def main():
     parser.add_argument("--port", type=int, default=5000, help="服务器端口")
     parser.add_argument("--debug", action="store_true", help="启用调试模式")
     parser.add_argument("--no-input", dest="input", action="store_false", default=True, help="禁用用户输入监听")
+    parser.add_argument("--dispatch-mode", choices=HTTPServer.DISPATCH_MODES, default=ServerConfig.TASK_DISPATCH_MODE,
+                        help="任务分发模式：serial 全局串行，concurrent 每个worker独立并发")
+    parser.add_argument("--max-tasks-per-worker", type=int, default=ServerConfig.WORKER_MAX_INFLIGHT,
+                        help="concurrent模式下每个worker最多同时进行的任务数")
+    parser.add_argument("--task-store", choices=HTTPServer.TASK_STORE_BACKENDS, default=ServerConfig.TASK_STORE_BACKEND,
+                        help="任务队列存储：memory 仅内存，sqlite 持久化并在重启后恢复")
 
     args = parser.parse_args()
 
     print(f"启动HTTP服务器...")
-    print(f"启动参数: host={args.host}, port={args.port}, debug={args.debug}, input={args.input}")
+    print(f"启动参数: host={args.host}, port={args.port}, debug={args.debug}, input={args.input}, "
+          f"dispatch_mode={args.dispatch_mode}, max_tasks_per_worker={args.max_tasks_per_worker}, "
+          f"task_store={args.task_store}")
     if not args.input:
         print("注意: 用户输入监听已禁用")
         print()
         print("可用的API端点:")
         print(f"  GET http://{args.host}:{args.port}/")
         print(f"  GET http://{args.host}:{args.port}/worker2/command")
+        print(f"  POST http://{args.host}:{args.port}/worker2/results - 批量提交任务结果")
         print(f"  GET http://{args.host}:{args.port}/health")
         print(f"  GET http://{args.host}:{args.port}/tasks")
         print(f"  POST http://{args.host}:{args.port}/tasks/add - 添加任务")
+        print(f"  POST http://{args.host}:{args.port}/tasks/add_batch - 批量添加任务")
         print()
 
     # 创建并启动HTTP服务器
-    server = HTTPServer(host=args.host, port=args.port)
+    server = HTTPServer(host=args.host, port=args.port,
+                        dispatch_mode=args.dispatch_mode,
+                        max_tasks_per_worker=args.max_tasks_per_worker,
+                        task_store=args.task_store)
 
     try:
         server.run(debug=args.debug, enable_input=args.input)
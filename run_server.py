@@ -12,21 +12,71 @@ from server.heartbeat_server import HeartbeatServer
 from config.server_config import ServerConfig
 
 
+def run_worker(args):
+    """多进程模式下的单个心跳进程（由HeartbeatCluster启动）：通过SO_REUSEPORT监听，并发布agent状态到共享注册表"""
+    from server.agent_registry import AgentRegistryPublisher
+
+    server = HeartbeatServer(host=args.host, port=args.port, engine=args.engine, reuse_port=True,
+                             log_file=f"heartbeat_server.{args.worker_index}.log")
+    publisher = AgentRegistryPublisher(server, args.registry_dir, args.worker_index, args.publish_interval,
+                                       parent_pid=os.getppid(), on_orphan=server.stop)
+    publisher.start()
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        server.stop()
+    finally:
+        publisher.stop()
+
+
+def run_cluster(args):
+    """多进程模式：启动args.workers个心跳进程，阻塞直到Ctrl+C"""
+    from server.heartbeat_cluster import HeartbeatCluster
+
+    cluster = HeartbeatCluster(args.host, args.port, args.engine, args.workers,
+                               registry_dir=ServerConfig.AGENT_REGISTRY_DIR,
+                               publish_interval=ServerConfig.AGENT_REGISTRY_PUBLISH_INTERVAL)
+    cluster.start()
+    try:
+        cluster.wait()
+    except KeyboardInterrupt:
+        print("\n正在停止服务器...")
+    finally:
+        cluster.stop()
+
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description="心跳服务器")
     parser.add_argument("--host", default=ServerConfig.HOST, help="服务器地址")
     parser.add_argument("--port", type=int, default=ServerConfig.PORT, help="服务器端口")
+    parser.add_argument("--engine", choices=HeartbeatServer.ENGINES, default=ServerConfig.HEARTBEAT_ENGINE,
+                        help="运行引擎：thread 每连接一个线程，asyncio 单事件循环")
+    parser.add_argument("--workers", type=int, default=ServerConfig.HEARTBEAT_WORKERS,
+                        help="心跳进程数，大于1时多个进程通过SO_REUSEPORT监听同一端口")
+    # 以下参数由多进程模式内部使用
+    parser.add_argument("--worker-index", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--registry-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--publish-interval", type=float, default=ServerConfig.AGENT_REGISTRY_PUBLISH_INTERVAL,
+                        help=argparse.SUPPRESS)
 
     args = parser.parse_args()
 
+    if args.worker_index is not None:
+        run_worker(args)
+        return
+
     print(f"启动心跳服务器...")
     print(f"配置信息: {ServerConfig.get_server_info()}")
-    print(f"启动参数: host={args.host}, port={args.port}")
+    print(f"启动参数: host={args.host}, port={args.port}, engine={args.engine}, workers={args.workers}")
     print("按 Ctrl+C 停止服务器")
 
+    if args.workers > 1:
+        run_cluster(args)
+        return
+
     # 创建并启动服务器
-    server = HeartbeatServer(host=args.host, port=args.port)
+    server = HeartbeatServer(host=args.host, port=args.port, engine=args.engine)
 
     try:
         server.start()
@@ -36,4 +86,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
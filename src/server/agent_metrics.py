@@ -0,0 +1,216 @@
+"""
+agent指标时间序列 - 定长数组环形缓冲区，自动降采样
+"""
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Iterable
+
+# 从system_info中记录的指标
+METRICS = ("cpu_usage", "memory_used", "disk_used", "network_upload", "network_download")
+_METRIC_INDEX = {name: index for index, name in enumerate(METRICS)}
+
+# 降采样层级 -> 每个桶的秒数（raw为原始样本，不聚合）
+TIERS = {"raw": 0, "1m": 60, "1h": 3600}
+
+_NAN = float("nan")
+
+
+class _Ring:
+    """定长环形缓冲区：一个时间戳数组和一个按样本交错存放所有指标的数组"""
+
+    __slots__ = ("capacity", "timestamps", "values", "head", "count")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = array("d", bytes(8 * capacity))
+        # 指标值用float32保存，第i个样本的指标m位于 i * len(METRICS) + m
+        self.values = array("f", bytes(4 * capacity * len(METRICS)))
+        self.head = 0  # 下一个写入位置
+        self.count = 0
+
+    def append(self, timestamp: float, values):
+        width = len(METRICS)
+        offset = self.head * width
+        self.timestamps[self.head] = timestamp
+        for index, value in enumerate(values):
+            self.values[offset + index] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def points(self, metric: int, since: float) -> List[List[float]]:
+        """按时间顺序返回 [时间戳, 值]，跳过早于since的样本和缺失值"""
+        width = len(METRICS)
+        start = (self.head - self.count) % self.capacity
+        result = []
+        for i in range(self.count):
+            slot = (start + i) % self.capacity
+            timestamp = self.timestamps[slot]
+            if timestamp < since:
+                continue
+            value = self.values[slot * width + metric]
+            if not math.isnan(value):
+                result.append([timestamp, round(value, 2)])
+        return result
+
+
+class _Bucket:
+    """降采样层级当前正在累积的桶"""
+
+    __slots__ = ("start", "sums", "counts")
+
+    def __init__(self):
+        self.start = None
+        self.sums = array("d", bytes(8 * len(METRICS)))
+        self.counts = array("L", [0] * len(METRICS))
+
+    def add(self, values):
+        for index, value in enumerate(values):
+            if not math.isnan(value):
+                self.sums[index] += value
+                self.counts[index] += 1
+
+    def averages(self):
+        return [total / count if count else _NAN for total, count in zip(self.sums, self.counts)]
+
+    def reset(self, start: float):
+        self.start = start
+        for index in range(len(METRICS)):
+            self.sums[index] = 0.0
+            self.counts[index] = 0
+
+
+class AgentSeries:
+    """单个agent的指标序列：raw保留最近的原始样本，1m/1h保留按分钟/小时平均后的值"""
+
+    __slots__ = ("rings", "buckets", "last_update")
+
+    def __init__(self, capacities: Dict[str, int]):
+        self.rings = {tier: _Ring(capacity) for tier, capacity in capacities.items()}
+        self.buckets = {tier: _Bucket() for tier in TIERS if TIERS[tier]}
+        self.last_update = 0.0
+
+    def record(self, timestamp: float, values):
+        self.rings["raw"].append(timestamp, values)
+        for tier, bucket in self.buckets.items():
+            size = TIERS[tier]
+            start = timestamp - timestamp % size
+            if bucket.start != start:
+                # 新的时间桶：把上一个桶的平均值写入对应层级
+                if bucket.start is not None:
+                    self.rings[tier].append(bucket.start, bucket.averages())
+                bucket.reset(start)
+            bucket.add(values)
+        self.last_update = timestamp
+
+    def points(self, tier: str, metric: int, since: float) -> List[List[float]]:
+        points = self.rings[tier].points(metric, since)
+        bucket = self.buckets.get(tier)
+        # 附带当前还未结束的桶
+        if bucket is not None and bucket.start is not None and bucket.start >= since and bucket.counts[metric]:
+            points.append([bucket.start, round(bucket.sums[metric] / bucket.counts[metric], 2)])
+        return points
+
+
+class AgentMetricsStore:
+    """所有agent的指标时间序列
+
+    每个agent预先分配固定大小的数组，内存只与agent数和各层级容量有关；
+    agent数超过max_agents时淘汰最久没有上报的agent。线程安全。
+    """
+
+    # 每个agent的数组对象、序列对象和字典本身的开销（估算，字节）
+    OBJECT_OVERHEAD = 2400
+
+    def __init__(self, raw_samples: int, minute_buckets: int, hour_buckets: int, max_agents: int):
+        self.capacities = {"raw": raw_samples, "1m": minute_buckets, "1h": hour_buckets}
+        self.max_agents = max_agents
+        self._series = OrderedDict()  # agent_id -> AgentSeries，按最近上报时间排序
+        self._lock = threading.Lock()
+
+    def record(self, agent_id: str, system_info: Dict[str, Any], timestamp: Optional[float] = None):
+        """记录一条system_info中的指标，缺失或非数值的指标记为缺失值"""
+        values = []
+        for name in METRICS:
+            value = system_info.get(name)
+            values.append(float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else _NAN)
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            series = self._series.get(agent_id)
+            if series is None:
+                series = self._series[agent_id] = AgentSeries(self.capacities)
+                while len(self._series) > self.max_agents:
+                    self._series.popitem(last=False)
+            else:
+                self._series.move_to_end(agent_id)
+            series.record(timestamp, values)
+
+    def remove(self, agent_id: str):
+        """删除agent的指标序列"""
+        with self._lock:
+            self._series.pop(agent_id, None)
+
+    def agents(self) -> List[str]:
+        """有指标数据的agent"""
+        with self._lock:
+            return list(self._series)
+
+    def query(self, metric: str, agent_ids: Optional[Iterable[str]] = None, tier: str = "raw",
+              window: float = 0, summary: bool = False) -> Dict[str, Any]:
+        """查询一个指标的时间窗口数据或汇总
+
+        agent_ids为None时查询所有agent；window>0时只返回最近window秒的数据；
+        summary为True时每个agent只返回 count/min/max/avg/last，否则返回 [时间戳, 值] 列表。
+        """
+        if metric not in _METRIC_INDEX:
+            raise ValueError(f"未知的指标: {metric}，可选: {', '.join(METRICS)}")
+        if tier not in TIERS:
+            raise ValueError(f"未知的层级: {tier}，可选: {', '.join(TIERS)}")
+
+        index = _METRIC_INDEX[metric]
+        since = time.time() - window if window > 0 else 0.0
+        result = {}
+        with self._lock:
+            if agent_ids is None:
+                agent_ids = list(self._series)
+            for agent_id in agent_ids:
+                series = self._series.get(agent_id)
+                if series is None:
+                    continue
+                points = series.points(tier, index, since)
+                result[agent_id] = self._summarize(points) if summary else points
+        return result
+
+    @staticmethod
+    def _summarize(points: List[List[float]]) -> Dict[str, Any]:
+        if not points:
+            return {"count": 0}
+        values = [value for _, value in points]
+        return {
+            "count": len(values),
+            "min": min(values),
+            "max": max(values),
+            "avg": round(sum(values) / len(values), 2),
+            "last": values[-1],
+            "last_time": points[-1][0]
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取存储统计信息（每个agent的内存为固定值）"""
+        width = len(METRICS)
+        slots = sum(self.capacities.values())
+        bytes_per_agent = slots * (8 + 4 * width) + (len(TIERS) - 1) * width * 16 + self.OBJECT_OVERHEAD
+        with self._lock:
+            agents = len(self._series)
+        return {
+            "agents": agents,
+            "max_agents": self.max_agents,
+            "capacities": dict(self.capacities),
+            "bytes_per_agent": bytes_per_agent,
+            "estimated_bytes": agents * bytes_per_agent
+        }
@@ -0,0 +1,225 @@
+"""
+共享agent注册表 - 多进程心跳服务器的各个进程把agent最新状态发布到各自的SQLite文件，读取方合并为一个视图
+
+每个进程只写自己的文件（worker-<序号>.db），写入之间没有锁竞争；读取方（main.py的get_agent_status）
+以只读方式打开所有文件并合并，同一个agent出现在多个进程中时（重连到了另一个进程）以心跳时间最新的为准。
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agents (
+    id TEXT PRIMARY KEY,
+    entry TEXT NOT NULL,
+    last_heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS worker (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    pid INTEGER NOT NULL,
+    started REAL NOT NULL,
+    updated REAL NOT NULL,
+    version INTEGER NOT NULL
+);
+"""
+
+# 快照条目中由读取方重新计算的字段
+_VOLATILE_FIELDS = ("version", "last_heartbeat", "seconds_since_heartbeat")
+
+
+def registry_path(directory: str, worker_index: int) -> str:
+    """第worker_index个心跳进程的注册表文件"""
+    return os.path.join(directory, f"worker-{worker_index}.db")
+
+
+def remove_registry(directory: str, worker_index: int):
+    """删除注册表文件（包括WAL文件）"""
+    path = registry_path(directory, worker_index)
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+class AgentRegistryPublisher:
+    """在心跳进程中运行的发布线程
+
+    每隔interval秒把心跳服务器快照中变化过的agent（AgentStatusSnapshot的增量读取）、移除的agent
+    和心跳时间有更新的agent写入注册表，一次发布一个事务。心跳时间以time.time()保存，便于跨进程比较。
+    parent_pid不为None时，父进程退出（本进程被过继）后调用on_orphan，避免多进程模式下遗留监听进程。
+    """
+
+    def __init__(self, server, directory: str, worker_index: int, interval: float = 1.0,
+                 parent_pid: Optional[int] = None, on_orphan=None):
+        self.server = server
+        self.path = registry_path(directory, worker_index)
+        self.directory = directory
+        self.worker_index = worker_index
+        self.interval = interval
+        self.parent_pid = parent_pid
+        self.on_orphan = on_orphan
+        self.logger = logging.getLogger("HeartbeatServer")
+        self._version: Optional[int] = None  # 已发布的快照版本，None表示还没有发布过
+        self._heartbeats: Dict[str, float] = {}  # agent ID -> 已发布的心跳时间（monotonic）
+        self._started = time.time()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        os.makedirs(directory, exist_ok=True)
+        remove_registry(directory, worker_index)
+        # 连接只在发布线程中使用
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # 注册表只反映运行中的进程，不需要落盘保证
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.executescript(_SCHEMA)
+
+    def start(self):
+        self.publish()
+        self._thread = threading.Thread(target=self._run, name="AgentRegistryPublisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止发布并删除注册表文件（进程的连接已关闭，agent会重连到其他进程）"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._conn.close()
+        remove_registry(self.directory, self.worker_index)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.parent_pid is not None and os.getppid() != self.parent_pid:
+                self.logger.warning("父进程已退出，停止心跳服务器")
+                if self.on_orphan:
+                    self.on_orphan()
+                return
+            try:
+                self.publish()
+            except sqlite3.Error as e:
+                self.logger.error(f"发布agent状态失败: {e}")
+
+    def publish(self):
+        """把上次发布之后的变化写入注册表"""
+        delta = self.server.snapshot.read(self._version)
+        clients = self.server.clients
+        # monotonic -> time.time() 的偏移，一次发布内保持一致
+        offset = time.time() - time.monotonic()
+
+        upserts = []
+        for client_id, agent in delta["agents"].items():
+            entry = {key: value for key, value in agent.items() if key not in _VOLATILE_FIELDS}
+            state = clients.get(client_id)
+            last_heartbeat = state.last_heartbeat if state is not None else 0.0
+            self._heartbeats[client_id] = last_heartbeat
+            upserts.append((client_id, json.dumps(entry, ensure_ascii=False), last_heartbeat + offset))
+        for client_id in delta["removed"]:
+            self._heartbeats.pop(client_id, None)
+
+        # 只有心跳时间更新的agent不算快照变化，单独比较
+        heartbeats = []
+        for client_id, state in list(clients.items()):
+            last_heartbeat = state.last_heartbeat
+            published = self._heartbeats.get(client_id)
+            if published is not None and published != last_heartbeat:
+                self._heartbeats[client_id] = last_heartbeat
+                heartbeats.append((last_heartbeat + offset, client_id))
+
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            if delta["full"]:
+                conn.execute("DELETE FROM agents")
+                self._heartbeats = {client_id: self._heartbeats[client_id] for client_id in delta["agents"]}
+            conn.executemany("INSERT OR REPLACE INTO agents (id, entry, last_heartbeat) VALUES (?, ?, ?)", upserts)
+            conn.executemany("DELETE FROM agents WHERE id = ?", [(client_id,) for client_id in delta["removed"]])
+            conn.executemany("UPDATE agents SET last_heartbeat = ? WHERE id = ?", heartbeats)
+            conn.execute("INSERT OR REPLACE INTO worker (id, pid, started, updated, version) VALUES (0, ?, ?, ?, ?)",
+                         (os.getpid(), self._started, time.time(), delta["version"]))
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            # 下次发布全量重建
+            self._version = None
+            raise
+        self._version = delta["version"]
+
+
+class AgentRegistryReader:
+    """合并读取所有心跳进程的注册表
+
+    超过stale_after秒没有发布的进程（已退出或卡住）视为不可用，它的agent不计入结果。
+    """
+
+    def __init__(self, directory: str, workers: int, stale_after: float = 5.0):
+        self.directory = directory
+        self.workers = workers
+        self.stale_after = stale_after
+
+    def _read_worker(self, worker_index: int):
+        """返回 (进程信息, 行列表)，文件不存在时返回 (None, [])"""
+        path = registry_path(self.directory, worker_index)
+        if not os.path.exists(path):
+            return None, []
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            # 同一个读事务内读取，进程信息和agent行一致
+            conn.execute("BEGIN")
+            worker = conn.execute("SELECT pid, started, updated, version FROM worker").fetchone()
+            rows = conn.execute("SELECT id, entry, last_heartbeat FROM agents").fetchall()
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return worker, rows
+
+    def read(self) -> Dict[str, Any]:
+        """合并后的agent状态，格式与AgentStatusSnapshot.read()的全量结果相同，另外带各进程的发布状态"""
+        now = time.time()
+        agents: Dict[str, Dict[str, Any]] = {}
+        heartbeats: Dict[str, float] = {}
+        workers: List[Dict[str, Any]] = []
+        version = 0
+        for worker_index in range(self.workers):
+            try:
+                worker, rows = self._read_worker(worker_index)
+            except sqlite3.Error as e:
+                workers.append({"worker": worker_index, "alive": False, "error": str(e)})
+                continue
+            if worker is None:
+                workers.append({"worker": worker_index, "alive": False})
+                continue
+            pid, started, updated, worker_version = worker
+            alive = now - updated <= self.stale_after
+            workers.append({"worker": worker_index, "pid": pid, "alive": alive, "agents": len(rows),
+                            "seconds_since_publish": round(now - updated, 1),
+                            "started": datetime.fromtimestamp(started).isoformat()})
+            if not alive:
+                continue
+            version += worker_version
+            for client_id, entry, last_heartbeat in rows:
+                if heartbeats.get(client_id, -1.0) >= last_heartbeat:
+                    continue
+                agent = json.loads(entry)
+                agent["worker"] = worker_index
+                agent["last_heartbeat"] = datetime.fromtimestamp(last_heartbeat).isoformat()
+                agent["seconds_since_heartbeat"] = round(now - last_heartbeat, 1)
+                agents[client_id] = agent
+                heartbeats[client_id] = last_heartbeat
+
+        status_counts: Dict[str, int] = {}
+        for agent in agents.values():
+            status_counts[agent["status"]] = status_counts.get(agent["status"], 0) + 1
+        return {
+            "version": version,
+            "full": True,
+            "agents": agents,
+            "removed": [],
+            "status_counts": status_counts,
+            "workers": workers
+        }
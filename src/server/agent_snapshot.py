@@ -0,0 +1,168 @@
+"""
+agent状态快照 - 带版本号、增量更新的get_agent_status数据
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from server.agent_state import AgentState
+
+
+class _ReadOnlyDict(dict):
+    """只读字典：缓存的条目直接返回给读取方，不复制；修改时抛出TypeError，需要修改时先dict(...)复制"""
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("快照条目是只读的")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        # copy.deepcopy / pickle 得到普通字典
+        return dict, (dict(self),)
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return _ReadOnlyDict((key, _freeze(item)) for key, item in value.items())
+    return value
+
+
+class AgentStatusSnapshot:
+    """按版本号增量维护的agent状态快照
+
+    心跳服务器在agent的展示内容变化时（新agent、重连、状态变化、新的system_info）调用touch，
+    只记录版本号，不构建数据；读取时只重新构建变化过的agent，其余直接使用缓存的条目。
+    每次变化版本号加一，read(since_version)只返回该版本之后变化或移除的agent。
+    只有心跳时间更新的心跳不算变化，返回的条目中的心跳时间总是最新的：格式化后的心跳时间缓存在条目中，
+    读取时只重新格式化心跳时间变化过的agent，全量读取不需要每次格式化所有agent的时间。
+    缓存的条目（包括嵌套的system_info）是只读字典，读取时直接返回，不复制；条目变化时整体替换，
+    已经返回给读取方的条目不会再被修改。
+    """
+
+    def __init__(self, max_removed: int = 10000):
+        self.version = 0
+        self._entries: Dict[str, Dict[str, Any]] = {}  # agent ID -> 缓存的状态条目（含格式化后的心跳时间）
+        self._formatted: Dict[str, float] = {}  # agent ID -> 条目中的心跳时间对应的monotonic时间戳
+        self._states: Dict[str, AgentState] = {}  # agent ID -> agent状态
+        self._changes = OrderedDict()  # agent ID -> 最近一次变化的版本号，按版本号排序
+        self._dirty: Dict[str, AgentState] = {}  # 变化后还未重新构建条目的agent
+        self._removed = deque(maxlen=max_removed)  # (版本号, agent ID)
+        self._removed_horizon = 0  # 更早的移除记录已被淘汰，早于该版本的增量查询返回全量
+        self._status_counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def touch(self, state: AgentState):
+        """agent的展示内容发生变化"""
+        with self._lock:
+            self.version += 1
+            client_id = state.client_id
+            self._states[client_id] = state
+            self._dirty[client_id] = state
+            self._changes[client_id] = self.version
+            self._changes.move_to_end(client_id)
+
+    def remove(self, client_id: str):
+        """agent已被移除"""
+        with self._lock:
+            if self._states.pop(client_id, None) is None:
+                return
+            self.version += 1
+            self._dirty.pop(client_id, None)
+            self._changes.pop(client_id, None)
+            self._formatted.pop(client_id, None)
+            entry = self._entries.pop(client_id, None)
+            if entry is not None:
+                self._count(entry["status"], -1)
+            if len(self._removed) == self._removed.maxlen:
+                self._removed_horizon = self._removed[0][0]
+            self._removed.append((self.version, client_id))
+
+    def _count(self, status: str, delta: int):
+        count = self._status_counts.get(status, 0) + delta
+        if count:
+            self._status_counts[status] = count
+        else:
+            self._status_counts.pop(status, None)
+
+    @staticmethod
+    def _build_entry(state: AgentState, version: int) -> Dict[str, Any]:
+        address = state.client_address
+        entry = {
+            "id": state.client_id,
+            "address": f"{address[0]}:{address[1]}",
+            "status": state.status,  # active / late / dead / disconnected
+            "reconnects": state.reconnects,
+            "version": version
+        }
+        if state.system_info is not None:
+            entry["system_info"] = state.system_info.to_status()
+        return _freeze(entry)
+
+    def _refresh(self):
+        """重新构建变化过的条目（调用方需持有_lock）"""
+        for client_id, state in self._dirty.items():
+            entry = self._build_entry(state, self._changes[client_id])
+            old = self._entries.get(client_id)
+            if old is not None:
+                self._count(old["status"], -1)
+            self._count(entry["status"], 1)
+            self._entries[client_id] = entry
+            self._formatted.pop(client_id, None)
+        self._dirty.clear()
+
+    def read(self, since_version: Optional[int] = None, with_age: bool = False) -> Dict[str, Any]:
+        """读取快照：since_version为None时返回所有agent，否则只返回该版本之后变化的agent和移除的agent ID
+
+        since_version早于已保留的移除记录或晚于当前版本（服务器重启）时返回全量，full为True。
+        返回的条目是只读的缓存条目；with_age为True时复制条目并加上seconds_since_heartbeat（按同一时刻计算）。
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._refresh()
+            full = since_version is None or since_version < self._removed_horizon or since_version > self.version
+            if full:
+                client_ids = list(self._entries)
+                removed = []
+            else:
+                client_ids = []
+                for client_id, version in reversed(self._changes.items()):
+                    if version <= since_version:
+                        break
+                    client_ids.append(client_id)
+                client_ids.reverse()
+                removed = []
+                for version, client_id in reversed(self._removed):
+                    if version <= since_version:
+                        break
+                    if client_id not in self._entries:
+                        removed.append(client_id)
+                removed = list(dict.fromkeys(removed))
+
+            # monotonic -> time.time() 的偏移，一次读取内只计算一次
+            offset = time.time() - now
+            formatted = self._formatted
+            states = self._states
+            agents = {}
+            for client_id in client_ids:
+                entry = self._entries[client_id]
+                last_heartbeat = states[client_id].last_heartbeat
+                if formatted.get(client_id) != last_heartbeat:
+                    # 替换条目而不是原地修改，之前返回的条目保持不变
+                    entry = self._entries[client_id] = _ReadOnlyDict(
+                        entry, last_heartbeat=datetime.fromtimestamp(offset + last_heartbeat).isoformat())
+                    formatted[client_id] = last_heartbeat
+                if with_age:
+                    entry = dict(entry, seconds_since_heartbeat=round(now - last_heartbeat, 1))
+                agents[client_id] = entry
+
+            return {
+                "version": self.version,
+                "full": full,
+                "agents": agents,
+                "removed": removed,
+                "status_counts": dict(self._status_counts)
+            }
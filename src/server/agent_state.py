@@ -0,0 +1,127 @@
+"""
+agent状态记录 - 心跳服务器为每个客户端保存的紧凑状态
+"""
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Any, Callable, Optional
+
+
+def format_monotonic(timestamp: float) -> str:
+    """把time.monotonic()时间戳转换为本地时间的ISO格式字符串（只在需要展示时调用）"""
+    return datetime.fromtimestamp(time.time() - time.monotonic() + timestamp).isoformat()
+
+
+# system_info中的数值字段，与SystemInfo的字段同名
+_NUMERIC_FIELDS = ("cpu_usage", "memory_total", "memory_used", "disk_total", "disk_used",
+                   "network_upload", "network_download")
+
+
+def _percent(used: float, total: float) -> float:
+    return round(used / total * 100, 2) if total else 0
+
+
+@dataclass(slots=True)
+class SystemInfo:
+    """system_info类型心跳中的系统信息，收到时解析一次"""
+    machine_name: str = "unknown"
+    os_version: str = "unknown"
+    cpu_usage: float = 0.0
+    memory_total: float = 0.0
+    memory_used: float = 0.0
+    disk_total: float = 0.0
+    disk_used: float = 0.0
+    network_upload: float = 0.0
+    network_download: float = 0.0
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SystemInfo":
+        info = cls()
+        info.update(data)
+        return info
+
+    def update(self, data: Dict[str, Any]):
+        """用新上报的system_info原地更新，缺失或非数值的字段记为0"""
+        get = data.get
+        machine_name = get("machine_name", "unknown")
+        os_version = get("os_version", "unknown")
+        self.machine_name = machine_name if type(machine_name) is str else str(machine_name)
+        self.os_version = os_version if type(os_version) is str else str(os_version)
+        (self.cpu_usage, self.memory_total, self.memory_used, self.disk_total, self.disk_used,
+         self.network_upload, self.network_download) = [
+            value if type(value) is float else float(value) if type(value) is int else 0.0
+            for value in map(get, _NUMERIC_FIELDS)
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """还原为上报时的字段格式"""
+        return {
+            "type": "system_info",
+            "machine_name": self.machine_name,
+            "os_version": self.os_version,
+            "cpu_usage": self.cpu_usage,
+            "memory_total": self.memory_total,
+            "memory_used": self.memory_used,
+            "disk_total": self.disk_total,
+            "disk_used": self.disk_used,
+            "network_upload": self.network_upload,
+            "network_download": self.network_download
+        }
+
+    def to_status(self) -> Dict[str, Any]:
+        """agent状态中展示的系统信息（带使用率）"""
+        return {
+            "machine_name": self.machine_name,
+            "os_version": self.os_version,
+            "cpu_usage": round(self.cpu_usage, 2),
+            "memory": {
+                "total": self.memory_total,
+                "used": self.memory_used,
+                "usage_percent": _percent(self.memory_used, self.memory_total)
+            },
+            "disk": {
+                "total": self.disk_total,
+                "used": self.disk_used,
+                "usage_percent": _percent(self.disk_used, self.disk_total)
+            },
+            "network": {
+                "upload": round(self.network_upload, 2),
+                "download": round(self.network_download, 2)
+            }
+        }
+
+
+@dataclass(slots=True)
+class AgentState:
+    """单个agent的状态，时间戳为time.monotonic()，展示时才格式化"""
+    client_id: str  # agent ID（心跳中的agent_id/machine_name，没有时为连接地址）
+    client_address: tuple  # 最近一次连接的地址
+    code: Any = None
+    data: Any = None  # 最近一次非system_info心跳的data
+    last_heartbeat: float = 0.0
+    heartbeat_count: int = 0
+    system_info: Optional[SystemInfo] = None
+    status: str = "active"  # active / late / dead / disconnected，由LivenessTracker更新；removed表示已移除
+    close_connection: Optional[Callable[[], None]] = None  # 关闭该agent当前的连接
+    connection_id: str = ""  # 当前连接的 "ip:port"
+    reconnects: int = 0
+    disconnected_at: float = 0.0
+    liveness_seq: int = 0  # LivenessTracker中有效条目的序号
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典（get_clients的返回格式）"""
+        last_heartbeat = format_monotonic(self.last_heartbeat)
+        result = {
+            "last_heartbeat": last_heartbeat,
+            "code": self.code,
+            "data": self.data,
+            "client_address": self.client_address,
+            "server_received_time": last_heartbeat,
+            "heartbeat_count": self.heartbeat_count,
+            "status": self.status,
+            "connection_id": self.connection_id,
+            "reconnects": self.reconnects
+        }
+        if self.system_info is not None:
+            result["system_info"] = self.system_info.to_dict()
+        return result
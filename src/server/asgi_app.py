@@ -0,0 +1,134 @@
+"""
+ASGI应用 - 用Starlette提供与Flask相同的HTTP API
+
+请求处理逻辑与Flask路由共用HTTPServer的handle_*方法；长轮询使用协程版本，等待时不占用线程，
+可以与MCP和心跳服务器运行在同一个事件循环中（见main.py的统一事件循环模式）。
+"""
+import asyncio
+import functools
+import re
+import time
+from typing import Any, Dict, Tuple
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+from server.http_server import HTTPServer, observe_request
+from utils.codec import json_dumps, json_loads
+from utils.logger import RATE_LIMITED
+from utils.metrics import CONTENT_TYPE
+
+
+class CodecJSONResponse(JSONResponse):
+    """由utils.codec编码的JSON响应（与Flask的响应编码相同）"""
+
+    def render(self, content: Any) -> bytes:
+        return json_dumps(content)
+
+
+def create_asgi_app(server: HTTPServer) -> Starlette:
+    """创建提供server的HTTP API的ASGI应用"""
+
+    def respond(request: Request, result: Tuple[Dict[str, Any], int]) -> JSONResponse:
+        body, status = result
+        # 与Flask的请求日志中间件相同：每个请求在响应后记录一条（同类日志限速）
+        server.logger.info("请求: %s %s from %s -> %d", request.method, request.url.path, client_host(request), status,
+                           extra=RATE_LIMITED)
+        return CodecJSONResponse(body, status)
+
+    async def read_json(request: Request) -> Any:
+        """读取JSON请求体，格式错误时返回None"""
+        try:
+            return json_loads(await request.body())
+        except ValueError:
+            return None
+
+    async def run_write(handler, *args) -> Tuple[Dict[str, Any], int]:
+        """添加任务的请求：使用sqlite存储时需要等待写入落盘，放到线程中等待，不阻塞事件循环"""
+        if server.task_store is not None:
+            return await asyncio.to_thread(handler, *args)
+        return handler(*args)
+
+    async def worker2_command(request: Request) -> JSONResponse:
+        return respond(request, await server.handle_worker_command_async(request.query_params, client_host(request)))
+
+    async def worker2_results(request: Request) -> JSONResponse:
+        return respond(request, server.handle_worker_results(await read_json(request)))
+
+    async def health_check(request: Request) -> JSONResponse:
+        return respond(request, server.handle_health())
+
+    async def get_tasks(request: Request) -> JSONResponse:
+        return respond(request, server.handle_tasks())
+
+    async def get_task_result(request: Request) -> JSONResponse:
+        task_id = request.path_params["task_id"]
+        return respond(request, await server.handle_task_result_async(task_id, request.query_params))
+
+    async def add_task(request: Request) -> JSONResponse:
+        return respond(request, await run_write(server.handle_add_task, await read_json(request)))
+
+    async def add_tasks(request: Request) -> JSONResponse:
+        return respond(request, await run_write(server.handle_add_tasks, await read_json(request)))
+
+    async def broadcast_task(request: Request) -> JSONResponse:
+        return respond(request, await run_write(server.handle_broadcast, await read_json(request)))
+
+    async def get_broadcast_status(request: Request) -> JSONResponse:
+        return respond(request, server.handle_broadcast_status(request.path_params["broadcast_id"]))
+
+    async def get_fleet(request: Request) -> JSONResponse:
+        return respond(request, server.handle_fleet(request.query_params))
+
+    async def index(request: Request) -> JSONResponse:
+        return respond(request, server.handle_index())
+
+    async def admin_profile(request: Request) -> JSONResponse:
+        # action=run时阻塞seconds秒，放到线程中运行，事件循环线程也能被采样
+        return respond(request, await asyncio.to_thread(server.handle_profile, request.query_params,
+                                                        client_host(request)))
+
+    async def admin_threads(request: Request) -> JSONResponse:
+        return respond(request, server.handle_threads(client_host(request)))
+
+    async def metrics(request: Request) -> PlainTextResponse:
+        return PlainTextResponse(server.handle_metrics(), headers={"Content-Type": CONTENT_TYPE})
+
+    routes = [
+        timed_route('/worker2/command', worker2_command, 'GET'),
+        timed_route('/worker2/results', worker2_results, 'POST'),
+        timed_route('/health', health_check, 'GET'),
+        timed_route('/tasks', get_tasks, 'GET'),
+        timed_route('/tasks/{task_id:int}', get_task_result, 'GET'),
+        timed_route('/tasks/add', add_task, 'POST'),
+        timed_route('/tasks/add_batch', add_tasks, 'POST'),
+        timed_route('/tasks/broadcast', broadcast_task, 'POST'),
+        timed_route('/tasks/broadcast/{broadcast_id:int}', get_broadcast_status, 'GET'),
+        timed_route('/agents/fleet', get_fleet, 'GET'),
+        timed_route('/metrics', metrics, 'GET'),
+        timed_route('/admin/profile', admin_profile, 'GET'),
+        timed_route('/admin/threads', admin_threads, 'GET'),
+        timed_route('/', index, 'GET'),
+    ]
+    return Starlette(routes=routes)
+
+
+def timed_route(path: str, endpoint, method: str) -> Route:
+    """创建记录请求指标的路由，route标签使用与Flask相同的写法（如 /tasks/<int:task_id>）"""
+    label = re.sub(r"\{(\w+):(\w+)\}", r"<\2:\1>", path)
+
+    @functools.wraps(endpoint)
+    async def wrapper(request: Request) -> Response:
+        start = time.perf_counter()
+        response = await endpoint(request)
+        observe_request(method, label, response.status_code, time.perf_counter() - start)
+        return response
+
+    return Route(path, wrapper, methods=[method])
+
+
+def client_host(request: Request) -> str:
+    """客户端地址（与Flask的request.remote_addr相同）"""
+    return request.client.host if request.client else ""
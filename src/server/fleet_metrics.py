@@ -0,0 +1,143 @@
+"""
+集群指标列存 - 每个agent最新system_info指标的NumPy列式视图，用于整个集群的聚合和Top-N查询
+"""
+import threading
+from typing import Dict, Any, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # numpy为可选依赖，未安装时不提供集群聚合查询
+    np = None
+
+from server.agent_state import SystemInfo
+
+# 列名，memory_usage/disk_usage为使用率（百分比）
+FLEET_METRICS = ("cpu_usage", "memory_usage", "disk_usage", "network_upload", "network_download")
+_METRIC_INDEX = {name: index for index, name in enumerate(FLEET_METRICS)}
+
+_NAN = float("nan")
+
+
+def _percent(used: float, total: float) -> float:
+    return used / total * 100 if total else _NAN
+
+
+class FleetMetrics:
+    """所有agent最新指标的列式存储
+
+    每个agent占一行，收到system_info时原地覆盖该行；移除的agent所在行置为NaN并留给新agent复用。
+    查询在一次向量化计算中得到整个集群的均值、百分位数、阈值过滤和Top-N，不遍历agent对象。线程安全。
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.enabled = np is not None
+        self._ids: List[Optional[str]] = []  # 行号 -> agent ID（空闲行为None）
+        self._rows: Dict[str, int] = {}  # agent ID -> 行号
+        self._free: List[int] = []  # 可复用的空闲行
+        self._lock = threading.Lock()
+        self._values = np.full((capacity, len(FLEET_METRICS)), np.nan) if self.enabled else None
+
+    def update(self, agent_id: str, info: SystemInfo):
+        """用agent最新的system_info覆盖对应行"""
+        if not self.enabled:
+            return
+        row_values = (info.cpu_usage, _percent(info.memory_used, info.memory_total),
+                      _percent(info.disk_used, info.disk_total), info.network_upload, info.network_download)
+        with self._lock:
+            row = self._rows.get(agent_id)
+            if row is None:
+                row = self._allocate(agent_id)
+            self._values[row] = row_values
+
+    def _allocate(self, agent_id: str) -> int:
+        """为新agent分配一行，容量不够时翻倍（调用方需持有_lock）"""
+        if self._free:
+            row = self._free.pop()
+            self._ids[row] = agent_id
+        else:
+            row = len(self._ids)
+            if row == len(self._values):
+                grown = np.full((len(self._values) * 2, len(FLEET_METRICS)), np.nan)
+                grown[:row] = self._values
+                self._values = grown
+            self._ids.append(agent_id)
+        self._rows[agent_id] = row
+        return row
+
+    def remove(self, agent_id: str):
+        """agent已被移除，释放它所在的行"""
+        if not self.enabled:
+            return
+        with self._lock:
+            row = self._rows.pop(agent_id, None)
+            if row is not None:
+                self._values[row] = np.nan
+                self._ids[row] = None
+                self._free.append(row)
+
+    def query(self, metric: str = "cpu_usage", top: int = 10, order: str = "desc",
+              percentiles: Sequence[float] = (50, 90, 99), min_value: Optional[float] = None,
+              max_value: Optional[float] = None) -> Dict[str, Any]:
+        """计算一个指标在整个集群上的统计和Top-N
+
+        count/mean/min/max/percentiles覆盖所有上报过该指标的agent；min_value/max_value为阈值过滤，
+        matched为满足阈值的agent数，agents为其中按order（desc从高到低，asc从低到高）排序的前top个。
+        """
+        if not self.enabled:
+            raise RuntimeError("集群聚合查询需要安装numpy")
+        if metric not in _METRIC_INDEX:
+            raise ValueError(f"未知的指标: {metric}，可选: {', '.join(FLEET_METRICS)}")
+        if order not in ("desc", "asc"):
+            raise ValueError("order必须是desc或asc")
+        if any(not 0 <= p <= 100 for p in percentiles):
+            raise ValueError("百分位数必须在0到100之间")
+
+        with self._lock:
+            count = len(self._ids)
+            column = self._values[:count, _METRIC_INDEX[metric]].copy()
+            ids = list(self._ids)
+
+        rows = np.flatnonzero(~np.isnan(column))
+        values = column[rows]
+        result = {"metric": metric, "count": int(values.size)}
+        if not values.size:
+            result.update({"mean": None, "min": None, "max": None, "percentiles": {}, "matched": 0, "agents": []})
+            return result
+
+        result["mean"] = round(float(values.mean()), 2)
+        result["min"] = round(float(values.min()), 2)
+        result["max"] = round(float(values.max()), 2)
+        if percentiles:
+            points = np.percentile(values, percentiles)
+            result["percentiles"] = {f"p{p:g}": round(float(v), 2) for p, v in zip(percentiles, points)}
+        else:
+            result["percentiles"] = {}
+
+        # 阈值过滤
+        mask = np.ones(values.size, dtype=bool)
+        if min_value is not None:
+            mask &= values >= min_value
+        if max_value is not None:
+            mask &= values <= max_value
+        rows, values = rows[mask], values[mask]
+        result["matched"] = int(values.size)
+
+        # Top-N：先用argpartition选出前top个，再只对这top个排序
+        top = min(max(top, 0), values.size)
+        if top:
+            keys = -values if order == "desc" else values
+            selected = np.argpartition(keys, top - 1)[:top] if top < values.size else np.arange(values.size)
+            selected = selected[np.argsort(keys[selected], kind="stable")]
+            result["agents"] = [{"agent_id": ids[rows[i]], "value": round(float(values[i]), 2)} for i in selected]
+        else:
+            result["agents"] = []
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取存储统计信息"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "agents": len(self._rows),
+                "capacity": len(self._values) if self.enabled else 0
+            }
@@ -0,0 +1,127 @@
+"""
+多进程心跳服务器 - K个心跳进程通过SO_REUSEPORT监听同一端口，内核把新连接分配到各个进程
+
+单个进程中心跳的解析和JSON解码受GIL限制只能使用一个核，多进程模式下每个进程独立处理自己的连接，
+吞吐量随进程数（不超过核数）增长。各进程把agent最新状态发布到共享注册表（见agent_registry），
+get_agent_status读取合并后的视图。
+"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+from server.agent_registry import AgentRegistryReader, remove_registry
+from utils.logger import setup_logger
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 心跳进程的入口脚本
+_WORKER_SCRIPT = os.path.join(_ROOT, "run_server.py")
+
+
+class HeartbeatCluster:
+    """管理K个心跳进程：启动、异常退出后重启、停止，以及读取合并的agent状态
+
+    心跳进程是运行run_server.py的独立解释器（不使用fork：调用方进程中已经有日志、HTTP等线程），
+    标准输出重定向到/dev/null，不影响MCP的stdio。
+    """
+
+    def __init__(self, host: str, port: int, engine: str = "thread", workers: int = 2,
+                 registry_dir: str = "data/agent_registry", publish_interval: float = 1.0):
+        if workers < 1:
+            raise ValueError("心跳进程数必须大于0")
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise RuntimeError("当前平台不支持SO_REUSEPORT，无法运行多进程心跳服务器")
+
+        self.host = host
+        self.port = port
+        self.engine = engine
+        self.workers = workers
+        # 相对路径相对于项目根目录；按端口分目录，同一台机器上的多个集群互不影响
+        if not os.path.isabs(registry_dir):
+            registry_dir = os.path.join(_ROOT, registry_dir)
+        self.registry_dir = os.path.join(registry_dir, str(port))
+        self.publish_interval = publish_interval
+        self.reader = AgentRegistryReader(self.registry_dir, workers, stale_after=max(5.0, publish_interval * 5))
+        self.running = False
+        self.logger = setup_logger("HeartbeatServer", "heartbeat_server.log")
+        self._processes: List[Optional[subprocess.Popen]] = [None] * workers
+        self._restarts = [0] * workers
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+
+    def _spawn(self, worker_index: int) -> subprocess.Popen:
+        args = [sys.executable, _WORKER_SCRIPT, "--host", self.host, "--port", str(self.port),
+                "--engine", self.engine, "--worker-index", str(worker_index),
+                "--registry-dir", self.registry_dir, "--publish-interval", str(self.publish_interval)]
+        return subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+
+    def start(self):
+        """启动所有心跳进程（不阻塞）"""
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+            self._stopped.clear()
+            for worker_index in range(self.workers):
+                self._processes[worker_index] = self._spawn(worker_index)
+        self.logger.info(f"多进程心跳服务器启动在 {self.host}:{self.port} (workers={self.workers}, engine={self.engine})")
+        self._monitor = threading.Thread(target=self._monitor_loop, name="HeartbeatClusterMonitor", daemon=True)
+        self._monitor.start()
+
+    def _monitor_loop(self):
+        """心跳进程异常退出时重启（Ctrl+C会同时发给整个进程组，正常退出的进程不重启）"""
+        while not self._stopped.wait(1.0):
+            with self._lock:
+                if not self.running:
+                    return
+                for worker_index, process in enumerate(self._processes):
+                    if process is None or process.poll() is None:
+                        continue
+                    if process.returncode == 0:
+                        self.logger.info(f"心跳进程 {worker_index} (pid={process.pid}) 已退出")
+                        self._processes[worker_index] = None
+                        continue
+                    self.logger.error(f"心跳进程 {worker_index} (pid={process.pid}) 退出，返回码 {process.returncode}，"
+                                      f"正在重启")
+                    self._restarts[worker_index] += 1
+                    self._processes[worker_index] = self._spawn(worker_index)
+
+    def wait(self):
+        """阻塞直到stop()"""
+        while not self._stopped.wait(1.0):
+            pass
+
+    def stop(self, timeout: float = 10.0):
+        """向所有心跳进程发送SIGINT并等待退出"""
+        with self._lock:
+            if not self.running:
+                return
+            self.running = False
+            self._stopped.set()
+            processes = [process for process in self._processes if process is not None]
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+        deadline = time.monotonic() + timeout
+        for process in processes:
+            try:
+                process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        for worker_index in range(self.workers):
+            remove_registry(self.registry_dir, worker_index)
+        self.logger.info("多进程心跳服务器已停止")
+
+    def read(self) -> Dict[str, Any]:
+        """所有心跳进程合并后的agent状态，workers中附带各进程的pid和重启次数"""
+        result = self.reader.read()
+        with self._lock:
+            for worker in result["workers"]:
+                worker["restarts"] = self._restarts[worker["worker"]]
+        return result
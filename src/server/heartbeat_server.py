@@ -1,69 +1,128 @@
 """
 TCP Socket服务器 - 接收客户端心跳信息
+
+支持两种运行引擎：
+- thread: 每个客户端连接一个处理线程（默认）
+- asyncio: 单个事件循环处理所有客户端连接，适合大量并发连接
+
+消息可以是JSON文本或二进制帧（见utils.codec），按连接协商，回复使用与请求相同的编码。
 """
+import asyncio
 import socket
 import threading
-import json
 import time
 import logging
-from datetime import datetime
-from typing import Dict, Any, Optional
-from dataclasses import dataclass, asdict
-
-
-@dataclass
+from typing import Dict, Any, Optional, Tuple
+from dataclasses import dataclass
+
+from config.server_config import ServerConfig
+from server.agent_metrics import AgentMetricsStore
+from server.agent_snapshot import AgentStatusSnapshot
+from server.fleet_metrics import FleetMetrics
+from server.agent_state import AgentState, SystemInfo
+from server.liveness import LivenessTracker
+from utils.codec import BINARY_MAGIC, decode_message, encode_response, json_loads
+from utils.framing import FrameDecoder
+from utils.logger import setup_logger, RATE_LIMITED
+from utils.metrics import REGISTRY
+
+# 运行指标（见 GET /metrics）
+HEARTBEATS = REGISTRY.counter("heartbeats_total", "处理的心跳消息数")
+HEARTBEAT_ERRORS = REGISTRY.counter("heartbeat_parse_errors_total", "无法处理的心跳消息数", ("reason",))
+HEARTBEAT_LATENCY = REGISTRY.histogram("heartbeat_process_seconds", "处理一条心跳消息的耗时（秒）",
+                                       buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                                                0.001, 0.0025, 0.005, 0.01, 0.1))
+HEARTBEAT_CONNECTIONS = REGISTRY.gauge("heartbeat_connections", "心跳服务器的活跃连接数")
+
+
+@dataclass(slots=True)
 class HeartbeatMessage:
     """心跳消息数据结构"""
     code: int
     data: str
+    agent_id: Optional[str] = None  # agent的稳定标识（可选）
+
+
+# 回复内容固定，按两种编码预先编码：{是否二进制: 回复字节}
+_ACK_RESPONSE = {binary: encode_response(0, binary=binary) for binary in (False, True)}
+_INVALID_RESPONSE = {binary: encode_response(400, "error", "消息格式错误", binary) for binary in (False, True)}
+_OVERSIZE_RESPONSE = {binary: encode_response(413, "error", "消息过大", binary) for binary in (False, True)}
 
 class HeartbeatServer:
     """心跳服务器"""
 
-    def __init__(self, host: str = "localhost", port: int = 8888):
+    # 支持的运行引擎
+    ENGINES = ("thread", "asyncio")
+
+    def __init__(self, host: str = "localhost", port: int = 8888, engine: str = "thread",
+                 reuse_port: bool = False, log_file: str = "heartbeat_server.log"):
+        if engine not in self.ENGINES:
+            raise ValueError(f"不支持的运行引擎: {engine}，可选: {', '.join(self.ENGINES)}")
+
         self.host = host
         self.port = port
+        self.engine = engine
+        # 多进程模式（见heartbeat_cluster）下多个进程通过SO_REUSEPORT监听同一端口
+        self.reuse_port = reuse_port
+        self.log_file = log_file
         self.server_socket = None
-        self.clients = {}  # 存储客户端信息
+        self.clients: Dict[str, AgentState] = {}  # agent ID -> agent状态
+        self.connections: Dict[str, str] = {}  # 连接 "ip:port" -> agent ID（只记录上报过agent标识的连接）
+        # 每个agent的system_info指标历史（客户端断开后保留）
+        self.metrics = AgentMetricsStore(
+            raw_samples=ServerConfig.METRICS_RAW_SAMPLES,
+            minute_buckets=ServerConfig.METRICS_MINUTE_BUCKETS,
+            hour_buckets=ServerConfig.METRICS_HOUR_BUCKETS,
+            max_agents=ServerConfig.METRICS_MAX_AGENTS
+        )
+        # 存活检测：超过期望间隔×最大丢失次数没有心跳为late，超过CLIENT_TIMEOUT为dead
+        self.liveness = LivenessTracker(
+            late_after=ServerConfig.EXPECTED_HEARTBEAT_INTERVAL * ServerConfig.MAX_MISSED_HEARTBEATS,
+            dead_after=ServerConfig.CLIENT_TIMEOUT,
+            grace_period=ServerConfig.AGENT_GRACE_PERIOD
+        )
+        # get_agent_status使用的带版本号的状态快照，展示内容变化时更新
+        self.snapshot = AgentStatusSnapshot()
+        # 每个agent最新system_info指标的列式视图，用于集群聚合查询
+        self.fleet = FleetMetrics()
+        REGISTRY.gauge("heartbeat_agents", "已注册的agent数", func=lambda: len(self.clients))
         self.running = False
         self.logger = self._setup_logger()
 
-    def _setup_logger(self) -> logging.Logger:
-        """设置日志记录器"""
-        logger = logging.getLogger("HeartbeatServer")
-        logger.setLevel(logging.INFO)
-
-        # 避免重复添加处理器
-        if logger.handlers:
-            return logger
+        # asyncio引擎使用的事件循环和服务器对象
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_server: Optional[asyncio.AbstractServer] = None
+        self._async_writers = set()  # asyncio引擎下的活跃连接
 
-        # 只创建文件处理器，不输出到控制台
-        file_handler = logging.FileHandler("logs/heartbeat_server.log", encoding="utf-8")
-        file_handler.setLevel(logging.INFO)
-
-        # 创建格式器
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-        file_handler.setFormatter(formatter)
-
-        # 只添加文件处理器
-        logger.addHandler(file_handler)
-
-        return logger
+    def _setup_logger(self) -> logging.Logger:
+        """设置日志记录器（后台线程写入轮转文件，不输出到控制台）"""
+        return setup_logger("HeartbeatServer", self.log_file)
 
     def start(self):
-        """启动服务器"""
+        """启动服务器（按engine选择运行引擎，阻塞直到服务器停止）"""
+        if self.engine == "asyncio":
+            self._start_asyncio()
+        else:
+            self._start_threaded()
+
+    def _start_threaded(self):
+        """线程引擎：每个客户端连接一个处理线程"""
         try:
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.reuse_port:
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             # 设置socket超时，这样可以定期检查self.running状态
             self.server_socket.settimeout(1.0)
             self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
+            self.server_socket.listen(ServerConfig.LISTEN_BACKLOG)
             self.running = True
 
-            self.logger.info(f"心跳服务器启动在 {self.host}:{self.port}")
+            self.logger.info(f"心跳服务器启动在 {self.host}:{self.port} (engine=thread)")
+
+            liveness_thread = threading.Thread(target=self._liveness_loop, name="HeartbeatLiveness")
+            liveness_thread.daemon = True
+            liveness_thread.start()
 
             while self.running:
                 try:
@@ -101,37 +160,28 @@ class HeartbeatServer:
     def _handle_client(self, client_socket: socket.socket, client_address: tuple):
         """处理客户端连接"""
         client_id = None
+        connection_id = f"{client_address[0]}:{client_address[1]}"
+        decoder = FrameDecoder(ServerConfig.MAX_MESSAGE_SIZE)
+        # 每个连接复用同一块接收缓冲区
+        recv_buffer = bytearray(ServerConfig.RECV_BUFFER_SIZE)
+        recv_view = memoryview(recv_buffer)
+        HEARTBEAT_CONNECTIONS.inc()
 
         try:
             while self.running:
                 try:
                     # 接收数据（有超时设置）
-                    data = client_socket.recv(1024)
-                    if not data:
+                    size = client_socket.recv_into(recv_buffer)
+                    if not size:
                         break
 
-                    try:
-                        # 解析心跳消息
-                        heartbeat = self._parse_heartbeat_message(data.decode('utf-8'))
-                        if heartbeat:
-                            client_id = f"{client_address[0]}:{client_address[1]}"
-                            self._process_heartbeat(heartbeat, client_address)
-
-                            # 发送确认响应
-                            response = {
-                                "code": 0,
-                                "data": "",
-                            }
-                            client_socket.send(json.dumps(response, ensure_ascii=False).encode('utf-8'))
-
-                    except json.JSONDecodeError as e:
-                        self.logger.error(f"解析socket消息失败: {e}")
-                        error_response = {
-                            "code": 400,
-                            "data": "error",
-                            "message": "消息格式错误"
-                        }
-                        client_socket.send(json.dumps(error_response, ensure_ascii=False).encode('utf-8'))
+                    response, message_client_id = self._handle_data(decoder, recv_view[:size], client_address)
+                    if message_client_id and message_client_id != client_id:
+                        client_id = message_client_id
+                        self._attach_connection(client_id, connection_id,
+                                                lambda: client_socket.shutdown(socket.SHUT_RDWR))
+                    if response:
+                        client_socket.sendall(response)
 
                 except socket.timeout:
                     # 超时是正常的，继续循环检查running状态
@@ -144,8 +194,9 @@ class HeartbeatServer:
             if self.running:  # 只在服务器还在运行时记录错误
                 self.logger.error(f"处理客户端 {client_address} 时出错: {e}")
         finally:
+            HEARTBEAT_CONNECTIONS.dec()
             if client_id:
-                self._remove_client(client_id)
+                self._remove_connection(connection_id)
             try:
                 client_socket.close()
             except Exception:
@@ -153,10 +204,192 @@ class HeartbeatServer:
             if self.running:
                 self.logger.info(f"客户端 {client_address} 连接关闭")
 
-    def _parse_heartbeat_message(self, data: str) -> Optional[HeartbeatMessage]:
-        """解析心跳消息"""
+    async def _serve_asyncio(self):
+        """asyncio引擎：在单个事件循环中接受并处理所有客户端连接"""
+        self._loop = asyncio.get_running_loop()
+        self._async_server = await asyncio.start_server(
+            self._handle_client_async,
+            self.host,
+            self.port,
+            reuse_address=True,
+            reuse_port=self.reuse_port,
+            backlog=ServerConfig.LISTEN_BACKLOG
+        )
+        self.running = True
+
+        self.logger.info(f"心跳服务器启动在 {self.host}:{self.port} (engine=asyncio)")
+
+        liveness_task = asyncio.create_task(self._liveness_loop_async())
+        try:
+            await self._async_server.serve_forever()
+        except asyncio.CancelledError:
+            # stop()关闭服务器时serve_forever会被取消
+            pass
+        finally:
+            liveness_task.cancel()
+
+    def _start_asyncio(self):
+        """asyncio引擎：运行事件循环直到服务器停止"""
+        try:
+            asyncio.run(self._serve_asyncio())
+        except KeyboardInterrupt:
+            self.logger.info("收到中断信号，正在停止服务器...")
+        except Exception as e:
+            self.logger.error(f"启动服务器失败: {e}")
+        finally:
+            self._loop = None
+            self._async_server = None
+            self.stop()
+
+    async def serve(self):
+        """在调用方的事件循环中运行服务器直到stop()（统一事件循环模式，始终使用asyncio引擎）"""
+        self.engine = "asyncio"
+        try:
+            await self._serve_asyncio()
+        finally:
+            self._loop = None
+            self._async_server = None
+
+    async def _handle_client_async(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理客户端连接（asyncio引擎），空闲连接不会被周期性唤醒"""
+        client_address = writer.get_extra_info("peername")
+        client_id = None
+        connection_id = f"{client_address[0]}:{client_address[1]}"
+        decoder = FrameDecoder(ServerConfig.MAX_MESSAGE_SIZE)
+        self._async_writers.add(writer)
+        HEARTBEAT_CONNECTIONS.inc()
+        self.logger.info(f"新客户端连接: {client_address}")
+
+        try:
+            while self.running:
+                data = await reader.read(ServerConfig.RECV_BUFFER_SIZE)
+                if not data:
+                    break
+
+                response, message_client_id = self._handle_data(decoder, data, client_address)
+                if message_client_id and message_client_id != client_id:
+                    client_id = message_client_id
+                    # 存活检测在事件循环中运行，可以直接关闭writer
+                    self._attach_connection(client_id, connection_id, writer.close)
+                if response:
+                    writer.write(response)
+                    await writer.drain()
+
+        except (ConnectionResetError, BrokenPipeError):
+            self.logger.info(f"客户端 {client_address} 断开连接")
+        except asyncio.CancelledError:
+            # 事件循环关闭时取消所有连接处理任务
+            pass
+        except Exception as e:
+            if self.running:
+                self.logger.error(f"处理客户端 {client_address} 时出错: {e}")
+        finally:
+            self._async_writers.discard(writer)
+            HEARTBEAT_CONNECTIONS.dec()
+            if client_id:
+                self._remove_connection(connection_id)
+            try:
+                writer.close()
+            except Exception:
+                pass
+            if self.running:
+                self.logger.info(f"客户端 {client_address} 连接关闭")
+
+    def _attach_connection(self, client_id: str, connection_id: str, close_connection):
+        """记录agent当前连接的关闭方法，存活检测判定为dead时用来断开半开连接"""
+        state = self.clients.get(client_id)
+        if state is not None and state.connection_id == connection_id:
+            state.close_connection = close_connection
+
+    def _liveness_loop(self):
+        """线程引擎：定期执行存活检测"""
+        while self.running:
+            time.sleep(ServerConfig.LIVENESS_CHECK_INTERVAL)
+            self._check_liveness()
+
+    async def _liveness_loop_async(self):
+        """asyncio引擎：在事件循环中定期执行存活检测"""
+        while self.running:
+            await asyncio.sleep(ServerConfig.LIVENESS_CHECK_INTERVAL)
+            self._check_liveness()
+
+    def _check_liveness(self):
+        """更新到期客户端的状态，断开dead客户端的连接，清除dead状态已保留足够久的客户端"""
+        try:
+            changed, dead, expired = self.liveness.sweep(time.monotonic())
+            for state in changed:
+                self.snapshot.touch(state)
+            for state in dead:
+                self.logger.warning(f"客户端 {state.client_id} 超过 {self.liveness.dead_after} 秒没有心跳，断开连接")
+                if state.close_connection is not None:
+                    try:
+                        state.close_connection()
+                    except OSError:
+                        pass
+            for state in expired:
+                if self.clients.get(state.client_id) is state:
+                    del self.clients[state.client_id]
+                    self._forget_client(state.client_id)
+                    self.logger.info(f"客户端 {state.client_id} 已移除（{state.status}）")
+                    state.status = "removed"
+        except Exception as e:
+            self.logger.error(f"存活检测时出错: {e}")
+
+    def _close_asyncio(self):
+        """在事件循环线程中关闭监听socket和所有活跃连接"""
+        if self._async_server:
+            self._async_server.close()
+        for writer in list(self._async_writers):
+            writer.close()
+
+    def _handle_data(self, decoder: FrameDecoder, data, client_address: tuple) -> Tuple[Optional[bytes], Optional[str]]:
+        """把收到的数据交给连接的解码器，处理其中所有完整消息，返回(合并后的回复, 客户端ID)"""
+        responses = []
+        client_id = None
+
+        for frame in decoder.feed(data):
+            if frame is None:
+                self.logger.error(f"客户端 {client_address} 消息超过 {ServerConfig.MAX_MESSAGE_SIZE} 字节，已丢弃")
+                HEARTBEAT_ERRORS.inc("oversize")
+                responses.append(_OVERSIZE_RESPONSE[decoder.binary])
+                continue
+
+            response, message_client_id = self._handle_message(frame, client_address)
+            if message_client_id:
+                client_id = message_client_id
+            if response:
+                responses.append(response)
+
+        return b"".join(responses) if responses else None, client_id
+
+    def _handle_message(self, data: bytes, client_address: tuple) -> Tuple[Optional[bytes], Optional[str]]:
+        """处理一条完整消息，返回(需要回复的字节, 客户端ID)，JSON回复以换行结尾，二进制帧以二进制帧回复"""
+        binary = data[0] == BINARY_MAGIC
         try:
-            message_dict = json.loads(data)
+            # 解析心跳消息
+            heartbeat = self._parse_heartbeat_message(data)
+            if not heartbeat:
+                HEARTBEAT_ERRORS.inc("malformed")
+                return None, None
+
+            start = time.perf_counter()
+            client_id = self._process_heartbeat(heartbeat, client_address)
+            HEARTBEAT_LATENCY.observe(time.perf_counter() - start)
+            HEARTBEATS.inc()
+
+            # 发送确认响应
+            return _ACK_RESPONSE[binary], client_id
+
+        except ValueError as e:
+            # data字段的JSON格式错误（json.JSONDecodeError和UnicodeDecodeError都是ValueError）
+            self.logger.error(f"解析socket消息失败: {e}")
+            HEARTBEAT_ERRORS.inc("invalid")
+            return _INVALID_RESPONSE[binary], None
+
+    def _parse_heartbeat_message(self, data: bytes) -> Optional[HeartbeatMessage]:
+        """解析心跳消息（JSON文本或二进制帧）"""
+        try:
+            message_dict = decode_message(data)
 
             # 验证必要字段
             required_fields = ['code', 'data']
@@ -167,61 +400,158 @@ class HeartbeatServer:
 
             return HeartbeatMessage(
                 code=message_dict['code'],
-                data=message_dict['data']
+                data=message_dict['data'],
+                agent_id=message_dict.get('agent_id')
             )
 
+        except UnicodeDecodeError:
+            # 非UTF-8的消息回复400（两种JSON后端都抛出UnicodeDecodeError）
+            raise
         except Exception as e:
             self.logger.error(f"解析心跳消息时出错: {e}")
             return None
 
-    def _process_heartbeat(self, heartbeat: HeartbeatMessage, client_address: tuple):
-        """处理心跳消息"""
-        client_id = f"{client_address[0]}:{client_address[1]}"
+    def _process_heartbeat(self, heartbeat: HeartbeatMessage, client_address: tuple) -> str:
+        """处理心跳消息，返回agent ID"""
+        connection_id = f"{client_address[0]}:{client_address[1]}"
 
         # 解析data字段为JSON（如果还不是字典的话）
         if heartbeat.data:
             if isinstance(heartbeat.data, dict):
                 data_obj = heartbeat.data
             elif isinstance(heartbeat.data, str):
-                data_obj = json.loads(heartbeat.data)
+                data_obj = json_loads(heartbeat.data)
             else:
                 data_obj = None
         else:
             data_obj = None
 
-        # 更新客户端信息（原地修改）
-        if client_id not in self.clients:
-            self.clients[client_id] = {}
-
-        # 原地更新现有字典
-        self.clients[client_id].update({
-            "last_heartbeat": datetime.now().isoformat(),
-            "code": heartbeat.code,
-            "data": data_obj,
-            "client_address": client_address,
-            "server_received_time": datetime.now().isoformat()
-        })
+        client_id = self._resolve_agent_id(heartbeat, data_obj, connection_id)
 
-        # 如果是系统信息类型，单独存储
+        # 原地更新agent状态，时间戳在展示时才格式化
+        now = time.monotonic()
+        state = self.clients.get(client_id)
+        if state is None:
+            state = self.clients[client_id] = AgentState(client_id, client_address, last_heartbeat=now,
+                                                         connection_id=connection_id)
+            self.liveness.track(state)
+            changed = True
+        else:
+            changed = False
+            state.last_heartbeat = now
+            if state.connection_id != connection_id:
+                # 重连：沿用原来的状态，只更新连接
+                state.connection_id = connection_id
+                state.client_address = client_address
+                state.close_connection = None
+                state.reconnects += 1
+                changed = True
+                self.logger.info(f"agent {client_id} 重连: {connection_id}")
+            if state.status != "active":
+                if state.status in ("disconnected", "dead"):
+                    self.liveness.track(state)
+                state.status = "active"
+                changed = True
+        state.heartbeat_count += 1
+        state.code = heartbeat.code
+
+        # 如果是系统信息类型，解析为类型化字段单独存储
         if isinstance(data_obj, dict) and data_obj.get('type') == 'system_info':
-            self.clients[client_id]["system_info"] = data_obj
-            self.logger.info(f"收到系统信息 - 客户端: {client_id}, 数据: {data_obj}")
+            if state.system_info is None:
+                state.system_info = SystemInfo.from_dict(data_obj)
+            else:
+                state.system_info.update(data_obj)
+            self.metrics.record(client_id, data_obj)
+            self.fleet.update(client_id, state.system_info)
+            changed = True
+            self.logger.info("收到系统信息 - 客户端: %s, 代码: %s", client_id, heartbeat.code, extra=RATE_LIMITED)
         else:
-            self.logger.info(f"收到心跳 - 客户端: {client_id}, 代码: {heartbeat.code}, 数据: {data_obj}")
-
-    def _remove_client(self, client_id: str):
-        """移除客户端"""
-        if client_id in self.clients:
-            del self.clients[client_id]
-            self.logger.info(f"客户端 {client_id} 已移除")
+            state.data = data_obj
+            self.logger.info("收到心跳 - 客户端: %s, 代码: %s", client_id, heartbeat.code, extra=RATE_LIMITED)
+        # 心跳内容只在DEBUG级别记录
+        self.logger.debug("心跳数据 - 客户端: %s, 数据: %s", client_id, data_obj, extra=RATE_LIMITED)
+        # 只更新心跳时间的心跳不改变快照
+        if changed:
+            self.snapshot.touch(state)
+        return client_id
+
+    def _resolve_agent_id(self, heartbeat: HeartbeatMessage, data_obj: Any, connection_id: str) -> str:
+        """确定心跳所属的agent
+
+        优先使用消息或data中的agent_id，其次是system_info的machine_name；都没有时沿用该连接
+        之前上报过的agent标识，连接从未上报过标识时使用连接地址。
+        """
+        agent_id = heartbeat.agent_id
+        if not agent_id and isinstance(data_obj, dict):
+            agent_id = data_obj.get("agent_id") or data_obj.get("machine_name")
+        if not agent_id:
+            return self.connections.get(connection_id, connection_id)
+
+        agent_id = str(agent_id)
+        previous = self.connections.get(connection_id)
+        if previous != agent_id:
+            self.connections[connection_id] = agent_id
+            # 该连接之前上报的是另一个agent：按断开处理，否则它一直是active且close_connection指向这个连接
+            if previous is not None and previous != connection_id:
+                self._detach_agent(previous, connection_id)
+            # 该连接之前以连接地址记录的匿名状态不再需要
+            anonymous = self.clients.get(connection_id)
+            if anonymous is not None and connection_id != agent_id:
+                del self.clients[connection_id]
+                self._forget_client(connection_id)
+                anonymous.status = "removed"
+        return agent_id
+
+    def _remove_connection(self, connection_id: str):
+        """连接断开：有稳定标识的agent保留AGENT_GRACE_PERIOD秒等待重连，匿名客户端直接移除
+
+        dead客户端保留到存活检测清除，以便查询到dead状态。
+        """
+        self._detach_agent(self.connections.pop(connection_id, connection_id), connection_id)
+
+    def _detach_agent(self, client_id: str, connection_id: str):
+        """agent不再使用connection_id这个连接（连接断开，或连接改为上报另一个agent）"""
+        state = self.clients.get(client_id)
+        # agent已经通过新连接重连，旧连接断开不影响状态
+        if state is None or state.connection_id != connection_id:
+            return
+
+        state.close_connection = None
+        if state.status == "dead":
+            return
+        if client_id != connection_id and self.liveness.grace_period > 0:
+            self.liveness.disconnect(state, time.monotonic())
+            self.snapshot.touch(state)
+            self.logger.info(f"agent {client_id} 断开连接，保留 {self.liveness.grace_period} 秒等待重连")
+            return
+
+        del self.clients[client_id]
+        self._forget_client(client_id)
+        state.status = "removed"
+        self.logger.info(f"客户端 {client_id} 已移除")
+
+    def _forget_client(self, client_id: str):
+        """客户端已从clients中移除，同步移除快照和集群指标中的记录（指标历史保留）"""
+        self.snapshot.remove(client_id)
+        self.fleet.remove(client_id)
 
     def get_clients(self) -> Dict[str, Any]:
-        """获取所有活跃客户端信息"""
-        return self.clients
+        """获取所有活跃客户端信息（格式化后的快照）"""
+        return {client_id: state.to_dict() for client_id, state in list(self.clients.items())}
 
     def stop(self):
         """停止服务器"""
         self.running = False
+
+        # asyncio引擎：在事件循环线程中关闭服务器和连接，serve_forever随之结束
+        loop = self._loop
+        if loop and self._async_server and loop.is_running():
+            try:
+                loop.call_soon_threadsafe(self._close_asyncio)
+            except RuntimeError:
+                # 事件循环已经关闭
+                pass
+
         if self.server_socket:
             try:
                 # 首先关闭socket
@@ -1,22 +1,122 @@
 """
 Flask HTTP服务器 - 提供HTTP API接口
+
+请求处理逻辑在handle_*方法中（返回 (响应体, 状态码)），由Flask路由和ASGI应用（asgi_app.py）共用。
 """
+import asyncio
+import heapq
 import json
 import logging
 import threading
-import queue
 import time
-from datetime import datetime
-from typing import Dict, Any, Optional
-from flask import Flask, jsonify, request
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Mapping, Optional, Tuple
+from flask import Flask, Response, g, request
+
+from config.server_config import ServerConfig
+from server.result_store import TaskResultStore
+from server.task_queue import PriorityTaskQueue, parse_priority
+from server.task_store import SQLiteTaskStore
+from utils.codec import json_dumps, json_loads
+from utils.logger import setup_logger, get_logging_stats, RATE_LIMITED
+from utils.metrics import REGISTRY, CONTENT_TYPE
+from utils.profiler import PROFILER
+
+# 运行指标（Flask和ASGI两种服务方式共用，见 GET /metrics）
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP请求数", ("method", "route", "status"))
+HTTP_LATENCY = REGISTRY.histogram("http_request_duration_seconds", "HTTP请求处理耗时（秒，长轮询包含等待时间）",
+                                  ("method", "route"))
+TASK_DISPATCH_LATENCY = REGISTRY.histogram(
+    "task_dispatch_latency_seconds", "任务从入队到被worker领取的等待时间（秒）",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600))
+TASKS_ENQUEUED = REGISTRY.counter("tasks_enqueued_total", "入队的任务数")
+TASKS_FINISHED = REGISTRY.counter("tasks_finished_total", "结束的任务数", ("status",))
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    """记录一个HTTP请求的指标，route为路由模板（未匹配的请求为unmatched）"""
+    HTTP_REQUESTS.inc(method, route, status)
+    HTTP_LATENCY.observe(seconds, method, route)
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+def _wake(future: asyncio.Future) -> bool:
+    """唤醒协程中的等待者（可以在任意线程中调用），等待者已结束时返回False"""
+    if future.done():
+        return False
+    loop = future.get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        _resolve(future)
+        return True
+    try:
+        loop.call_soon_threadsafe(_resolve, future)
+    except RuntimeError:
+        # 事件循环已经关闭
+        return False
+    return True
+
+
+def _float_arg(args: Mapping[str, str], name: str, default: Optional[float] = None) -> Optional[float]:
+    """读取浮点数查询参数，缺失或格式错误时返回default"""
+    try:
+        return float(args[name])
+    except (KeyError, TypeError, ValueError):
+        return default
+
+
+def _int_arg(args: Mapping[str, str], name: str, default: Optional[int] = None) -> Optional[int]:
+    """读取整数查询参数，缺失或格式错误时返回default"""
+    try:
+        return int(args[name])
+    except (KeyError, TypeError, ValueError):
+        return default
 
 
 class HTTPServer:
     """HTTP API服务器"""
 
-    def __init__(self, host: str = "localhost", port: int = 5000):
+    # 任务分发模式：
+    # - serial: 全局同一时间只有一个进行中的任务（默认）
+    # - concurrent: 每个worker可以同时持有max_tasks_per_worker个进行中的任务
+    DISPATCH_MODES = ("serial", "concurrent")
+
+    # 任务队列存储：
+    # - memory: 只保存在内存中，重启后丢失（默认）
+    # - sqlite: 未结束的任务同时写入SQLite（WAL模式，组提交），重启后恢复
+    TASK_STORE_BACKENDS = ("memory", "sqlite")
+
+    def __init__(self, host: str = "localhost", port: int = 5000,
+                 dispatch_mode: str = "serial",
+                 max_tasks_per_worker: int = ServerConfig.WORKER_MAX_INFLIGHT,
+                 lease_timeout: float = ServerConfig.TASK_LEASE_TIMEOUT,
+                 max_attempts: int = ServerConfig.TASK_MAX_ATTEMPTS,
+                 task_store: str = "memory"):
+        if dispatch_mode not in self.DISPATCH_MODES:
+            raise ValueError(f"不支持的分发模式: {dispatch_mode}，可选: {', '.join(self.DISPATCH_MODES)}")
+        if task_store not in self.TASK_STORE_BACKENDS:
+            raise ValueError(f"不支持的任务存储: {task_store}，可选: {', '.join(self.TASK_STORE_BACKENDS)}")
+        if max_tasks_per_worker < 1:
+            raise ValueError("max_tasks_per_worker 必须大于0")
+        if lease_timeout <= 0:
+            raise ValueError("lease_timeout 必须大于0")
+        if max_attempts < 1:
+            raise ValueError("max_attempts 必须大于0")
+
         self.host = host
         self.port = port
+        self.dispatch_mode = dispatch_mode
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
 
         # 禁用Flask/Werkzeug的默认日志
         self._disable_flask_logging()
@@ -34,50 +134,125 @@ class HTTPServer:
         self.logger = self._setup_logger()
 
         # 任务队列和相关状态
-        self.task_queue = queue.Queue()
+        # 共享队列：任意worker都可以领取的任务（按优先级出队）
+        self.task_queue = PriorityTaskQueue(ServerConfig.TASK_PRIORITY_AGING)
+        self.agent_queues = {}  # agent_id -> 只发给该agent的任务队列（队列为空时删除）
+        self.queued_count = 0  # 所有队列中等待分配的任务总数
+        self.worker_last_seen = {}  # worker_id -> 最近一次轮询的时间（monotonic）
         self.pending_tasks = {}  # 存储待处理任务的任务ID
+        self.active_tasks = {}  # task_id -> 未结束的任务（排队中或进行中）
+        self.worker_tasks = {}  # worker_id -> 该worker进行中的任务ID集合
+        # 租约到期索引：(到期时间, 任务ID, 第几次分配) 的最小堆，失效条目在出堆时跳过
+        self.lease_heap = []
         self.current_task_id = 0
+        # 广播任务：broadcast_id -> {命令, agent_id -> 子任务ID}
+        self.broadcasts = OrderedDict()
+        self.current_broadcast_id = 0
+        self.task_stats = {"redelivered": 0, "failed": 0}
+        # 已结束任务的结果
+        self.result_store = TaskResultStore(
+            max_entries=ServerConfig.RESULT_STORE_MAX_ENTRIES,
+            max_bytes=ServerConfig.RESULT_STORE_MAX_BYTES,
+            ttl=ServerConfig.RESULT_STORE_TTL,
+            max_result_bytes=ServerConfig.RESULT_MAX_BYTES
+        )
+        # 保护以上所有任务状态，Werkzeug多线程处理请求
         self.task_lock = threading.Lock()
+        # 长轮询等待任务的条件变量，与task_lock共用同一把锁
+        self.task_available = threading.Condition(self.task_lock)
+        # 等待任务结束（完成或失败）的条件变量
+        self.task_finished = threading.Condition(self.task_lock)
+        # 协程中的长轮询（ASGI服务、MCP工具）：等待者的Future，由以上状态变化唤醒
+        self._claim_waiters = {}  # worker_id -> 等待领取任务的Future集合
+        self._result_waiters = {}  # task_id -> 等待任务结束的Future集合
         self.input_thread = None
         self.running = False
+        # 心跳服务器的集群指标（FleetMetrics），由启动脚本设置，用于 /agents/fleet
+        self.fleet_metrics = None
+        # 队列深度等在导出指标时读取，不在请求路径上记录
+        REGISTRY.gauge("task_queue_depth", "等待分配的任务数", func=lambda: self.queued_count)
+        REGISTRY.gauge("tasks_inflight", "已分配给worker、未结束的任务数", func=lambda: len(self.pending_tasks))
+        REGISTRY.gauge("workers_polling", "正在长轮询等待任务的协程数", func=self._count_claim_waiters)
+
+        # 持久化存储（sqlite后端），启动时恢复未结束的任务
+        self.task_store = None
+        if task_store == "sqlite":
+            self.task_store = self._open_task_store()
+            self._recover_tasks()
+            self.task_store.start()
 
         self._setup_routes()
 
     def _setup_logger(self) -> logging.Logger:
-        """设置日志记录器"""
-        import os
-        logger = logging.getLogger("HTTPServer")
-        logger.setLevel(logging.INFO)
+        """设置日志记录器（后台线程写入轮转文件，不输出到控制台）"""
+        return setup_logger("HTTPServer", "http_server.log")
 
-        # 避免重复添加处理器
-        if logger.handlers:
-            return logger
+    @staticmethod
+    def _open_task_store() -> SQLiteTaskStore:
+        """按DB_CONFIG打开SQLite任务存储"""
+        import os
+        path = ServerConfig.DB_CONFIG["path"]
+        if not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), path)
+        return SQLiteTaskStore(path,
+                               synchronous=ServerConfig.DB_CONFIG.get("synchronous", "FULL"),
+                               max_batch=ServerConfig.DB_CONFIG.get("max_batch", 10000))
 
-        # 使用绝对路径创建logs目录（如果不存在）
-        log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "logs")
-        os.makedirs(log_dir, exist_ok=True)
-        log_file = os.path.join(log_dir, "http_server.log")
+    def _recover_tasks(self):
+        """从持久化存储恢复未结束的任务
 
-        # 只创建文件处理器，不输出到控制台
-        file_handler = logging.FileHandler(log_file, encoding="utf-8", mode='a')
-        file_handler.setLevel(logging.INFO)
+        排队中的任务按任务ID顺序重新入队；重启前已分配（进行中）的任务视为租约到期，
+        未超过max_attempts时重新入队，否则标记为失败。
+        """
+        tasks, counters = self.task_store.load()
+        redelivered = failed = 0
+        with self.task_lock:
+            self.current_task_id = max([counters.get("last_task_id", 0)] + [task["task_id"] for task in tasks])
+            self.current_broadcast_id = counters.get("last_broadcast_id", 0)
+            for task in tasks:
+                state = task.pop("state")
+                worker_id = task.pop("worker_id")
+                task["buildin"] = task["command"].lower() in ["init", "cleanup", "status"]
+                self.active_tasks[task["task_id"]] = task
+                if state == "running":
+                    if task["attempts"] >= self.max_attempts:
+                        failed += 1
+                        self.task_stats["failed"] += 1
+                        task["worker_id"] = worker_id
+                        self._finish_task(task, "failed", error=f"服务重启时任务进行中且已分配 {task['attempts']} 次")
+                        continue
+                    redelivered += 1
+                    self.task_stats["redelivered"] += 1
+                    self.task_store.requeue(task["task_id"])
+                self._push_task(task)
 
-        # 设置立即刷新（设置为0表示立即写入）
-        file_handler.stream.reconfigure(line_buffering=True)
+        if tasks:
+            self.logger.info(f"从 {self.task_store.path} 恢复 {len(tasks)} 个未结束的任务，"
+                             f"其中 {redelivered} 个进行中的任务重新入队，{failed} 个标记为失败")
 
-        # 创建格式器
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-        file_handler.setFormatter(formatter)
+    def _persist_counters(self) -> int:
+        """把任务ID和广播ID计数器写入持久化存储，返回变更序号（调用方需持有task_lock）"""
+        if self.task_store is None:
+            return 0
+        self.task_store.set_counter("last_task_id", self.current_task_id)
+        return self.task_store.set_counter("last_broadcast_id", self.current_broadcast_id)
 
-        # 只添加文件处理器
-        logger.addHandler(file_handler)
+    def _wait_durable(self, seq: int):
+        """等待变更写入持久化存储（不能持有task_lock）"""
+        if self.task_store is None or not seq:
+            return
+        if not self.task_store.wait_durable(seq, ServerConfig.DB_CONFIG.get("commit_timeout", 5)):
+            self.logger.error("任务写入持久化存储失败或超时，服务重启后可能丢失")
 
-        # 确保日志立即写入
-        logger.propagate = False
+    def _count_claim_waiters(self) -> int:
+        """正在长轮询等待任务的协程数（导出指标时调用；等待者集合在task_lock内修改）"""
+        with self.task_lock:
+            return sum(len(waiters) for waiters in self._claim_waiters.values())
 
-        return logger
+    def close(self):
+        """关闭持久化存储（写完剩余的变更）"""
+        if self.task_store is not None:
+            self.task_store.close()
 
     def _disable_flask_logging(self):
         """禁用Flask/Werkzeug的默认日志输出"""
@@ -97,82 +272,598 @@ class HTTPServer:
         flask_base_logger.setLevel(logging.CRITICAL)
         flask_base_logger.disabled = True
 
-    def _get_next_task(self) -> Dict[str, Any]:
-        """获取下一个任务"""
-        try:
-            # 如果有待完成的任务，返回空任务
-            if self.pending_tasks:
-                return {
-                    "command": "",
-                    "buildin": False,
-                    "task_id": None
-                }
+    @staticmethod
+    def _parse_task_spec(spec: Any) -> Dict[str, Any]:
+        """解析任务描述：命令字符串，或 {"command": ..., "metadata": {...}, "target": agent_id, "priority": ...}
 
-            # 尝试从队列获取任务（非阻塞）
-            try:
-                command = self.task_queue.get_nowait()
-                self.current_task_id += 1
-                task_id = self.current_task_id
-
-                # 判断是否为内置命令
-                buildin = command.lower() in ["init", "cleanup", "status"]
-
-                # 添加到待处理任务
-                self.pending_tasks[task_id] = {
-                    "command": command,
-                    "buildin": buildin,
-                    "assigned_time": datetime.now().isoformat()
-                }
+        返回规范化后的 {"command", "metadata", "target", "priority"}。未指定target的任务进入共享队列，
+        未指定priority时内置命令为high，其他为normal。
+        """
+        if isinstance(spec, str):
+            spec = {"command": spec}
+        elif not isinstance(spec, dict):
+            raise ValueError(f"无效的任务描述: {spec!r}")
 
-                return {
-                    "command": command,
-                    "buildin": buildin,
-                    "task_id": task_id
-                }
-            except queue.Empty:
-                # 没有任务
-                return {
-                    "command": "",
-                    "buildin": False,
-                    "task_id": None
+        command = spec.get("command")
+        metadata = spec.get("metadata") or {}
+        target = spec.get("target") or None
+        if not isinstance(command, str) or not command.strip():
+            raise ValueError(f"任务缺少command: {spec!r}")
+        if not isinstance(metadata, dict):
+            raise ValueError(f"任务metadata必须是对象: {spec!r}")
+        if target is not None and not isinstance(target, str):
+            raise ValueError(f"任务target必须是字符串: {spec!r}")
+
+        # 判断是否为内置命令
+        buildin = command.lower() in ["init", "cleanup", "status"]
+        priority = parse_priority(spec.get("priority"), default="high" if buildin else "normal")
+        return {"command": command, "metadata": metadata, "target": target, "priority": priority}
+
+    def _push_task(self, task: Dict[str, Any]):
+        """把任务放入目标agent的专属队列或共享队列（调用方需持有task_lock）"""
+        target = task.get("target")
+        if target:
+            task_queue = self.agent_queues.get(target)
+            if task_queue is None:
+                task_queue = self.agent_queues[target] = PriorityTaskQueue(ServerConfig.TASK_PRIORITY_AGING)
+        else:
+            task_queue = self.task_queue
+
+        task_queue.push(task)
+        self.queued_count += 1
+        # 用于统计分发延迟；重新入队（租约到期、重启恢复）的任务从重新入队时算起
+        task["_enqueued_at"] = time.monotonic()
+
+    def _pop_task(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """为worker取出下一个任务：比较专属队列和共享队列的队首，取更优先的一个（调用方需持有task_lock）"""
+        agent_queue = self.agent_queues.get(worker_id)
+        now = time.monotonic()
+        shared_key = self.task_queue.peek_key(now)
+        if agent_queue and (shared_key is None or agent_queue.peek_key(now) <= shared_key):
+            task = agent_queue.pop()
+            if not agent_queue:
+                del self.agent_queues[worker_id]
+        elif shared_key is not None:
+            task = self.task_queue.pop()
+        else:
+            return None
+
+        self.queued_count -= 1
+        return task
+
+    def _has_task_for(self, worker_id: str) -> bool:
+        """是否有worker可以领取的任务（调用方需持有task_lock）"""
+        return bool(self.task_queue) or worker_id in self.agent_queues
+
+    def _enqueue_task(self, spec: Dict[str, Any], target: Optional[str] = None,
+                      broadcast_id: Optional[int] = None) -> int:
+        """按解析后的任务描述创建任务并入队，返回任务ID（调用方需持有task_lock）"""
+        self.current_task_id += 1
+        command = spec["command"]
+        task = {
+            "task_id": self.current_task_id,
+            "command": command,
+            "buildin": command.lower() in ["init", "cleanup", "status"],
+            "priority": spec["priority"],
+            "attempts": 0
+        }
+        if spec["metadata"]:
+            task["metadata"] = spec["metadata"]
+        target = target or spec["target"]
+        if target:
+            task["target"] = target
+        if broadcast_id is not None:
+            task["broadcast_id"] = broadcast_id
+        self._push_task(task)
+        self.active_tasks[task["task_id"]] = task
+        TASKS_ENQUEUED.inc()
+        if self.task_store is not None:
+            self.task_store.enqueue(task)
+        return self.current_task_id
+
+    def add_task(self, command: str, metadata: Optional[Dict[str, Any]] = None, target: Optional[str] = None,
+                 priority: Optional[str] = None) -> int:
+        """添加任务到队列并唤醒等待中的worker，返回任务ID
+
+        指定target时任务只会分配给worker_id为target的agent；priority为high/normal/low。
+        """
+        spec = self._parse_task_spec({"command": command, "metadata": metadata, "target": target, "priority": priority})
+        with self.task_available:
+            task_id = self._enqueue_task(spec)
+            seq = self._persist_counters()
+            # 指定agent的任务需要唤醒对应的worker，共享任务唤醒任意一个即可
+            if spec["target"]:
+                self._notify_claimers(targets=[spec["target"]])
+            else:
+                self._notify_claimers()
+
+        self._wait_durable(seq)
+        return task_id
+
+    def add_tasks(self, task_specs: List[Any]) -> List[int]:
+        """批量添加任务，全部校验通过后在一次加锁内入队，返回按顺序分配的任务ID
+
+        任务描述可以是命令字符串，或 {"command": ..., "metadata": {...}, "target": agent_id, "priority": ...}。
+        任何一条无效时抛出ValueError，不会有任务入队。
+        """
+        if len(task_specs) > ServerConfig.BULK_MAX_TASKS:
+            raise ValueError(f"单次最多添加 {ServerConfig.BULK_MAX_TASKS} 个任务")
+        parsed = [self._parse_task_spec(spec) for spec in task_specs]
+
+        with self.task_available:
+            task_ids = [self._enqueue_task(spec) for spec in parsed]
+            seq = self._persist_counters()
+            targets = [spec["target"] for spec in parsed if spec["target"]]
+            self._notify_claimers(len(task_ids) - len(targets), targets)
+
+        self._wait_durable(seq)
+
+        if task_ids:
+            self.logger.info(f"批量添加 {len(task_ids)} 个任务到队列，任务ID {task_ids[0]}-{task_ids[-1]}")
+        return task_ids
+
+    def get_active_workers(self) -> List[str]:
+        """获取最近WORKER_ACTIVE_WINDOW秒内轮询过的worker"""
+        cutoff = time.monotonic() - ServerConfig.WORKER_ACTIVE_WINDOW
+        with self.task_lock:
+            return [worker_id for worker_id, last_seen in self.worker_last_seen.items() if last_seen >= cutoff]
+
+    def broadcast_task(self, command: str, agents: Optional[List[str]] = None,
+                       metadata: Optional[Dict[str, Any]] = None, priority: Optional[str] = None) -> Dict[str, Any]:
+        """把一条命令广播给多个agent：为每个agent创建一个只发给它的子任务
+
+        agents为None时广播给最近活跃的所有worker。返回广播ID和 agent_id -> 子任务ID。
+        """
+        spec = self._parse_task_spec({"command": command, "metadata": metadata, "priority": priority})
+        if agents is None:
+            agents = self.get_active_workers()
+        agents = list(dict.fromkeys(agent for agent in agents if isinstance(agent, str) and agent))
+        if not agents:
+            raise ValueError("没有可以广播的agent")
+        if len(agents) > ServerConfig.BULK_MAX_TASKS:
+            raise ValueError(f"单次最多广播给 {ServerConfig.BULK_MAX_TASKS} 个agent")
+
+        with self.task_available:
+            self.current_broadcast_id += 1
+            broadcast_id = self.current_broadcast_id
+            task_ids = {agent: self._enqueue_task(spec, agent, broadcast_id) for agent in agents}
+            self.broadcasts[broadcast_id] = {
+                "broadcast_id": broadcast_id,
+                "command": command,
+                "task_ids": task_ids,
+                "created_time": datetime.now().isoformat()
+            }
+            while len(self.broadcasts) > ServerConfig.BROADCAST_MAX_RECORDS:
+                self.broadcasts.popitem(last=False)
+            seq = self._persist_counters()
+            self._notify_claimers(0, agents)
+
+        self._wait_durable(seq)
+
+        self.logger.info(f"广播命令 {broadcast_id} 给 {len(agents)} 个agent: {command}")
+        return {"broadcast_id": broadcast_id, "task_ids": task_ids}
+
+    def get_broadcast_status(self, broadcast_id: int) -> Optional[Dict[str, Any]]:
+        """获取广播任务的汇总状态和每个agent的子任务结果，广播不存在时返回None"""
+        with self.task_lock:
+            broadcast = self.broadcasts.get(broadcast_id)
+            if broadcast is None:
+                return None
+
+            status_counts = {}
+            results = {}
+            for agent, task_id in broadcast["task_ids"].items():
+                record = self.result_store.get(task_id)
+                if record is not None:
+                    status = record["status"]
+                    results[agent] = {"task_id": task_id, "status": status, "result": record["result"]}
+                else:
+                    if task_id in self.pending_tasks:
+                        status = "running"
+                    elif task_id in self.active_tasks:
+                        status = "queued"
+                    else:
+                        status = "not_found"
+                    results[agent] = {"task_id": task_id, "status": status}
+                status_counts[status] = status_counts.get(status, 0) + 1
+
+            return {
+                "broadcast_id": broadcast_id,
+                "command": broadcast["command"],
+                "created_time": broadcast["created_time"],
+                "total": len(broadcast["task_ids"]),
+                "status_counts": status_counts,
+                "results": results
+            }
+
+    def get_queue_size(self) -> int:
+        """获取等待分配的任务数"""
+        return self.queued_count
+
+    def _expire_leases(self) -> Optional[float]:
+        """回收租约到期的任务（调用方需持有task_lock），返回下一个租约的到期时间
+
+        到期任务在未超过max_attempts时放回队首重新分配，否则标记为失败。
+        每个到期条目出堆为O(log n)，未到期时只检查堆顶。
+        """
+        now = time.monotonic()
+        while self.lease_heap and self.lease_heap[0][0] <= now:
+            _, task_id, attempts = heapq.heappop(self.lease_heap)
+            task = self.pending_tasks.get(task_id)
+            # 任务已完成或已被重新分配，跳过失效条目
+            if task is None or task["attempts"] != attempts:
+                continue
+
+            del self.pending_tasks[task_id]
+            self._release_worker_task(task["worker_id"], task_id)
+
+            if attempts >= self.max_attempts:
+                self.task_stats["failed"] += 1
+                self._finish_task(task, "failed", error=f"租约到期且已分配 {attempts} 次")
+                self.logger.error(f"任务 {task_id} 租约到期且已分配 {attempts} 次，标记为失败: {task['command']}")
+                continue
+
+            self.task_stats["redelivered"] += 1
+            self.logger.warning(f"任务 {task_id} 租约到期（worker: {task['worker_id']}），重新放回队列: {task['command']}")
+            for key in ("worker_id", "assigned_time", "lease_expire_time"):
+                task.pop(key, None)
+            # 沿用原来的入队时间，回到队列中原来的位置
+            self._push_task(task)
+            if self.task_store is not None:
+                self.task_store.requeue(task_id)
+            if task.get("target"):
+                self._notify_claimers(targets=[task["target"]])
+            else:
+                self._notify_claimers()
+
+        return self.lease_heap[0][0] if self.lease_heap else None
+
+    def _notify_claimers(self, count: int = 1, targets: Optional[List[str]] = None):
+        """唤醒等待领取任务的worker（调用方需持有task_lock）
+
+        count为任意worker都能领取的新任务数，唤醒同样数量的等待者；targets为收到指定任务的agent，
+        唤醒它们的所有等待者。线程中的长轮询（条件变量）和协程中的长轮询（Future）都会被唤醒。
+        """
+        if targets:
+            self.task_available.notify_all()
+        elif count:
+            self.task_available.notify(count)
+
+        for target in targets or ():
+            for future in self._claim_waiters.pop(target, ()):
+                _wake(future)
+        while count > 0 and self._claim_waiters:
+            worker_id = next(iter(self._claim_waiters))
+            futures = self._claim_waiters[worker_id]
+            if _wake(futures.pop()):
+                count -= 1
+            if not futures:
+                del self._claim_waiters[worker_id]
+
+    def _add_waiter(self, waiters: Dict[Any, set], key: Any) -> asyncio.Future:
+        """登记一个协程等待者，需要在检查状态之前登记，避免错过唤醒"""
+        future = asyncio.get_running_loop().create_future()
+        with self.task_lock:
+            waiters.setdefault(key, set()).add(future)
+        return future
+
+    def _remove_waiter(self, waiters: Dict[Any, set], key: Any, future: asyncio.Future):
+        with self.task_lock:
+            futures = waiters.get(key)
+            if futures is not None:
+                futures.discard(future)
+                if not futures:
+                    del waiters[key]
+
+    def _wait_timeout(self, deadline: float) -> float:
+        """距离deadline的秒数，最多等到下一个租约到期，以便及时回收"""
+        now = time.monotonic()
+        remaining = deadline - now
+        with self.task_lock:
+            next_expiry = self.lease_heap[0][0] if self.lease_heap else None
+        if next_expiry is not None:
+            remaining = min(remaining, max(next_expiry - now, 0.01))
+        return remaining
+
+    def _worker_free_slots(self, worker_id: str) -> int:
+        """worker还能领取的任务数（调用方需持有task_lock）"""
+        if self.dispatch_mode == "serial":
+            # 串行模式：有任何待完成的任务都不再分配
+            return 0 if self.pending_tasks else 1
+        return self.max_tasks_per_worker - len(self.worker_tasks.get(worker_id, ()))
+
+    def _claim_tasks(self, worker_id: str = "", max_count: int = 1, wait: float = 0) -> List[Dict[str, Any]]:
+        """为worker一次领取最多max_count个任务，wait>0时最多阻塞wait秒等待任务（长轮询）"""
+        deadline = time.monotonic() + wait
+        with self.task_available:
+            self.worker_last_seen[worker_id] = time.monotonic()
+            while True:
+                next_expiry = self._expire_leases()
+                free_slots = self._worker_free_slots(worker_id)
+                if free_slots > 0 and self._has_task_for(worker_id):
+                    break
+
+                # concurrent模式下worker已满，等待也领不到任务，直接返回
+                now = time.monotonic()
+                remaining = deadline - now
+                if remaining <= 0 or (free_slots <= 0 and self.dispatch_mode == "concurrent"):
+                    return []
+                # 最多等到下一个租约到期，以便及时回收
+                if next_expiry is not None:
+                    remaining = min(remaining, max(next_expiry - now, 0.01))
+                self.task_available.wait(remaining)
+
+            claimed = []
+            assigned_time = datetime.now()
+            now = time.monotonic()
+            lease_deadline = now + self.lease_timeout
+            worker_task_ids = self.worker_tasks.setdefault(worker_id, set())
+            for _ in range(min(max_count, free_slots)):
+                task = self._pop_task(worker_id)
+                if task is None:
+                    break
+
+                TASK_DISPATCH_LATENCY.observe(now - task.pop("_enqueued_at", now))
+
+                # 分配租约并添加到待处理任务
+                task_id = task["task_id"]
+                task["attempts"] += 1
+                task["worker_id"] = worker_id
+                task["assigned_time"] = assigned_time.isoformat()
+                task["lease_expire_time"] = (assigned_time + timedelta(seconds=self.lease_timeout)).isoformat()
+                self.pending_tasks[task_id] = task
+                worker_task_ids.add(task_id)
+                heapq.heappush(self.lease_heap, (lease_deadline, task_id, task["attempts"]))
+                if self.task_store is not None:
+                    self.task_store.claim(task)
+
+                claimed_task = {
+                    "command": task["command"],
+                    "buildin": task["buildin"],
+                    "task_id": task_id,
+                    "priority": task["priority"]
                 }
+                if "metadata" in task:
+                    claimed_task["metadata"] = task["metadata"]
+                claimed.append(claimed_task)
+
+            # concurrent模式下共享队列里还有任务时继续唤醒下一个等待者，避免通知丢失
+            if self.dispatch_mode == "concurrent" and self.task_queue:
+                self._notify_claimers()
+
+            return claimed
+
+    def _get_next_task(self, worker_id: str = "", wait: float = 0) -> Dict[str, Any]:
+        """为worker获取下一个任务，wait>0时最多阻塞wait秒等待任务（长轮询）"""
+        try:
+            claimed = self._claim_tasks(worker_id, 1, wait)
+            if claimed:
+                return claimed[0]
         except Exception as e:
             self.logger.error(f"获取任务时出错: {e}")
+        return {
+            "command": "",
+            "buildin": False,
+            "task_id": None
+        }
+
+    def _release_worker_task(self, worker_id: str, task_id: int):
+        """从worker的进行中任务集合移除任务（调用方需持有task_lock）"""
+        worker_task_ids = self.worker_tasks.get(worker_id)
+        if worker_task_ids is not None:
+            worker_task_ids.discard(task_id)
+            if not worker_task_ids:
+                del self.worker_tasks[worker_id]
+
+    def _queue_depth_by_priority(self) -> Dict[str, int]:
+        """所有队列中每个优先级等待的任务数（调用方需持有task_lock）"""
+        depth = self.task_queue.depth_by_priority()
+        for agent_queue in self.agent_queues.values():
+            for priority, count in agent_queue.depth_by_priority().items():
+                depth[priority] += count
+        return depth
+
+    def get_task_status(self) -> Dict[str, Any]:
+        """获取任务状态快照（在task_lock内复制，避免与请求线程并发修改）"""
+        with self.task_lock:
+            self._expire_leases()
             return {
-                "command": "",
-                "buildin": False,
-                "task_id": None
+                "queue_size": self.queued_count,
+                "shared_queue_size": len(self.task_queue),
+                "agent_queue_sizes": {agent_id: len(task_queue) for agent_id, task_queue in self.agent_queues.items()},
+                "queue_depth_by_priority": self._queue_depth_by_priority(),
+                "pending_tasks": len(self.pending_tasks),
+                "pending_task_details": {
+                    task_id: {key: value for key, value in task.items() if not key.startswith("_")}
+                    for task_id, task in self.pending_tasks.items()
+                },
+                "worker_inflight": {worker_id: len(task_ids) for worker_id, task_ids in self.worker_tasks.items()},
+                "dispatch_mode": self.dispatch_mode,
+                "max_tasks_per_worker": self.max_tasks_per_worker,
+                "lease_timeout": self.lease_timeout,
+                "max_attempts": self.max_attempts,
+                "redelivered_tasks": self.task_stats["redelivered"],
+                "failed_tasks": self.task_stats["failed"],
+                "result_store": self.result_store.get_stats(),
+                "logging": get_logging_stats(),
+                "task_store": self.task_store.get_stats() if self.task_store is not None else {"backend": "memory"}
             }
 
-    def _handle_task_response(self, task_id: str, command_result: str):
+    def _finish_task(self, task: Dict[str, Any], status: str,
+                     result: Optional[str] = None, error: Optional[str] = None):
+        """记录任务结果并唤醒等待该任务结束的调用方（调用方需持有task_lock）"""
+        task_id = task["task_id"]
+        self.active_tasks.pop(task_id, None)
+        TASKS_FINISHED.inc(status)
+        if self.task_store is not None:
+            self.task_store.finish(task_id)
+
+        record = {
+            "task_id": task_id,
+            "status": status,
+            "command": task["command"],
+            "buildin": task["buildin"],
+            "result": result,
+            "worker_id": task.get("worker_id"),
+            "attempts": task["attempts"],
+            "finished_time": datetime.now().isoformat()
+        }
+        if error:
+            record["error"] = error
+        for key in ("priority", "metadata", "target", "broadcast_id"):
+            if key in task:
+                record[key] = task[key]
+        self.result_store.put(task_id, record)
+        self.task_finished.notify_all()
+        for future in self._result_waiters.pop(task_id, ()):
+            _wake(future)
+
+    def _complete_task(self, task_id: int, command_result: str) -> Optional[Dict[str, Any]]:
+        """把任务标记为完成，返回任务信息，任务不存在时返回None（调用方需持有task_lock）"""
+        task = self.pending_tasks.pop(task_id, None)
+        if task is None:
+            return None
+
+        self._release_worker_task(task["worker_id"], task_id)
+        self._finish_task(task, "completed", result=command_result)
+        # 串行模式下任务完成后其他worker才能领取，唤醒一个等待者
+        if self.dispatch_mode == "serial" and not self.pending_tasks:
+            self._notify_claimers()
+        return task
+
+    def get_task_result(self, task_id: int, wait: float = 0) -> Dict[str, Any]:
+        """获取任务结果，任务未结束且wait>0时最多阻塞wait秒等待任务结束
+
+        返回的status为completed/failed（已结束），queued/running（未结束），
+        或not_found（任务不存在或结果已被淘汰）。
+        """
+        deadline = time.monotonic() + wait
+        with self.task_finished:
+            while True:
+                next_expiry = self._expire_leases()
+                record = self.result_store.get(task_id)
+                if record is not None:
+                    return dict(record)
+
+                task = self.active_tasks.get(task_id)
+                if task is None:
+                    return {"task_id": task_id, "status": "not_found"}
+
+                now = time.monotonic()
+                remaining = deadline - now
+                if remaining <= 0:
+                    return {
+                        "task_id": task_id,
+                        "status": "running" if task_id in self.pending_tasks else "queued",
+                        "command": task["command"],
+                        "buildin": task["buildin"],
+                        "worker_id": task.get("worker_id"),
+                        "attempts": task["attempts"],
+                        "target": task.get("target")
+                    }
+                # 最多等到下一个租约到期，以便及时发现失败的任务
+                if next_expiry is not None:
+                    remaining = min(remaining, max(next_expiry - now, 0.01))
+                self.task_finished.wait(remaining)
+
+    async def claim_tasks_async(self, worker_id: str = "", max_count: int = 1, wait: float = 0) -> List[Dict[str, Any]]:
+        """_claim_tasks的协程版本：等待任务时不占用线程，用于ASGI服务和统一事件循环模式"""
+        deadline = time.monotonic() + wait
+        while True:
+            future = self._add_waiter(self._claim_waiters, worker_id)
+            try:
+                claimed = self._claim_tasks(worker_id, max_count, 0)
+                if claimed or time.monotonic() >= deadline:
+                    return claimed
+                # concurrent模式下worker已满，等待也领不到任务，直接返回
+                if self.dispatch_mode == "concurrent":
+                    with self.task_lock:
+                        if self._worker_free_slots(worker_id) <= 0:
+                            return claimed
+                try:
+                    await asyncio.wait_for(future, self._wait_timeout(deadline))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                # 已被唤醒但请求被取消（客户端断开），把唤醒转交给其他等待者
+                if future.done() and not future.cancelled():
+                    with self.task_lock:
+                        self._notify_claimers()
+                raise
+            finally:
+                self._remove_waiter(self._claim_waiters, worker_id, future)
+
+    async def get_task_result_async(self, task_id: int, wait: float = 0) -> Dict[str, Any]:
+        """get_task_result的协程版本：等待任务结束时不占用线程"""
+        deadline = time.monotonic() + wait
+        while True:
+            future = self._add_waiter(self._result_waiters, task_id)
+            try:
+                result = self.get_task_result(task_id, 0)
+                if result["status"] not in ("queued", "running") or time.monotonic() >= deadline:
+                    return result
+                try:
+                    await asyncio.wait_for(future, self._wait_timeout(deadline))
+                except asyncio.TimeoutError:
+                    pass
+            finally:
+                self._remove_waiter(self._result_waiters, task_id, future)
+
+    def complete_tasks(self, results: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+        """批量提交任务结果，所有结果在一次task_lock内处理；有任何一条格式无效时抛出ValueError，不处理任何结果"""
+        parsed = []
+        for item in results:
+            task_id = item.get("task_id") if isinstance(item, dict) else None
+            # 与_parse_task_spec一样严格校验：不接受浮点数、布尔值和字符串形式的任务ID
+            if not isinstance(task_id, int) or isinstance(task_id, bool):
+                raise ValueError(f"无效的任务结果: {item!r}")
+            parsed.append((task_id, item.get("command_result", "")))
+
+        completed, not_found = [], []
+        with self.task_lock:
+            for task_id, command_result in parsed:
+                task = self._complete_task(task_id, command_result)
+                if task is None:
+                    not_found.append(task_id)
+                else:
+                    completed.append({"task_id": task_id, "command": task["command"], "command_result": command_result})
+
+        if completed:
+            self.logger.info(f"批量完成 {len(completed)} 个任务: "
+                             + ", ".join(f"{item['task_id']}: {item['command']} -> {item['command_result']}" for item in completed))
+        return {
+            "completed": [item["task_id"] for item in completed],
+            "not_found": not_found
+        }
+
+    def _handle_task_response(self, task_id: str, command_result: str) -> Tuple[Dict[str, Any], int]:
         """处理任务响应"""
         try:
             task_id_int = int(task_id)
             with self.task_lock:
-                if task_id_int in self.pending_tasks:
-                    task = self.pending_tasks[task_id_int]
-                    self.logger.info(f"任务 {task_id_int} 完成: {task['command']} -> {command_result}")
-                    del self.pending_tasks[task_id_int]
-
-                    response = {
-                        "code": 0,
-                        "data": {
-                            "buildin": task.get("buildin", False),
-                            "command": task.get("command", ""),
-                            "message": f"任务 {task_id_int} 完成"
-                        }
+                task = self._complete_task(task_id_int, command_result)
+            if task is not None:
+                self.logger.info("任务 %d 完成: %s -> %s", task_id_int, task['command'], command_result)
+
+                response = {
+                    "code": 0,
+                    "data": {
+                        "buildin": task.get("buildin", False),
+                        "command": task.get("command", ""),
+                        "message": f"任务 {task_id_int} 完成"
                     }
-                else:
-                    response = {
-                        "code": 404,
-                        "data": {
-                            "buildin": False,
-                            "command": "",
-                            "message": f"任务 {task_id} 不存在或已完成"
-                        }
+                }
+            else:
+                response = {
+                    "code": 404,
+                    "data": {
+                        "buildin": False,
+                        "command": "",
+                        "message": f"任务 {task_id} 不存在或已完成"
                     }
+                }
 
-            return jsonify(response)
+            return response, 200
 
         except ValueError:
             error_response = {
@@ -183,7 +874,7 @@ class HTTPServer:
                     "message": "无效的任务ID"
                 }
             }
-            return jsonify(error_response), 400
+            return error_response, 400
         except Exception as e:
             self.logger.error(f"处理任务响应时出错: {e}")
             error_response = {
@@ -194,7 +885,342 @@ class HTTPServer:
                     "message": "服务器内部错误"
                 }
             }
-            return jsonify(error_response), 500
+            return error_response, 500
+
+    @staticmethod
+    def _wait_param(args: Mapping[str, str]) -> float:
+        """长轮询等待时间（秒），不超过LONG_POLL_MAX_WAIT"""
+        return min(max(_float_arg(args, 'wait', 0), 0), ServerConfig.LONG_POLL_MAX_WAIT)
+
+    def _worker_command_params(self, args: Mapping[str, str], remote_addr: Optional[str]) -> Dict[str, Any]:
+        """解析 /worker2/command 的查询参数"""
+        max_count = _int_arg(args, 'max')
+        if max_count is not None:
+            max_count = min(max(max_count, 1), ServerConfig.BATCH_MAX_TASKS)
+        return {
+            "task_id": args.get('task_id'),
+            "command_result": args.get('command_result'),
+            # worker标识，未提供时使用客户端地址
+            "worker_id": args.get('worker_id') or remote_addr or "",
+            "wait": self._wait_param(args),
+            # 批量领取：一次返回最多max个任务
+            "max_count": max_count
+        }
+
+    def _worker_command_response(self, params: Dict[str, Any],
+                                 tasks: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], int]:
+        """把领取到的任务转换为 /worker2/command 的响应"""
+        if params["max_count"] is not None:
+            if tasks:
+                self.logger.info("批量分配 %d 个任务给 %s: %s", len(tasks), params["worker_id"],
+                                 [task['task_id'] for task in tasks])
+            return {
+                "code": 0,
+                "data": {
+                    "tasks": tasks
+                }
+            }, 200
+
+        task_info = tasks[0] if tasks else {"command": "", "buildin": False, "task_id": None}
+        response = {
+            "code": 0,
+            "data": {
+                "buildin": task_info["buildin"],
+                "command": task_info["command"],
+                "task_id": task_info["task_id"]
+            }
+        }
+
+        # 只有当有任务时才记录日志
+        if task_info["command"]:
+            self.logger.info("分配任务: %s", response)
+
+        return response, 200
+
+    def _worker_command_error(self, e: Exception) -> Tuple[Dict[str, Any], int]:
+        self.logger.error(f"处理 /worker2/command 请求时出错: {e}")
+        return {
+            "code": 500,
+            "data": {
+                "buildin": False,
+                "command": None,
+                "task_id": None
+            }
+        }, 500
+
+    def handle_worker_command(self, args: Mapping[str, str], remote_addr: Optional[str]) -> Tuple[Dict[str, Any], int]:
+        """GET /worker2/command：提交任务结果或领取任务，长轮询时阻塞当前线程"""
+        try:
+            params = self._worker_command_params(args, remote_addr)
+            # 如果是任务结果响应
+            if params["task_id"] and params["command_result"]:
+                self.logger.info("任务结果: %s -> %s", params["task_id"], params["command_result"])
+                return self._handle_task_response(params["task_id"], params["command_result"])
+
+            if params["max_count"] is not None:
+                tasks = self._claim_tasks(params["worker_id"], params["max_count"], params["wait"])
+            else:
+                task_info = self._get_next_task(params["worker_id"], params["wait"])
+                tasks = [task_info] if task_info["task_id"] is not None else []
+            return self._worker_command_response(params, tasks)
+        except Exception as e:
+            return self._worker_command_error(e)
+
+    async def handle_worker_command_async(self, args: Mapping[str, str],
+                                          remote_addr: Optional[str]) -> Tuple[Dict[str, Any], int]:
+        """handle_worker_command的协程版本，长轮询时不占用线程"""
+        try:
+            params = self._worker_command_params(args, remote_addr)
+            if params["task_id"] and params["command_result"]:
+                self.logger.info("任务结果: %s -> %s", params["task_id"], params["command_result"])
+                return self._handle_task_response(params["task_id"], params["command_result"])
+
+            tasks = await self.claim_tasks_async(params["worker_id"], params["max_count"] or 1, params["wait"])
+            return self._worker_command_response(params, tasks)
+        except Exception as e:
+            return self._worker_command_error(e)
+
+    def handle_worker_results(self, body: Any) -> Tuple[Dict[str, Any], int]:
+        """POST /worker2/results：批量提交任务结果"""
+        try:
+            results = body.get('results') if isinstance(body, dict) else None
+            if not isinstance(results, list):
+                return {
+                    "code": 400,
+                    "data": {"message": "缺少results参数"}
+                }, 400
+
+            return {
+                "code": 0,
+                "data": self.complete_tasks(results)
+            }, 200
+        except ValueError as e:
+            return {"code": 400, "data": {"message": str(e)}}, 400
+        except Exception as e:
+            self.logger.error(f"处理 /worker2/results 请求时出错: {e}")
+            return {"code": 500, "data": {"error": str(e)}}, 500
+
+    def handle_health(self) -> Tuple[Dict[str, Any], int]:
+        """GET /health：健康检查"""
+        return {
+            "code": 200,
+            "data": {
+                "status": "healthy",
+                "timestamp": datetime.now().isoformat(),
+                "server": "HTTPServer"
+            }
+        }, 200
+
+    def handle_tasks(self) -> Tuple[Dict[str, Any], int]:
+        """GET /tasks：获取当前任务状态"""
+        try:
+            return {
+                "code": 200,
+                "data": self.get_task_status()
+            }, 200
+        except Exception as e:
+            self.logger.error(f"获取任务状态时出错: {e}")
+            return {"code": 500, "data": {"error": str(e)}}, 500
+
+    def _task_result_response(self, result: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+        if result["status"] == "not_found":
+            return {"code": 404, "data": result}, 404
+        return {"code": 200, "data": result}, 200
+
+    def handle_task_result(self, task_id: int, args: Mapping[str, str]) -> Tuple[Dict[str, Any], int]:
+        """GET /tasks/<task_id>：获取任务结果，wait参数指定最多等待任务结束的秒数"""
+        try:
+            return self._task_result_response(self.get_task_result(task_id, self._wait_param(args)))
+        except Exception as e:
+            self.logger.error(f"获取任务结果时出错: {e}")
+            return {"code": 500, "data": {"error": str(e)}}, 500
+
+    async def handle_task_result_async(self, task_id: int, args: Mapping[str, str]) -> Tuple[Dict[str, Any], int]:
+        """handle_task_result的协程版本，等待时不占用线程"""
+        try:
+            return self._task_result_response(await self.get_task_result_async(task_id, self._wait_param(args)))
+        except Exception as e:
+            self.logger.error(f"获取任务结果时出错: {e}")
+            return {"code": 500, "data": {"error": str(e)}}, 500
+
+    def handle_add_task(self, task_data: Any) -> Tuple[Dict[str, Any], int]:
+        """POST /tasks/add：添加任务到队列"""
+        try:
+            if not isinstance(task_data, dict) or 'command' not in task_data:
+                return {
+                    "code": 400,
+                    "data": {"message": "缺少command参数"}
+                }, 400
+
+            command = task_data['command']
+            task_id = self.add_task(command, task_data.get('metadata'), task_data.get('target'),
+                                    task_data.get('priority'))
+            self.logger.info(f"通过API添加命令到队列: {command}")
+
+            return {
+                "code": 200,
+                "data": {
+                    "message": f"命令 '{command}' 已添加到队列",
+                    "task_id": task_id,
+                    "queue_size": self.get_queue_size()
+                }
+            }, 200
+        except ValueError as e:
+            return {"code": 400, "data": {"message": str(e)}}, 400
+        except Exception as e:
+            self.logger.error(f"添加任务时出错: {e}")
+            return {"code": 500, "data": {"error": str(e)}}, 500
+
+    def handle_add_tasks(self, task_data: Any) -> Tuple[Dict[str, Any], int]:
+        """POST /tasks/add_batch：批量添加任务到队列"""
+        try:
+            task_specs = task_data.get('tasks') if isinstance(task_data, dict) else None
+            if not isinstance(task_specs, list):
+                return {
+                    "code": 400,
+                    "data": {"message": "缺少tasks参数"}
+                }, 400
+
+            task_ids = self.add_tasks(task_specs)
+            return {
+                "code": 200,
+                "data": {
+                    "message": f"{len(task_ids)} 个命令已添加到队列",
+                    "task_ids": task_ids,
+                    "queue_size": self.get_queue_size()
+                }
+            }, 200
+        except ValueError as e:
+            return {"code": 400, "data": {"message": str(e)}}, 400
+        except Exception as e:
+            self.logger.error(f"批量添加任务时出错: {e}")
+            return {"code": 500, "data": {"error": str(e)}}, 500
+
+    def handle_broadcast(self, task_data: Any) -> Tuple[Dict[str, Any], int]:
+        """POST /tasks/broadcast：广播命令给多个agent"""
+        try:
+            if not isinstance(task_data, dict) or 'command' not in task_data:
+                return {
+                    "code": 400,
+                    "data": {"message": "缺少command参数"}
+                }, 400
+
+            agents = task_data.get('agents')
+            if agents is not None and not isinstance(agents, list):
+                return {
+                    "code": 400,
+                    "data": {"message": "agents必须是数组"}
+                }, 400
+
+            result = self.broadcast_task(task_data['command'], agents, task_data.get('metadata'),
+                                         task_data.get('priority'))
+            return {"code": 200, "data": result}, 200
+        except ValueError as e:
+            return {"code": 400, "data": {"message": str(e)}}, 400
+        except Exception as e:
+            self.logger.error(f"广播任务时出错: {e}")
+            return {"code": 500, "data": {"error": str(e)}}, 500
+
+    def handle_broadcast_status(self, broadcast_id: int) -> Tuple[Dict[str, Any], int]:
+        """GET /tasks/broadcast/<broadcast_id>：获取广播任务状态"""
+        try:
+            status = self.get_broadcast_status(broadcast_id)
+            if status is None:
+                return {
+                    "code": 404,
+                    "data": {"message": f"广播 {broadcast_id} 不存在"}
+                }, 404
+            return {"code": 200, "data": status}, 200
+        except Exception as e:
+            self.logger.error(f"获取广播状态时出错: {e}")
+            return {"code": 500, "data": {"error": str(e)}}, 500
+
+    def handle_fleet(self, args: Mapping[str, str]) -> Tuple[Dict[str, Any], int]:
+        """GET /agents/fleet：整个集群某个指标的统计、阈值过滤和Top-N"""
+        if self.fleet_metrics is None:
+            return {"code": 503, "data": {"message": "集群指标不可用：未连接心跳服务器，或心跳服务器运行在多进程模式"}}, 503
+        try:
+            percentiles = args.get('percentiles')
+            try:
+                percentiles = [float(p) for p in percentiles.split(',') if p.strip()] if percentiles else [50, 90, 99]
+            except ValueError:
+                raise ValueError("percentiles必须是逗号分隔的数字，如 50,90,99")
+            top = min(_int_arg(args, 'top', 10), ServerConfig.FLEET_MAX_TOP)
+            result = self.fleet_metrics.query(args.get('metric') or "cpu_usage", top, args.get('order') or "desc",
+                                              percentiles, _float_arg(args, 'min'), _float_arg(args, 'max'))
+            return {"code": 200, "data": result}, 200
+        except ValueError as e:
+            return {"code": 400, "data": {"message": str(e)}}, 400
+        except RuntimeError as e:
+            return {"code": 503, "data": {"message": str(e)}}, 503
+        except Exception as e:
+            self.logger.error(f"集群聚合查询时出错: {e}")
+            return {"code": 500, "data": {"error": str(e)}}, 500
+
+    @staticmethod
+    def _admin_forbidden(remote_addr: Optional[str]) -> Optional[Tuple[Dict[str, Any], int]]:
+        """管理接口默认只允许本机访问（ADMIN_ALLOW_REMOTE），允许时返回None"""
+        if ServerConfig.ADMIN_ALLOW_REMOTE or remote_addr in ("127.0.0.1", "::1", "localhost"):
+            return None
+        return {"code": 403, "data": {"message": "管理接口只允许本机访问"}}, 403
+
+    def handle_profile(self, args: Mapping[str, str], remote_addr: Optional[str]) -> Tuple[Dict[str, Any], int]:
+        """GET /admin/profile：性能分析（参数与profile工具相同），action=run时阻塞seconds秒"""
+        forbidden = self._admin_forbidden(remote_addr)
+        if forbidden:
+            return forbidden
+        try:
+            result = PROFILER.execute(args.get('action') or "run", _float_arg(args, 'seconds', 5),
+                                      args.get('mode') or "sample", _float_arg(args, 'interval'),
+                                      args.get('thread') or "", _int_arg(args, 'top', 30),
+                                      _int_arg(args, 'max_stacks', 200))
+            return {"code": 200, "data": result}, 200
+        except ValueError as e:
+            return {"code": 400, "data": {"message": str(e)}}, 400
+        except RuntimeError as e:
+            return {"code": 409, "data": {"message": str(e)}}, 409
+        except Exception as e:
+            self.logger.error(f"性能分析时出错: {e}")
+            return {"code": 500, "data": {"error": str(e)}}, 500
+
+    def handle_threads(self, remote_addr: Optional[str]) -> Tuple[Dict[str, Any], int]:
+        """GET /admin/threads：线程数和每个线程的调用栈"""
+        return self._admin_forbidden(remote_addr) or ({"code": 200, "data": PROFILER.threads()}, 200)
+
+    @staticmethod
+    def handle_metrics() -> str:
+        """GET /metrics：所有运行指标（Prometheus文本格式，Content-Type为CONTENT_TYPE）"""
+        return REGISTRY.render()
+
+    def handle_index(self) -> Tuple[Dict[str, Any], int]:
+        """GET /：服务器信息和接口列表"""
+        return {
+            "code": 200,
+            "data": {
+                "message": "HTTP服务器运行中",
+                "version": "1.0.0",
+                "features": [
+                    "任务队列管理",
+                    "用户输入监听",
+                    "worker2命令处理"
+                ],
+                "endpoints": [
+                    "GET /worker2/command - 获取/处理worker2命令",
+                    "POST /worker2/results - 批量提交任务结果",
+                    "GET /health - 健康检查",
+                    "GET /tasks - 查看任务状态",
+                    "GET /tasks/<task_id> - 获取任务结果",
+                    "POST /tasks/add - 添加任务到队列",
+                    "POST /tasks/add_batch - 批量添加任务到队列",
+                    "POST /tasks/broadcast - 广播命令给多个agent",
+                    "GET /tasks/broadcast/<broadcast_id> - 查看广播状态",
+                    "GET /agents/fleet - 集群指标统计和Top-N",
+                    "GET /metrics - 运行指标（Prometheus文本格式）",
+                    "GET /admin/profile - 性能分析（采样或cProfile，仅本机）",
+                    "GET /admin/threads - 线程数和调用栈（仅本机）"
+                ]
+            }
+        }, 200
 
     def _user_input_listener(self):
         """监听用户输入的线程函数"""
@@ -203,7 +1229,7 @@ class HTTPServer:
             try:
                 user_input = input().strip()
                 if user_input and self.running:
-                    self.task_queue.put(user_input)
+                    self.add_task(user_input)
                     self.logger.info(f"添加命令到队列: {user_input}")
             except EOFError:
                 # 输入结束（如Ctrl+D）
@@ -228,147 +1254,108 @@ class HTTPServer:
         self.running = False
 
     def _setup_routes(self):
-        """设置路由"""
+        """设置Flask路由（处理逻辑在handle_*方法中）"""
 
         @self.app.route('/worker2/command', methods=['GET'])
         def worker2_command():
             """处理worker2 command请求"""
-            try:
-                # 获取查询参数
-                task_id = request.args.get('task_id')
-                command_result = request.args.get('command_result')
+            return self._respond(self.handle_worker_command(request.args, request.remote_addr))
 
-                # 如果是任务结果响应
-                if task_id and command_result:
-                    self.logger.info(f"任务结果: {task_id} -> {command_result}")
-                    return self._handle_task_response(task_id, command_result)
-
-                # 获取下一个任务
-                task_info = self._get_next_task()
-                response = {
-                    "code": 0,
-                    "data": {
-                        "buildin": task_info["buildin"],
-                        "command": task_info["command"],
-                        "task_id": task_info["task_id"]
-                    }
-                }
-
-                # 只有当有任务时才记录日志
-                if task_info["command"]:
-                    self.logger.info(f"分配任务: {response}")
-
-                return jsonify(response)
-
-            except Exception as e:
-                self.logger.error(f"处理 /worker2/command 请求时出错: {e}")
-                error_response = {
-                    "code": 500,
-                    "data": {
-                        "buildin": False,
-                        "command": None,
-                        "task_id": None
-                    }
-                }
-                return jsonify(error_response), 500
+        @self.app.route('/worker2/results', methods=['POST'])
+        def worker2_results():
+            """批量提交任务结果"""
+            return self._respond(self.handle_worker_results(self._json_body()))
 
         @self.app.route('/health', methods=['GET'])
         def health_check():
             """健康检查接口"""
-            try:
-                response = {
-                    "code": 200,
-                    "data": {
-                        "status": "healthy",
-                        "timestamp": datetime.now().isoformat(),
-                        "server": "HTTPServer"
-                    }
-                }
-                return jsonify(response)
-            except Exception as e:
-                self.logger.error(f"健康检查出错: {e}")
-                return jsonify({"code": 500, "data": {"status": "unhealthy"}}), 500
+            return self._respond(self.handle_health())
 
         @self.app.route('/tasks', methods=['GET'])
         def get_tasks():
             """获取当前任务状态"""
-            try:
-                queue_size = self.task_queue.qsize()
-                pending_count = len(self.pending_tasks)
+            return self._respond(self.handle_tasks())
 
-                response = {
-                    "code": 200,
-                    "data": {
-                        "queue_size": queue_size,
-                        "pending_tasks": pending_count,
-                        "pending_task_details": self.pending_tasks
-                    }
-                }
-                return jsonify(response)
-            except Exception as e:
-                self.logger.error(f"获取任务状态时出错: {e}")
-                return jsonify({"code": 500, "data": {"error": str(e)}}), 500
+        @self.app.route('/tasks/<int:task_id>', methods=['GET'])
+        def get_task_result(task_id):
+            """获取任务结果，wait参数指定最多等待任务结束的秒数"""
+            return self._respond(self.handle_task_result(task_id, request.args))
 
         @self.app.route('/tasks/add', methods=['POST'])
         def add_task():
             """添加任务到队列"""
-            try:
-                task_data = request.get_json()
-                if not task_data or 'command' not in task_data:
-                    return jsonify({
-                        "code": 400,
-                        "data": {"message": "缺少command参数"}
-                    }), 400
+            return self._respond(self.handle_add_task(self._json_body()))
 
-                command = task_data['command']
-                self.task_queue.put(command)
-                self.logger.info(f"通过API添加命令到队列: {command}")
+        @self.app.route('/tasks/add_batch', methods=['POST'])
+        def add_tasks():
+            """批量添加任务到队列"""
+            return self._respond(self.handle_add_tasks(self._json_body()))
 
-                response = {
-                    "code": 200,
-                    "data": {
-                        "message": f"命令 '{command}' 已添加到队列",
-                        "queue_size": self.task_queue.qsize()
-                    }
-                }
-                return jsonify(response)
-            except Exception as e:
-                self.logger.error(f"添加任务时出错: {e}")
-                return jsonify({"code": 500, "data": {"error": str(e)}}), 500
+        @self.app.route('/tasks/broadcast', methods=['POST'])
+        def broadcast_task():
+            """广播命令给多个agent"""
+            return self._respond(self.handle_broadcast(self._json_body()))
+
+        @self.app.route('/tasks/broadcast/<int:broadcast_id>', methods=['GET'])
+        def get_broadcast_status(broadcast_id):
+            """获取广播任务状态"""
+            return self._respond(self.handle_broadcast_status(broadcast_id))
+
+        @self.app.route('/agents/fleet', methods=['GET'])
+        def get_fleet():
+            """集群指标统计和Top-N"""
+            return self._respond(self.handle_fleet(request.args))
+
+        @self.app.route('/metrics', methods=['GET'])
+        def metrics():
+            """运行指标（Prometheus文本格式）"""
+            return self.app.response_class(self.handle_metrics(), content_type=CONTENT_TYPE)
+
+        @self.app.route('/admin/profile', methods=['GET'])
+        def admin_profile():
+            """性能分析"""
+            return self._respond(self.handle_profile(request.args, request.remote_addr))
+
+        @self.app.route('/admin/threads', methods=['GET'])
+        def admin_threads():
+            """线程数和调用栈"""
+            return self._respond(self.handle_threads(request.remote_addr))
 
         @self.app.route('/', methods=['GET'])
         def index():
             """根路径"""
-            response = {
-                "code": 200,
-                "data": {
-                    "message": "HTTP服务器运行中",
-                    "version": "1.0.0",
-                    "features": [
-                        "任务队列管理",
-                        "用户输入监听",
-                        "worker2命令处理"
-                    ],
-                    "endpoints": [
-                        "GET /worker2/command - 获取/处理worker2命令",
-                        "GET /health - 健康检查",
-                        "GET /tasks - 查看任务状态",
-                        "POST /tasks/add - 添加任务到队列"
-                    ]
-                }
-            }
-            return jsonify(response)
+            return self._respond(self.handle_index())
 
-        # 添加请求日志中间件
         @self.app.before_request
-        def log_request():
-            self.logger.info(f"收到请求: {request.method} {request.path} from {request.remote_addr}")
+        def start_timer():
+            g.request_start = time.perf_counter()
 
+        # 请求日志中间件：每个请求在响应后记录一条（同类日志限速）和请求指标
         @self.app.after_request
         def log_response(response):
-            self.logger.info(f"响应状态: {response.status_code} for {request.method} {request.path}")
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            observe_request(request.method, route, response.status_code,
+                            time.perf_counter() - g.get("request_start", time.perf_counter()))
+            self.logger.info("请求: %s %s from %s -> %d", request.method, request.path, request.remote_addr,
+                             response.status_code, extra=RATE_LIMITED)
             return response
 
+    @staticmethod
+    def _json_body() -> Any:
+        """JSON请求体，不是JSON或格式错误时返回None（与request.get_json(silent=True)相同）"""
+        if not request.is_json:
+            return None
+        try:
+            return json_loads(request.get_data(cache=False))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _respond(result: Tuple[Dict[str, Any], int]):
+        """把handle_*的返回值转换为Flask响应（JSON由utils.codec编码）"""
+        body, status = result
+        return Response(json_dumps(body), status=status, mimetype="application/json")
+
     def run(self, debug: bool = False, enable_input: bool = True):
         """启动HTTP服务器"""
         self.logger.info(f"启动HTTP服务器在 {self.host}:{self.port}")
@@ -385,13 +1372,14 @@ class HTTPServer:
             # 启动用户输入监听
             self.start_input_listener()
 
+        self.running = True
         try:
             self.app.run(host=self.host, port=self.port, debug=debug, threaded=True)
         except KeyboardInterrupt:
             self.logger.info("收到中断信号，正在停止HTTP服务器...")
         finally:
-            if enable_input:
-                self.stop_input_listener()
+            self.running = False
+            self.close()
 
     def get_app(self):
         """获取Flask应用实例（用于部署）"""
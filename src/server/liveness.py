@@ -0,0 +1,80 @@
+"""
+客户端存活检测 - 按到期时间排序的最小堆
+"""
+import heapq
+import itertools
+import threading
+from typing import List, Tuple
+
+from server.agent_state import AgentState
+
+
+class LivenessTracker:
+    """把客户端分为 active / late / dead 三种状态，并在断开连接的agent超过保留期后清除
+
+    每个客户端在堆中只有一个有效条目（序号与AgentState.liveness_seq相同），到期时间为下一次
+    可能改变状态的时间点。心跳只更新AgentState.last_heartbeat，不操作堆；条目到期时按实际的
+    最近心跳时间重新判断并放回堆中，所以每次心跳是O(1)，每次检查只处理已到期的条目。
+    - 超过late_after秒没有心跳：late
+    - 超过dead_after秒没有心跳：dead，dead状态再保留dead_after秒后清除
+    - 断开连接（disconnected）超过grace_period秒没有重连：清除
+    """
+
+    def __init__(self, late_after: float, dead_after: float, grace_period: float = 0):
+        self.late_after = late_after
+        self.dead_after = max(dead_after, late_after)
+        self.grace_period = grace_period
+        self._heap = []  # (到期时间, 序号, 客户端状态)
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def _push(self, deadline: float, state: AgentState):
+        """放入新条目，之前的条目随之失效（调用方需持有_lock）"""
+        seq = next(self._seq)
+        state.liveness_seq = seq
+        heapq.heappush(self._heap, (deadline, seq, state))
+
+    def track(self, state: AgentState):
+        """开始跟踪新客户端，或重新跟踪重连的agent"""
+        with self._lock:
+            self._push(state.last_heartbeat + self.late_after, state)
+
+    def disconnect(self, state: AgentState, now: float):
+        """agent断开连接，保留grace_period秒"""
+        with self._lock:
+            state.status = "disconnected"
+            state.disconnected_at = now
+            self._push(now + self.grace_period, state)
+
+    def sweep(self, now: float) -> Tuple[List[AgentState], List[AgentState], List[AgentState]]:
+        """处理所有已到期的条目，返回 (本次状态变化的客户端, 本次变为dead的客户端, 需要清除的客户端)"""
+        changed, dead, expired = [], [], []
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                _, seq, state = heapq.heappop(heap)
+                if seq != state.liveness_seq or state.status == "removed":
+                    continue
+                if state.status in ("dead", "disconnected"):
+                    expired.append(state)
+                    continue
+
+                age = now - state.last_heartbeat
+                if age >= self.dead_after:
+                    status = "dead"
+                    dead.append(state)
+                    deadline = now + self.dead_after
+                elif age >= self.late_after:
+                    status = "late"
+                    deadline = state.last_heartbeat + self.dead_after
+                else:
+                    status = "active"
+                    deadline = state.last_heartbeat + self.late_after
+                if state.status != status:
+                    state.status = status
+                    changed.append(state)
+                self._push(deadline, state)
+        return changed, dead, expired
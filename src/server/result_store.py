@@ -0,0 +1,98 @@
+"""
+任务结果存储 - 按条数和总字节数限制的内存存储
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+class TaskResultStore:
+    """任务结果存储
+
+    以任务ID为键保存已结束任务的结果，超过条数上限或总字节数上限时按LRU淘汰最久未访问的结果，
+    超过ttl秒的结果在访问或写入时淘汰。单条结果文本超过max_result_bytes时截断保存。
+    不是线程安全的，由调用方加锁。
+    """
+
+    # 每条记录除结果文本外的估算开销（字节）
+    ENTRY_OVERHEAD = 256
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float, max_result_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_result_bytes = max_result_bytes
+        self._entries = OrderedDict()  # task_id -> (结果记录, 估算大小, 写入时间)
+        self._total_bytes = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def put(self, task_id: int, record: Dict[str, Any]):
+        """保存任务结果，必要时淘汰旧结果"""
+        self._discard(task_id)
+
+        result = record.get("result")
+        if isinstance(result, str):
+            encoded = result.encode("utf-8")
+            if len(encoded) > self.max_result_bytes:
+                record = dict(record,
+                              result=encoded[:self.max_result_bytes].decode("utf-8", errors="ignore"),
+                              result_truncated=True)
+
+        size = self.ENTRY_OVERHEAD
+        for value in (record.get("command"), record.get("result")):
+            if isinstance(value, str):
+                size += len(value.encode("utf-8"))
+
+        now = time.monotonic()
+        self._entries[task_id] = (record, size, now)
+        self._total_bytes += size
+        self._evict(now)
+
+    def get(self, task_id: int) -> Optional[Dict[str, Any]]:
+        """获取任务结果，不存在或已过期时返回None"""
+        entry = self._entries.get(task_id)
+        if entry is None:
+            return None
+
+        if time.monotonic() - entry[2] > self.ttl:
+            self._discard(task_id)
+            self.evicted += 1
+            return None
+
+        self._entries.move_to_end(task_id)
+        return entry[0]
+
+    def _discard(self, task_id: int):
+        entry = self._entries.pop(task_id, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+
+    def _evict(self, now: float):
+        """淘汰超出限制或过期的结果（从最久未访问的开始）"""
+        while self._entries:
+            task_id, (_, size, stored_at) = next(iter(self._entries.items()))
+            over_limit = len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes
+            if not over_limit and now - stored_at <= self.ttl:
+                break
+            self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evicted += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取存储统计信息"""
+        return {
+            "entries": len(self._entries),
+            "total_bytes": self._total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "max_result_bytes": self.max_result_bytes,
+            "ttl": self.ttl,
+            "evicted": self.evicted
+        }
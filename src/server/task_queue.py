@@ -0,0 +1,90 @@
+"""
+优先级任务队列 - 带老化机制的最小堆
+"""
+import heapq
+import itertools
+import time
+from typing import Dict, Any, Optional, Tuple
+
+# 优先级名称 -> 级别，级别越小越优先
+PRIORITY_LEVELS = {"high": 0, "normal": 1, "low": 2}
+PRIORITY_NAMES = {level: name for name, level in PRIORITY_LEVELS.items()}
+# 老化最多提升到的级别（normal），老化的任务不会越过high任务
+_AGING_CEILING = PRIORITY_LEVELS["normal"]
+
+
+def parse_priority(priority: Optional[str], default: str = "normal") -> str:
+    """校验并规范化优先级名称，未指定时返回default"""
+    if priority is None or priority == "":
+        return default
+    if not isinstance(priority, str) or priority.lower() not in PRIORITY_LEVELS:
+        raise ValueError(f"无效的优先级: {priority!r}，可选: {', '.join(PRIORITY_LEVELS)}")
+    return priority.lower()
+
+
+class PriorityTaskQueue:
+    """按优先级出队的任务队列（每个优先级一个最小堆，同一优先级内先进先出）
+
+    high任务总是先于其他任务出队。为避免低优先级任务饿死，normal以下的任务每等待aging_interval秒
+    提升一级，但最多提升到normal，不会越过high任务；提升后与该级别的任务按入队时间先进先出。
+    入队时间在第一次入队时确定并保存在任务的"_queued_since"中，重新入队的任务沿用原来的时间，回到原来的位置。
+    不是线程安全的，由调用方加锁。
+    """
+
+    def __init__(self, aging_interval: float):
+        self.aging_interval = aging_interval
+        self._heaps = [[] for _ in PRIORITY_LEVELS]  # 每个优先级一个堆：(入队时间, 序号, 任务)
+        self._seq = itertools.count()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def push(self, task: Dict[str, Any]):
+        """任务入队，O(log n)"""
+        since = task.get("_queued_since")
+        if since is None:
+            since = task["_queued_since"] = time.monotonic()
+        heapq.heappush(self._heaps[PRIORITY_LEVELS[task["priority"]]], (since, next(self._seq), task))
+        self._size += 1
+
+    def _head(self, now: float) -> Optional[Tuple[Tuple[int, float, int], int]]:
+        """((有效级别, 入队时间, 序号), 所在堆的级别)，队列为空时返回None
+
+        每个堆的堆顶是该级别等待最久的任务，有效级别也最高，只需要比较各堆的堆顶。
+        """
+        best = None
+        for level, heap in enumerate(self._heaps):
+            if not heap:
+                continue
+            since, seq = heap[0][0], heap[0][1]
+            effective = level
+            if level > _AGING_CEILING and self.aging_interval > 0:
+                effective = max(_AGING_CEILING, level - int((now - since) // self.aging_interval))
+            key = (effective, since, seq)
+            if best is None or key < best[0]:
+                best = (key, level)
+            if level == 0:
+                # high任务总是最先出队
+                break
+        return best
+
+    def pop(self) -> Dict[str, Any]:
+        """取出最优先的任务，O(log n)，队列为空时抛出IndexError"""
+        head = self._head(time.monotonic())
+        if head is None:
+            raise IndexError("pop from an empty PriorityTaskQueue")
+        self._size -= 1
+        return heapq.heappop(self._heaps[head[1]])[2]
+
+    def peek_key(self, now: Optional[float] = None) -> Optional[Tuple[int, float]]:
+        """队首任务的排序键 (有效级别, 入队时间)，可以在不同队列之间比较；队列为空时返回None"""
+        head = self._head(time.monotonic() if now is None else now)
+        return head[0][:2] if head is not None else None
+
+    def depth_by_priority(self) -> Dict[str, int]:
+        """每个优先级等待中的任务数"""
+        return {PRIORITY_NAMES[level]: len(heap) for level, heap in enumerate(self._heaps)}
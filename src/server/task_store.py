@@ -0,0 +1,201 @@
+"""
+任务持久化存储 - SQLite（WAL模式）+ 组提交
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id INTEGER PRIMARY KEY,
+    command TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    target TEXT,
+    metadata TEXT,
+    broadcast_id INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL,
+    worker_id TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# 操作类型 -> SQL
+_STATEMENTS = {
+    "enqueue": "INSERT OR REPLACE INTO tasks (task_id, command, priority, target, metadata, broadcast_id, attempts, state) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, 'queued')",
+    "claim": "UPDATE tasks SET state = 'running', attempts = ?, worker_id = ? WHERE task_id = ?",
+    "requeue": "UPDATE tasks SET state = 'queued', worker_id = NULL WHERE task_id = ?",
+    "finish": "DELETE FROM tasks WHERE task_id = ?",
+    "meta": "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+}
+
+
+class SQLiteTaskStore:
+    """SQLite任务存储
+
+    保存所有未结束（排队中或进行中）的任务，任务结束后删除对应行，结果仍只保存在内存的结果存储中。
+    调用方在task_lock内通过enqueue/claim/requeue/finish记录变更（只追加到内存中的待写队列），
+    后台写线程每次把积累的所有变更放在一个事务里提交（组提交），一次fsync摊到整批写入上。
+    需要确认写入落盘的调用方（如添加任务的接口）释放锁后调用wait_durable()等待所在批次提交。
+    """
+
+    def __init__(self, path: str, synchronous: str = "FULL", max_batch: int = 10000):
+        self.path = path
+        self.max_batch = max_batch
+        self.logger = logging.getLogger("HTTPServer")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 连接只在写线程中使用（启动时的load()在写线程启动前执行）
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.executescript(_SCHEMA)
+
+        self._ops = deque()  # 待写入的变更 (操作类型, 参数)
+        self._cond = threading.Condition()
+        self._submitted = 0  # 已提交到待写队列的变更数
+        self._processed = 0  # 写线程已处理（提交或失败）的变更数
+        self._durable = 0  # 已落盘的变更数
+        self._failed = deque(maxlen=100)  # 最近写入失败的变更序号区间 (起始, 结束]
+        self._commits = 0
+        self._closing = False
+        self._writer = None
+
+    def load(self) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """读取所有未结束的任务（按任务ID排序）和计数器，在启动写线程前调用"""
+        tasks = []
+        rows = self._conn.execute(
+            "SELECT task_id, command, priority, target, metadata, broadcast_id, attempts, state, worker_id "
+            "FROM tasks ORDER BY task_id"
+        )
+        for task_id, command, priority, target, metadata, broadcast_id, attempts, state, worker_id in rows:
+            task = {"task_id": task_id, "command": command, "priority": priority,
+                    "attempts": attempts, "state": state, "worker_id": worker_id}
+            if metadata:
+                task["metadata"] = json.loads(metadata)
+            if target:
+                task["target"] = target
+            if broadcast_id is not None:
+                task["broadcast_id"] = broadcast_id
+            tasks.append(task)
+        counters = dict(self._conn.execute("SELECT key, value FROM meta"))
+        return tasks, counters
+
+    def start(self):
+        """启动后台写线程"""
+        self._writer = threading.Thread(target=self._write_loop, name="TaskStoreWriter", daemon=True)
+        self._writer.start()
+
+    def _submit(self, op: str, params: tuple) -> int:
+        with self._cond:
+            self._ops.append((op, params))
+            self._submitted += 1
+            self._cond.notify_all()
+            return self._submitted
+
+    def enqueue(self, task: Dict[str, Any]) -> int:
+        """记录新入队的任务，返回变更序号（用于wait_durable）"""
+        metadata = task.get("metadata")
+        return self._submit("enqueue", (
+            task["task_id"], task["command"], task["priority"], task.get("target"),
+            json.dumps(metadata, ensure_ascii=False) if metadata else None,
+            task.get("broadcast_id"), task["attempts"]
+        ))
+
+    def claim(self, task: Dict[str, Any]) -> int:
+        """记录任务被worker领取"""
+        return self._submit("claim", (task["attempts"], task["worker_id"], task["task_id"]))
+
+    def requeue(self, task_id: int) -> int:
+        """记录任务重新放回队列"""
+        return self._submit("requeue", (task_id,))
+
+    def finish(self, task_id: int) -> int:
+        """记录任务结束（删除）"""
+        return self._submit("finish", (task_id,))
+
+    def set_counter(self, key: str, value: int) -> int:
+        """记录计数器（如最大任务ID）"""
+        return self._submit("meta", (key, value))
+
+    def wait_durable(self, seq: int, timeout: Optional[float] = None) -> bool:
+        """等待序号为seq的变更所在批次提交，超时、写入失败或存储已关闭时返回False
+
+        写线程未启动或已结束（close之后）时不等待，关闭后提交的变更不会再写入，直接返回False。
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._processed >= seq or self._writer is None, timeout):
+                return False
+            if self._processed < seq:
+                return False
+            return not any(start < seq <= end for start, end in self._failed)
+
+    def _write_loop(self):
+        """写线程：每次取出积累的所有变更，在一个事务里执行并提交"""
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._ops or self._closing)
+                if not self._ops:
+                    return
+                count = min(len(self._ops), self.max_batch)
+                batch = [self._ops.popleft() for _ in range(count)]
+
+            try:
+                self._conn.execute("BEGIN")
+                for op, params in batch:
+                    self._conn.execute(_STATEMENTS[op], params)
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                self.logger.error(f"任务存储写入失败，丢弃 {count} 条变更: {e}")
+                try:
+                    self._conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                with self._cond:
+                    self._failed.append((self._processed, self._processed + count))
+                    self._processed += count
+                    self._cond.notify_all()
+                continue
+
+            with self._cond:
+                self._processed += count
+                self._durable += count
+                self._commits += 1
+                self._cond.notify_all()
+
+    def close(self):
+        """写完剩余的变更后关闭，之后的wait_durable立即返回False"""
+        writer = self._writer
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if writer is not None:
+            writer.join()
+        with self._cond:
+            self._writer = None
+            # 唤醒还在等待的调用方：它们的变更在关闭后提交，不会再写入
+            self._cond.notify_all()
+        self._conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取存储统计信息"""
+        with self._cond:
+            return {
+                "backend": "sqlite",
+                "path": self.path,
+                "pending_writes": len(self._ops),
+                "durable_writes": self._durable,
+                "failed_writes": self._processed - self._durable,
+                "commits": self._commits,
+                "writes_per_commit": round(self._durable / self._commits, 2) if self._commits else 0
+            }
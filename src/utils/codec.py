@@ -0,0 +1,154 @@
+"""
+消息编解码 - 心跳服务器和HTTP API共用的JSON编解码，以及心跳的紧凑二进制编码
+
+JSON：安装orjson时使用orjson（比标准库快数倍），否则使用标准库json，两者输出都是合法JSON。
+二进制心跳帧：system_info的数值字段按固定的struct布局编码，服务器解码时不需要解析JSON。
+
+    帧头   magic(0xB1) | 类型(1字节) | 负载长度(2字节，大端)
+    类型1  system_info：code(int32) + 7个float64（SYSTEM_INFO_FIELDS的顺序）+
+           agent_id、machine_name、os_version（各为1字节长度 + UTF-8）
+    类型2  JSON：负载为与文本协议相同的JSON消息
+    类型0x80  服务器回复：code(int32)，0为确认
+
+编码按连接协商：magic不是合法的JSON起始字节，连接上收到二进制帧后服务器以二进制帧回复，
+只发送JSON的客户端不受影响。
+"""
+import json
+import struct
+from typing import Dict, Any, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，未安装时使用标准库json
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+BINARY_MAGIC = 0xB1
+BINARY_HEADER = struct.Struct(">BBH")
+KIND_SYSTEM_INFO = 1
+KIND_JSON = 2
+KIND_RESPONSE = 0x80
+MAX_BINARY_PAYLOAD = 0xFFFF
+
+# system_info二进制帧中数值字段的顺序（与SystemInfo的字段同名）
+SYSTEM_INFO_FIELDS = ("cpu_usage", "memory_total", "memory_used", "disk_total", "disk_used",
+                      "network_upload", "network_download")
+_SYSTEM_INFO = struct.Struct("<i7d")
+_RESPONSE = struct.Struct("<i")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def json_loads(data):
+        """解析JSON（bytes或str），格式错误时抛出ValueError（json.JSONDecodeError或UnicodeDecodeError）"""
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson把非UTF-8输入也报告为JSONDecodeError；与标准库路径一致，编码错误抛出UnicodeDecodeError
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                bytes(data).decode("utf-8")
+            raise
+
+    def json_dumps(obj) -> bytes:
+        """编码为UTF-8 JSON字节；orjson不支持的对象（如超过64位的整数）退回标准库"""
+        try:
+            return orjson.dumps(obj, option=_ORJSON_OPTIONS)
+        except TypeError:
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def json_loads(data):
+        """解析JSON（bytes或str），格式错误时抛出ValueError（json.JSONDecodeError或UnicodeDecodeError）"""
+        if isinstance(data, (bytes, bytearray)):
+            # 先按UTF-8解码比让json.loads检测编码更快
+            data = data.decode("utf-8")
+        return json.loads(data)
+
+    def json_dumps(obj) -> bytes:
+        """编码为UTF-8 JSON字节（紧凑格式，不转义非ASCII字符）"""
+        return _encoder.encode(obj).encode("utf-8")
+
+
+def _binary_frame(kind: int, payload: bytes) -> bytes:
+    if len(payload) > MAX_BINARY_PAYLOAD:
+        raise ValueError(f"二进制帧负载超过 {MAX_BINARY_PAYLOAD} 字节")
+    return BINARY_HEADER.pack(BINARY_MAGIC, kind, len(payload)) + payload
+
+
+def _pack_string(value: str) -> bytes:
+    encoded = value.encode("utf-8")
+    if len(encoded) > 255:
+        raise ValueError("二进制帧中的字符串不能超过255字节")
+    return bytes((len(encoded),)) + encoded
+
+
+def encode_system_info(system_info: Dict[str, Any], agent_id: str = "", code: int = 200) -> bytes:
+    """把system_info心跳编码为二进制帧（客户端使用），缺失的数值字段记为0"""
+    values = [float(system_info.get(field) or 0) for field in SYSTEM_INFO_FIELDS]
+    payload = (_SYSTEM_INFO.pack(code, *values) + _pack_string(agent_id)
+               + _pack_string(str(system_info.get("machine_name", "unknown")))
+               + _pack_string(str(system_info.get("os_version", "unknown"))))
+    return _binary_frame(KIND_SYSTEM_INFO, payload)
+
+
+def encode_json_frame(message: Dict[str, Any]) -> bytes:
+    """把任意心跳消息编码为JSON负载的二进制帧（二进制连接上发送非system_info心跳）"""
+    return _binary_frame(KIND_JSON, json_dumps(message))
+
+
+def encode_response(code: int, data: str = "", message: Optional[str] = None, binary: bool = False) -> bytes:
+    """心跳服务器的回复：二进制帧只带code，文本为换行结尾的JSON"""
+    if binary:
+        return _binary_frame(KIND_RESPONSE, _RESPONSE.pack(code))
+    response = {"code": code, "data": data}
+    if message is not None:
+        response["message"] = message
+    return json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def decode_response(frame: bytes) -> int:
+    """解码二进制回复帧，返回code（客户端使用）"""
+    magic, kind, length = BINARY_HEADER.unpack_from(frame)
+    if magic != BINARY_MAGIC or kind != KIND_RESPONSE or length != _RESPONSE.size:
+        raise ValueError("不是二进制回复帧")
+    return _RESPONSE.unpack_from(frame, BINARY_HEADER.size)[0]
+
+
+def decode_message(frame: bytes) -> Dict[str, Any]:
+    """解码一条完整的心跳帧（JSON文本或二进制帧）为消息字典，格式错误时抛出ValueError"""
+    if not frame or frame[0] != BINARY_MAGIC:
+        return json_loads(frame)
+
+    _, kind, length = BINARY_HEADER.unpack_from(frame)
+    offset = BINARY_HEADER.size
+    if len(frame) != offset + length:
+        raise ValueError("二进制帧长度不匹配")
+    if kind == KIND_JSON:
+        return json_loads(frame[offset:])
+    if kind != KIND_SYSTEM_INFO:
+        raise ValueError(f"不支持的二进制帧类型: {kind}")
+
+    try:
+        (code, cpu_usage, memory_total, memory_used, disk_total, disk_used,
+         network_upload, network_download) = _SYSTEM_INFO.unpack_from(frame, offset)
+        offset += _SYSTEM_INFO.size
+        strings = []
+        for _ in range(3):
+            end = offset + 1 + frame[offset]
+            strings.append(frame[offset + 1:end].decode("utf-8"))
+            offset = end
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"system_info二进制帧不完整: {e}") from None
+    if offset != len(frame):
+        raise ValueError("system_info二进制帧长度不匹配")
+    agent_id, machine_name, os_version = strings
+
+    # 字段顺序与SYSTEM_INFO_FIELDS一致，直接构造字典
+    data = {"type": "system_info", "machine_name": machine_name, "os_version": os_version,
+            "cpu_usage": cpu_usage, "memory_total": memory_total, "memory_used": memory_used,
+            "disk_total": disk_total, "disk_used": disk_used,
+            "network_upload": network_upload, "network_download": network_download}
+    return {"code": code, "data": data, "agent_id": agent_id or None}
@@ -0,0 +1,294 @@
+"""
+大文件读取 - 通过mmap按字节范围、行范围、末尾若干行读取和按正则搜索，不把整个文件读入内存
+"""
+import bisect
+import mmap
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+class _LineIndex:
+    """稀疏行索引：每INDEX_STEP字节记录一个检查点（偏移量, 之前的换行符数）
+
+    日志文件只会追加，文件变大且inode不变时只索引新增的部分；其他变化（轮转、截断、改写）时重建。
+    """
+
+    INDEX_STEP = 256 * 1024
+
+    __slots__ = ("inode", "size", "mtime_ns", "offsets", "lines_before", "newlines")
+
+    def __init__(self, inode: int):
+        self.inode = inode
+        self.size = 0  # 已索引的字节数
+        self.mtime_ns = 0
+        self.offsets = array("Q")
+        self.lines_before = array("Q")
+        self.newlines = 0  # 已索引部分的换行符数
+
+    def extend(self, mm: mmap.mmap, size: int, mtime_ns: int):
+        """索引 [self.size, size) 部分"""
+        step = self.INDEX_STEP
+        pos = self.size
+        while pos < size:
+            if pos == len(self.offsets) * step:
+                self.offsets.append(pos)
+                self.lines_before.append(self.newlines)
+            end = min(size, (pos // step + 1) * step)
+            self.newlines += mm[pos:end].count(b"\n")
+            pos = end
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    def total_lines(self, mm: mmap.mmap) -> int:
+        """行数（最后一行没有换行符时也算一行）"""
+        if self.size and mm[self.size - 1] != 0x0A:
+            return self.newlines + 1
+        return self.newlines
+
+    def line_start(self, mm: mmap.mmap, line: int) -> int:
+        """第line行（从0开始）的起始偏移量，超过行数时返回文件大小"""
+        if line <= 0:
+            return 0
+        if line > self.newlines:
+            return self.size
+        # 之前的换行符数小于line的最后一个检查点，第line个换行符在它和下一个检查点之间
+        index = bisect.bisect_left(self.lines_before, line) - 1
+        pos = self.offsets[index]
+        for _ in range(line - self.lines_before[index]):
+            pos = mm.find(b"\n", pos, self.size) + 1
+        return pos
+
+    def line_number(self, mm: mmap.mmap, offset: int) -> int:
+        """offset所在行的行号（从0开始）"""
+        index = bisect.bisect_right(self.offsets, offset) - 1
+        return self.lines_before[index] + mm[self.offsets[index]:offset].count(b"\n")
+
+
+class FileReader:
+    """按需读取大文件，每次返回的内容不超过max_bytes
+
+    每个请求打开文件并mmap，不长期占用文件句柄（不影响日志轮转）；行索引按路径缓存，
+    用inode/大小/修改时间校验，最多缓存cache_size个文件。线程安全。
+    """
+
+    def __init__(self, max_bytes: int, max_matches: int, cache_size: int):
+        self.max_bytes = max_bytes
+        self.max_matches = max_matches
+        self.cache_size = cache_size
+        self._indexes = OrderedDict()  # 绝对路径 -> _LineIndex
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "extended": 0, "rebuilt": 0}
+
+    def _open(self, path: str) -> Tuple[Optional[mmap.mmap], os.stat_result]:
+        """mmap整个文件，空文件返回None"""
+        with open(path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            if stat.st_size == 0:
+                return None, stat
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ), stat
+
+    def _index(self, path: str, mm: mmap.mmap, stat: os.stat_result) -> _LineIndex:
+        """获取最新的行索引：未变化时直接使用，追加写入时增量索引，否则重建"""
+        key = os.path.abspath(path)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                if index.inode == stat.st_ino and index.size == stat.st_size and index.mtime_ns == stat.st_mtime_ns:
+                    self.stats["hits"] += 1
+                    return index
+                if index.inode == stat.st_ino and index.size < stat.st_size:
+                    index.extend(mm, stat.st_size, stat.st_mtime_ns)
+                    self.stats["extended"] += 1
+                    return index
+
+            index = _LineIndex(stat.st_ino)
+            index.extend(mm, stat.st_size, stat.st_mtime_ns)
+            self._indexes[key] = index
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > self.cache_size:
+                self._indexes.popitem(last=False)
+            self.stats["rebuilt"] += 1
+            return index
+
+    @staticmethod
+    def _decode(data: bytes) -> str:
+        # 字节范围可能截断多字节字符，无法解码的字节替换为U+FFFD
+        return data.decode("utf-8", errors="replace")
+
+    def read_range(self, path: str, offset: int = 0, length: int = 0) -> Dict[str, Any]:
+        """读取 [offset, offset+length) 字节，length为0或超过max_bytes时读取max_bytes"""
+        if offset < 0:
+            raise ValueError("offset不能为负数")
+        length = min(length, self.max_bytes) if length > 0 else self.max_bytes
+        mm, stat = self._open(path)
+        size = stat.st_size
+        try:
+            offset = min(offset, size)
+            end = min(offset + length, size)
+            content = mm[offset:end] if mm is not None else b""
+        finally:
+            if mm is not None:
+                mm.close()
+        return {
+            "size": size,
+            "offset": offset,
+            "length": end - offset,
+            "next_offset": end if end < size else None,
+            "content": self._decode(content)
+        }
+
+    def read_lines(self, path: str, start_line: int, line_count: int = 0) -> Dict[str, Any]:
+        """从第start_line行（从1开始）读取line_count行，line_count为0时读到max_bytes为止"""
+        if start_line < 1:
+            raise ValueError("start_line从1开始")
+        mm, stat = self._open(path)
+        if mm is None:
+            return {"size": 0, "total_lines": 0, "start_line": start_line, "end_line": start_line - 1,
+                    "truncated": False, "content": ""}
+        try:
+            index = self._index(path, mm, stat)
+            total_lines = index.total_lines(mm)
+            start = index.line_start(mm, start_line - 1)
+            if line_count > 0:
+                end = index.line_start(mm, start_line - 1 + line_count)
+            else:
+                end = stat.st_size
+            truncated = end - start > self.max_bytes
+            if truncated:
+                # 截断到max_bytes内最后一个完整行，第一行就超过max_bytes时截断该行
+                limit = start + self.max_bytes
+                cut = mm.rfind(b"\n", start, limit)
+                end = cut + 1 if cut >= 0 else limit
+            content = mm[start:end]
+        finally:
+            mm.close()
+
+        returned = content.count(b"\n") + (1 if content and not content.endswith(b"\n") else 0)
+        return {
+            "size": stat.st_size,
+            "total_lines": total_lines,
+            "start_line": start_line,
+            "end_line": start_line + returned - 1,
+            "truncated": truncated,
+            "content": self._decode(content)
+        }
+
+    def tail(self, path: str, lines: int) -> Dict[str, Any]:
+        """读取最后lines行（不超过max_bytes）"""
+        if lines < 1:
+            raise ValueError("lines必须大于0")
+        mm, stat = self._open(path)
+        if mm is None:
+            return {"size": 0, "total_lines": 0, "start_line": 1, "end_line": 0, "truncated": False, "content": ""}
+        try:
+            size = stat.st_size
+            index = self._index(path, mm, stat)
+            total_lines = index.total_lines(mm)
+            # 从末尾向前找换行符，最后一个字节的换行符属于最后一行
+            limit = max(size - self.max_bytes, 0)
+            end = size - 1 if mm[size - 1] == 0x0A else size
+            start = end
+            found = 0
+            while found < lines:
+                pos = mm.rfind(b"\n", limit, start)
+                if pos < 0:
+                    break
+                start = pos
+                found += 1
+            if found == lines:
+                start += 1
+                truncated = False
+            else:
+                # 文件开头或max_bytes限制，limit不在行首时丢弃不完整的第一行
+                truncated = limit > 0
+                if truncated:
+                    cut = mm.find(b"\n", limit, size)
+                    start = cut + 1 if 0 <= cut < end else limit
+                else:
+                    start = 0
+            content = mm[start:size]
+            start_line = index.line_number(mm, start) + 1
+        finally:
+            mm.close()
+
+        returned = content.count(b"\n") + (1 if content and not content.endswith(b"\n") else 0)
+        return {
+            "size": size,
+            "total_lines": total_lines,
+            "start_line": start_line,
+            "end_line": start_line + returned - 1,
+            "truncated": truncated,
+            "content": self._decode(content)
+        }
+
+    def grep(self, path: str, pattern: str, max_matches: int = 0, ignore_case: bool = False,
+             offset: int = 0, length: int = 0) -> Dict[str, Any]:
+        """在 [offset, offset+length) 中按正则搜索（length为0时搜索到文件末尾），返回匹配的行和行号
+
+        每行只返回一次；超过max_matches或返回内容超过max_bytes时停止，next_offset为继续搜索的位置。
+        单行超过max_bytes时只返回该行的前max_bytes字节，匹配项带truncated标记。
+        """
+        try:
+            regex = re.compile(pattern.encode("utf-8"), re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+        except re.error as e:
+            raise ValueError(f"无效的正则表达式: {e}")
+        max_matches = min(max_matches, self.max_matches) if max_matches > 0 else self.max_matches
+
+        mm, stat = self._open(path)
+        size = stat.st_size
+        matches = []
+        next_offset = None
+        if mm is None:
+            return {"size": 0, "matches": matches, "truncated": False, "next_offset": None}
+        try:
+            index = self._index(path, mm, stat)
+            offset = min(max(offset, 0), size)
+            end = min(offset + length, size) if length > 0 else size
+            # 从上一个匹配的行号开始数换行符，避免每个匹配都从检查点开始数
+            line, line_offset = index.line_number(mm, offset), offset
+            returned_bytes = 0
+            pos = offset
+            while pos < end:
+                match = regex.search(mm, pos, end)
+                if match is None:
+                    break
+                line_begin = mm.rfind(b"\n", 0, match.start()) + 1
+                line_end = mm.find(b"\n", match.start(), size)
+                if line_end < 0:
+                    line_end = size
+                line_length = line_end - line_begin
+                # 超长的行作为本次的第一个结果截断返回，否则从它的行首继续搜索会一直停在这一行
+                if len(matches) >= max_matches or (matches and returned_bytes + line_length > self.max_bytes):
+                    next_offset = line_begin
+                    break
+                line += mm[line_offset:line_begin].count(b"\n")
+                line_offset = line_begin
+                item = {"line": line + 1, "offset": line_begin}
+                if line_length > self.max_bytes:
+                    text = mm[line_begin:line_begin + self.max_bytes]
+                    item["truncated"] = True
+                else:
+                    text = mm[line_begin:line_end].rstrip(b"\r")
+                returned_bytes += len(text)
+                item["text"] = self._decode(text)
+                matches.append(item)
+                pos = line_end + 1
+        finally:
+            mm.close()
+
+        return {
+            "size": size,
+            "matches": matches,
+            "truncated": next_offset is not None,
+            "next_offset": next_offset
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """行索引缓存统计"""
+        with self._lock:
+            return dict(self.stats, cached_files=len(self._indexes))
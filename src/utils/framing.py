@@ -0,0 +1,180 @@
+"""
+心跳消息流分帧 - 从TCP字节流中切分出完整的JSON消息或二进制帧
+"""
+import re
+from typing import List, Optional
+
+from utils.codec import BINARY_HEADER, BINARY_MAGIC
+
+# 对象外部/字符串内部需要关注的结构字符
+_OUTSIDE_STRING = re.compile(rb'[{}"]')
+_INSIDE_STRING = re.compile(rb'["\\]')
+
+# 帧之间允许出现的空白字符
+_WHITESPACE = b" \t\r\n"
+
+
+class FrameDecoder:
+    """心跳消息流解码器（每个连接一个实例）
+
+    TCP是字节流，一次recv可能包含多条消息，也可能只有半条。解码器把收到的字节
+    追加到可复用的接收缓冲区，按JSON对象的括号深度切出所有完整帧，支持：
+    - 换行分隔的JSON（推荐，每条消息以换行结尾）
+    - 不带分隔符、连续发送的JSON对象（兼容旧客户端一次send一条消息）
+    - 以BINARY_MAGIC开头、带长度的二进制帧（见codec），binary在收到过二进制帧后为True
+
+    feed()返回本次能切出的所有帧，超过max_frame_size的帧被丢弃并以None表示。未完成就超过上限的帧
+    进入丢弃状态：继续跟踪括号和字符串，跳过该帧剩余的字节，直到它在深度0处结束或遇到换行，再恢复正常分帧。
+    """
+
+    def __init__(self, max_frame_size: int):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+        self._pos = 0  # 下一个待扫描的位置
+        self._frame_start = 0  # 当前帧的起始位置
+        self._depth = 0  # 当前括号深度，0表示在帧之间
+        self._in_string = False
+        self._discarding = False  # 正在跳过超长帧的剩余部分
+        self.binary = False
+
+    def feed(self, data) -> List[Optional[bytes]]:
+        """追加收到的数据并返回所有完整帧"""
+        buffer = self._buffer
+        buffer += data
+        frames: List[Optional[bytes]] = []
+        end = len(buffer)
+        pos = self._pos
+
+        while pos < end:
+            if self._discarding:
+                pos = self._discard(buffer, pos, end)
+                continue
+
+            if self._depth == 0:
+                # 跳过帧之间的空白
+                while pos < end and buffer[pos] in _WHITESPACE:
+                    pos += 1
+                if pos >= end:
+                    break
+
+                self._frame_start = pos
+                if buffer[pos] == BINARY_MAGIC:
+                    # 二进制帧：帧头带负载长度，收齐后整帧取出
+                    if end - pos < BINARY_HEADER.size:
+                        break
+                    frame_end = pos + BINARY_HEADER.size + BINARY_HEADER.unpack_from(buffer, pos)[2]
+                    if frame_end > end:
+                        break
+                    self.binary = True
+                    frames.append(self._take(frame_end))
+                    pos = frame_end
+                    continue
+                if buffer[pos] != 0x7B:  # '{'
+                    # 不是JSON对象：取到行尾（没有换行则取全部）作为一帧，交给上层报格式错误
+                    newline = buffer.find(b"\n", pos)
+                    pos = end if newline == -1 else newline
+                    frames.append(self._take(pos))
+                    continue
+
+                self._depth = 1
+                pos += 1
+                continue
+
+            if self._in_string:
+                match = _INSIDE_STRING.search(buffer, pos)
+                if match is None:
+                    pos = end
+                    break
+                if match.group() == b"\\":
+                    # 跳过被转义的字符（可能还没收到）
+                    pos = match.start() + 2
+                else:
+                    self._in_string = False
+                    pos = match.start() + 1
+                continue
+
+            match = _OUTSIDE_STRING.search(buffer, pos)
+            if match is None:
+                pos = end
+                break
+
+            pos = match.start() + 1
+            token = match.group()
+            if token == b'"':
+                self._in_string = True
+            elif token == b"{":
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    frames.append(self._take(pos))
+
+        # 丢弃已经切出的数据，缓冲区对象本身复用
+        consumed = self._frame_start if self._depth and not self._discarding else min(pos, end)
+        if consumed:
+            del buffer[:consumed]
+            pos -= consumed
+            self._frame_start -= consumed
+        self._pos = pos
+
+        # 未完成的帧已经超过上限：丢弃已收到的部分，保留括号和字符串状态，跳过它剩余的字节
+        if self._depth and not self._discarding and len(buffer) > self.max_frame_size:
+            frames.append(None)
+            self._pos = pos - len(buffer)  # 转义字符还没收到时为1
+            self._frame_start = 0
+            self._discarding = True
+            buffer.clear()
+
+        return frames
+
+    def _discard(self, buffer: bytearray, pos: int, end: int) -> int:
+        """跳过超长帧的剩余部分，到该帧在深度0处的右括号或下一个换行为止，返回继续扫描的位置"""
+        newline = buffer.find(b"\n", pos, end)
+        limit = end if newline == -1 else newline
+        while pos < limit:
+            pattern = _INSIDE_STRING if self._in_string else _OUTSIDE_STRING
+            match = pattern.search(buffer, pos, limit)
+            if match is None:
+                break
+            pos = match.start() + 1
+            token = match.group()
+            if token == b"\\":
+                pos += 1
+            elif token == b'"':
+                self._in_string = not self._in_string
+            elif token == b"{":
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._discarding = False
+                    return pos
+
+        if newline == -1:
+            # 帧还没有结束，下次feed继续跳过
+            return max(pos, end)
+        # JSON字符串中不会出现换行，在换行处重新同步
+        self._depth = 0
+        self._in_string = False
+        self._discarding = False
+        return newline + 1
+
+    def _take(self, end: int) -> Optional[bytes]:
+        """取出[_frame_start, end)作为一帧"""
+        self._depth = 0
+        self._in_string = False
+        if end - self._frame_start > self.max_frame_size:
+            frame = None
+        else:
+            frame = bytes(self._buffer[self._frame_start:end])
+        self._frame_start = end
+        return frame
+
+    def reset(self):
+        """清空缓冲区和解析状态"""
+        self._buffer.clear()
+        self._pos = 0
+        self._frame_start = 0
+        self._depth = 0
+        self._in_string = False
+        self._discarding = False
@@ -0,0 +1,146 @@
+"""
+日志管道 - 后台线程写文件，按大小轮转，高频日志限速
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from typing import Dict, Tuple
+
+from config.server_config import ServerConfig
+
+# 日志目录：ServerConfig.LOG_DIR为相对路径时相对于项目根目录
+LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ServerConfig.LOG_DIR)
+
+# 高频日志调用处传入 extra=RATE_LIMITED，由RateLimitFilter按模板限速
+RATE_LIMITED = {"rate_limit": True}
+
+_listeners: Dict[str, logging.handlers.QueueListener] = {}
+_listeners_lock = threading.Lock()
+
+
+class RateLimitFilter(logging.Filter):
+    """按日志模板限速的过滤器（令牌桶）
+
+    只对调用处显式标记的INFO及以下日志生效（extra=RATE_LIMITED，如心跳和请求日志），
+    同一模板每秒最多rate条、突发最多burst条，超出的丢弃并计数，下一条放行的日志附带省略的条数。
+    未标记的日志（任务分配、完成等审计日志）和WARNING及以上的日志从不丢弃。
+    """
+
+    MAX_KEYS = 1000  # 最多跟踪的模板数
+
+    def __init__(self, rate: float, burst: int):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[Tuple[str, str], list] = {}  # (logger名, 模板) -> [令牌数, 上次更新时间, 省略条数]
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "rate_limit", False) or record.levelno > logging.INFO or self.rate <= 0:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.MAX_KEYS:
+                    self._buckets.clear()
+                bucket = self._buckets[key] = [float(self.burst), now, 0]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] < 1:
+                bucket[2] += 1
+                self.suppressed += 1
+                return False
+            bucket[0] -= 1
+            skipped, bucket[2] = bucket[2], 0
+
+        if skipped:
+            record.msg = f"{record.msg}（已省略 {skipped} 条同类日志）"
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """只把日志记录放入队列，格式化和写文件都在后台线程完成
+
+    标准QueueHandler在调用线程里格式化消息，这里直接入队原始记录；队列满时丢弃并计数，不阻塞调用线程。
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logger(name: str, filename: str) -> logging.Logger:
+    """创建只写文件的日志记录器：调用线程只入队，后台线程写入按大小轮转的日志文件"""
+    logger = logging.getLogger(name)
+    logger.setLevel(getattr(logging, ServerConfig.LOG_LEVEL.upper(), logging.INFO))
+    # 只输出到文件，不传递给根日志记录器
+    logger.propagate = False
+
+    # 避免重复添加处理器
+    if logger.handlers:
+        return logger
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(LOG_DIR, filename),
+        maxBytes=ServerConfig.LOG_MAX_BYTES,
+        backupCount=ServerConfig.LOG_BACKUP_COUNT,
+        encoding="utf-8"
+    )
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    log_queue = queue.Queue(ServerConfig.LOG_QUEUE_SIZE)
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(ServerConfig.LOG_RATE_LIMIT, ServerConfig.LOG_RATE_BURST))
+    logger.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    with _listeners_lock:
+        _listeners[name] = listener
+    return logger
+
+
+def get_logging_stats() -> Dict[str, Dict[str, int]]:
+    """每个日志记录器因队列满丢弃和因限速省略的日志条数"""
+    stats = {}
+    with _listeners_lock:
+        names = list(_listeners)
+    for name in names:
+        for handler in logging.getLogger(name).handlers:
+            if isinstance(handler, DeferredQueueHandler):
+                stats[name] = {
+                    "queued": handler.queue.qsize(),
+                    "dropped": handler.dropped,
+                    "rate_limited": sum(f.suppressed for f in handler.filters if isinstance(f, RateLimitFilter))
+                }
+    return stats
+
+
+@atexit.register
+def _stop_listeners():
+    """进程退出前写完队列中剩余的日志"""
+    with _listeners_lock:
+        listeners = list(_listeners.values())
+        _listeners.clear()
+    for listener in listeners:
+        listener.stop()
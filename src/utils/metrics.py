@@ -0,0 +1,330 @@
+"""
+运行指标 - 计数器、仪表和固定分桶的延迟直方图，按Prometheus文本格式导出
+"""
+import bisect
+import functools
+import inspect
+import math
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple
+
+# 默认的延迟分桶（秒），从100微秒到10秒
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    """指标基类：每组标签值对应一个序列
+
+    记录时只持有本指标的锁，临界区内只有几次字典和整数操作；热路径上直接调用acquire/release，
+    比with语句少两次方法调用。
+    """
+
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[Tuple[str, Tuple[str, ...], Tuple[Any, ...], float]]:
+        """(名称后缀, 标签名, 标签值, 值) 列表"""
+        raise NotImplementedError
+
+    def snapshot(self) -> Any:
+        """JSON格式的当前值"""
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labelvalues, amount: float = 1):
+        values = self._values
+        lock = self._lock
+        lock.acquire()
+        try:
+            values[labelvalues] = values.get(labelvalues, 0) + amount
+        finally:
+            lock.release()
+
+    def get(self, *labelvalues) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [("", self.labelnames, labels, value) for labels, value in items]
+
+    def snapshot(self):
+        with self._lock:
+            if not self.labelnames:
+                return self._values.get((), 0)
+            return {",".join(map(str, labels)): value for labels, value in self._values.items()}
+
+
+class Gauge(_Metric):
+    """可增可减的仪表；指定func时在导出时调用func取值（func返回数值，或 标签值元组 -> 数值 的字典），记录路径没有开销"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 func: Optional[Callable[[], Any]] = None):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self.func = func
+
+    def set(self, value: float, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def inc(self, *labelvalues, amount: float = 1):
+        values = self._values
+        lock = self._lock
+        lock.acquire()
+        try:
+            values[labelvalues] = values.get(labelvalues, 0) + amount
+        finally:
+            lock.release()
+
+    def dec(self, *labelvalues, amount: float = 1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def _current(self) -> Dict[Tuple, float]:
+        if self.func is not None:
+            value = self.func()
+            return dict(value) if isinstance(value, dict) else {(): value}
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        return [("", self.labelnames, labels, value) for labels, value in self._current().items()]
+
+    def snapshot(self):
+        values = self._current()
+        if not self.labelnames:
+            return values.get((), 0)
+        return {",".join(map(str, labels)): value for labels, value in values.items()}
+
+
+class Histogram(_Metric):
+    """固定分桶的直方图：每次记录只做一次二分查找和两次加法"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}  # 标签值 -> [各桶计数（最后一个为+Inf）, 总和]
+
+    def observe(self, value: float, *labelvalues):
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._add_series(labelvalues)
+        counts = series[0]
+        index = bisect.bisect_left(self.buckets, value)
+        lock = self._lock
+        lock.acquire()
+        try:
+            counts[index] += 1
+            series[1] += value
+        finally:
+            lock.release()
+
+    def _add_series(self, labelvalues: Tuple) -> list:
+        with self._lock:
+            return self._series.setdefault(labelvalues, [[0] * (len(self.buckets) + 1), 0.0])
+
+    def time(self, *labelvalues) -> "_Timer":
+        """用with记录代码块的耗时"""
+        return _Timer(self, labelvalues)
+
+    def _copy(self) -> Dict[Tuple, Tuple[List[int], float]]:
+        with self._lock:
+            return {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+
+    def samples(self):
+        result = []
+        bucket_labelnames = self.labelnames + ("le",)
+        for labels, (counts, total) in self._copy().items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                result.append(("_bucket", bucket_labelnames, labels + (_format_value(bound),), cumulative))
+            result.append(("_sum", self.labelnames, labels, total))
+            result.append(("_count", self.labelnames, labels, cumulative))
+        return result
+
+    @staticmethod
+    def _quantile(bounds: Sequence[float], counts: Sequence[int], total: int, q: float) -> Optional[float]:
+        """按分桶估算分位数（取所在桶的上界），落在+Inf桶时返回最大的有限上界"""
+        if not total:
+            return None
+        rank = q * total
+        cumulative = 0
+        for bound, count in zip(bounds, counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return bounds[-1]
+
+    def snapshot(self):
+        result = {}
+        for labels, (counts, total) in self._copy().items():
+            count = sum(counts)
+            result[",".join(map(str, labels))] = {
+                "count": count,
+                "sum": round(total, 6),
+                "avg": round(total / count, 6) if count else None,
+                "p50_le": self._quantile(self.buckets, counts, count, 0.5),
+                "p99_le": self._quantile(self.buckets, counts, count, 0.99)
+            }
+        return result if self.labelnames else result.get("", {"count": 0})
+
+
+class _Timer:
+    __slots__ = ("histogram", "labelvalues", "start")
+
+    def __init__(self, histogram: Histogram, labelvalues: Tuple):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+
+
+class MetricsRegistry:
+    """指标注册表，同名指标只创建一次（多个服务器实例共用）"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指标 {name} 已注册为 {metric.type}")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (),
+              func: Optional[Callable[[], Any]] = None) -> Gauge:
+        """创建仪表；指定func时替换已有的取值函数（以最后创建的服务器实例为准）"""
+        gauge = self._get_or_create(Gauge, name, help, labelnames)
+        if func is not None:
+            gauge.func = func
+        return gauge
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets)
+
+    def render(self) -> str:
+        """Prometheus文本格式（text/plain; version=0.0.4）"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception:
+                # 取值函数出错时跳过该指标，不影响其他指标
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labelnames, labelvalues, value in samples:
+                lines.append(f"{metric.name}{suffix}{_format_labels(labelnames, labelvalues)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """所有指标的当前值（JSON格式，直方图给出次数、总和、平均值和按分桶估算的p50/p99上界）"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        result = {}
+        for metric in metrics:
+            try:
+                result[metric.name] = metric.snapshot()
+            except Exception as e:
+                result[metric.name] = {"error": str(e)}
+        return result
+
+
+# 默认注册表
+REGISTRY = MetricsRegistry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def timed(histogram: Histogram, counter: Optional[Counter] = None, label: Optional[str] = None):
+    """装饰器：记录函数（同步或协程）的调用次数和耗时，label默认为函数名
+
+    counter的标签为 (label, 结果)，结果为ok或error。
+    """
+    def decorator(func):
+        name = label or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                outcome = "error"
+                try:
+                    result = await func(*args, **kwargs)
+                    outcome = "ok"
+                    return result
+                finally:
+                    histogram.observe(time.perf_counter() - start, name)
+                    if counter is not None:
+                        counter.inc(name, outcome)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = func(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                histogram.observe(time.perf_counter() - start, name)
+                if counter is not None:
+                    counter.inc(name, outcome)
+        return wrapper
+
+    return decorator
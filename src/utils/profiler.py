@@ -0,0 +1,250 @@
+"""
+按需性能分析 - 在运行中的进程里对所有线程（心跳、HTTP、MCP）采样或运行cProfile，不需要重启服务器
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+from config.server_config import ServerConfig
+
+# 采样时每个线程最多记录的栈深度
+MAX_STACK_DEPTH = 64
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Session:
+    """一次分析会话"""
+
+    def __init__(self, mode: str, duration: float, interval: float, thread_filter: str):
+        self.mode = mode
+        self.duration = duration
+        self.interval = interval
+        self.thread_filter = thread_filter
+        self.stacks: Counter = Counter()  # (线程名, 代码对象元组（从外到内）) -> 采样次数
+        self.ticks = 0
+        self.sampler_cpu = 0.0
+        self.cprofile: Optional[cProfile.Profile] = None
+        self.started = time.monotonic()
+        self.stopped: Optional[float] = None
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+
+class Profiler:
+    """进程内的性能分析器，同一时间只运行一个会话
+
+    - sample: 后台线程每隔interval通过 sys._current_frames() 记录所有线程的Python调用栈，开销低，
+      结果包含按函数统计的自身/累计采样数和折叠栈（flamegraph.pl / speedscope 可直接读取）
+    - cprofile: 同时运行cProfile（Python 3.12起基于sys.monitoring，覆盖所有线程；多个线程的调用
+      交织在同一个调用栈上，耗时是近似值），额外给出调用次数和耗时，开销较高，只适合短时间使用
+    """
+
+    MODES = ("sample", "cprofile")
+    ACTIONS = ("run", "start", "stop", "status", "threads")
+
+    def __init__(self, max_duration: float = 60, default_interval: float = 0.01):
+        self.max_duration = max_duration
+        self.default_interval = default_interval
+        self._session: Optional[_Session] = None
+        self._lock = threading.Lock()
+
+    def start(self, duration: float, mode: str = "sample", interval: Optional[float] = None,
+              thread_filter: str = "") -> Dict[str, Any]:
+        """开始分析会话，duration秒后自动停止；已有会话在运行时抛出RuntimeError"""
+        if mode not in self.MODES:
+            raise ValueError(f"不支持的分析模式: {mode}，可选: {', '.join(self.MODES)}")
+        if not 0 < duration <= self.max_duration:
+            raise ValueError(f"分析时长必须在0到{self.max_duration}秒之间")
+        interval = interval or self.default_interval
+        if not 0.001 <= interval <= 1:
+            raise ValueError("采样间隔必须在0.001到1秒之间")
+
+        with self._lock:
+            if self._session is not None and self._session.stopped is None:
+                raise RuntimeError("已有分析会话在运行")
+            session = _Session(mode, duration, interval, thread_filter)
+            if mode == "cprofile":
+                # 已有其他分析工具时enable抛出异常，此时还没有登记会话
+                profiler = cProfile.Profile()
+                profiler.enable()
+                session.cprofile = profiler
+            session.thread = threading.Thread(target=self._sample_loop, args=(session,),
+                                              name="ProfilerSampler", daemon=True)
+            try:
+                session.thread.start()
+            except BaseException:
+                if session.cprofile is not None:
+                    session.cprofile.disable()
+                raise
+            # 启动成功后才登记，失败时不会留下一个永远不结束的会话
+            self._session = session
+        return {"mode": mode, "duration": duration, "interval": interval, "thread_filter": thread_filter}
+
+    def stop(self, top: int = 30, max_stacks: int = 200) -> Dict[str, Any]:
+        """停止当前会话（已经自动停止时直接返回结果），没有会话时抛出RuntimeError"""
+        with self._lock:
+            session = self._session
+        if session is None:
+            raise RuntimeError("没有分析会话")
+        session.stop_event.set()
+        session.thread.join()
+        return self._report(session, top, max_stacks)
+
+    def run(self, duration: float, mode: str = "sample", interval: Optional[float] = None,
+            thread_filter: str = "", top: int = 30, max_stacks: int = 200) -> Dict[str, Any]:
+        """分析duration秒并返回结果（阻塞调用线程）"""
+        self.start(duration, mode, interval, thread_filter)
+        session = self._session
+        session.thread.join()
+        return self._report(session, top, max_stacks)
+
+    def execute(self, action: str = "run", seconds: float = 5, mode: str = "sample", interval: Optional[float] = None,
+                thread_filter: str = "", top: int = 30, max_stacks: int = 200) -> Dict[str, Any]:
+        """按action执行（profile工具和 /admin/profile 共用）：run 分析seconds秒后返回结果，start 开始后立即返回，
+        stop 提前停止并返回结果，status 查看会话状态，threads 当前线程和调用栈"""
+        if action == "run":
+            return self.run(seconds, mode, interval, thread_filter, top, max_stacks)
+        if action == "start":
+            return self.start(seconds, mode, interval, thread_filter)
+        if action == "stop":
+            return self.stop(top, max_stacks)
+        if action == "status":
+            return self.status()
+        if action == "threads":
+            return self.threads()
+        raise ValueError(f"不支持的操作: {action}，可选: {', '.join(self.ACTIONS)}")
+
+    def status(self) -> Dict[str, Any]:
+        """当前会话的状态"""
+        session = self._session
+        if session is None:
+            return {"running": False}
+        end = session.stopped if session.stopped is not None else time.monotonic()
+        return {"running": session.stopped is None, "mode": session.mode, "elapsed": round(end - session.started, 3),
+                "duration": session.duration, "ticks": session.ticks}
+
+    def _sample_loop(self, session: _Session):
+        """采样线程：记录除自身以外所有线程的调用栈，到时或stop时结束会话"""
+        own = threading.get_ident()
+        names: Dict[int, str] = {}
+        names_refreshed = 0.0
+        deadline = session.started + session.duration
+        cpu_start = time.thread_time()
+        try:
+            while not session.stop_event.wait(session.interval):
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                # 线程名每秒刷新一次，新线程在刷新前以ident命名
+                if now - names_refreshed >= 1:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    names_refreshed = now
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    name = names.get(ident) or f"Thread-{ident}"
+                    if session.thread_filter and session.thread_filter not in name:
+                        continue
+                    codes = []
+                    while frame is not None and len(codes) < MAX_STACK_DEPTH:
+                        codes.append(frame.f_code)
+                        frame = frame.f_back
+                    codes.reverse()
+                    session.stacks[(name, tuple(codes))] += 1
+                session.ticks += 1
+        finally:
+            if session.cprofile is not None:
+                session.cprofile.disable()
+            session.sampler_cpu = time.thread_time() - cpu_start
+            session.stopped = time.monotonic()
+
+    @staticmethod
+    def _thread_group(name: str) -> str:
+        """折叠栈中的线程名去掉序号（如 Thread-12 (_handle_client)），同类线程合并"""
+        if name.startswith("Thread-") and " " in name:
+            return name.split(" ", 1)[1]
+        return name
+
+    def _report(self, session: _Session, top: int, max_stacks: int) -> Dict[str, Any]:
+        samples = sum(session.stacks.values())
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        collapsed: Counter = Counter()
+        for (name, codes), count in session.stacks.items():
+            labels = [_frame_label(code) for code in codes]
+            if labels:
+                self_counts[labels[-1]] += count
+            for label in set(labels):
+                total_counts[label] += count
+            collapsed[";".join([self._thread_group(name)] + labels)] += count
+
+        def percent(count: int) -> float:
+            return round(count / samples * 100, 2) if samples else 0.0
+
+        functions = [{"function": label, "self": count, "total": total_counts[label],
+                      "self_percent": percent(count), "total_percent": percent(total_counts[label])}
+                     for label, count in self_counts.most_common(top)]
+        stacks = collapsed.most_common(max_stacks)
+        report = {
+            "mode": session.mode,
+            "duration": round(session.stopped - session.started, 3),
+            "interval": session.interval,
+            "ticks": session.ticks,
+            "samples": samples,
+            "sampler_cpu_seconds": round(session.sampler_cpu, 3),
+            "top_functions": functions,
+            "collapsed": [f"{stack} {count}" for stack, count in stacks],
+            "collapsed_truncated": len(collapsed) > len(stacks)
+        }
+        if session.cprofile is not None:
+            report["cprofile"] = self._cprofile_report(session.cprofile, top)
+        return report
+
+    @staticmethod
+    def _cprofile_report(profile: cProfile.Profile, top: int) -> List[Dict[str, Any]]:
+        """按自身耗时排序的前top个函数"""
+        stats = pstats.Stats(profile, stream=io.StringIO())
+        rows: List[Tuple[float, Dict[str, Any]]] = []
+        for (filename, line, function), (_, calls, tottime, cumtime, _) in stats.stats.items():
+            label = function if filename == "~" else f"{function} ({os.path.basename(filename)}:{line})"
+            rows.append((tottime, {"function": label, "calls": calls, "tottime": round(tottime, 6),
+                                   "cumtime": round(cumtime, 6)}))
+        rows.sort(key=lambda row: row[0], reverse=True)
+        return [row for _, row in rows[:top]]
+
+    @staticmethod
+    def threads(max_groups: int = 50) -> Dict[str, Any]:
+        """当前所有线程和调用栈，调用栈相同的线程合并为一组（如大量空闲的连接处理线程）"""
+        frames = sys._current_frames()
+        groups: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+        for thread in threading.enumerate():
+            frame = frames.get(thread.ident)
+            stack = tuple(f"{os.path.basename(entry.filename)}:{entry.lineno} in {entry.name}"
+                          for entry in traceback.extract_stack(frame)) if frame is not None else ()
+            group = groups.get(stack)
+            if group is None:
+                group = groups[stack] = {"count": 0, "threads": [], "stack": list(stack)}
+            group["count"] += 1
+            if len(group["threads"]) < 10:
+                group["threads"].append({"name": thread.name, "ident": thread.ident,
+                                         "native_id": thread.native_id, "daemon": thread.daemon})
+        ordered = sorted(groups.values(), key=lambda group: group["count"], reverse=True)
+        return {
+            "thread_count": threading.active_count(),
+            "groups": ordered[:max_groups],
+            "groups_truncated": len(ordered) > max_groups
+        }
+
+
+# 进程内共用的分析器（MCP工具和HTTP接口）
+PROFILER = Profiler(ServerConfig.PROFILE_MAX_SECONDS, ServerConfig.PROFILE_SAMPLE_INTERVAL)
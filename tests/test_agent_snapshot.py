@@ -0,0 +1,83 @@
+"""
+agent状态快照测试：增量读取、返回的条目只读且不受后续变化影响、按需计算心跳间隔
+"""
+import copy
+import json
+import os
+import sys
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, ROOT)
+
+from server.agent_snapshot import AgentStatusSnapshot
+from server.agent_state import AgentState, SystemInfo
+
+SYSTEM_INFO = {"type": "system_info", "machine_name": "host", "os_version": "Linux", "cpu_usage": 10.0,
+               "memory_total": 100, "memory_used": 50, "disk_total": 200, "disk_used": 20,
+               "network_upload": 1.0, "network_download": 2.0}
+
+
+def make_state(client_id, port=1000):
+    return AgentState(client_id, ("127.0.0.1", port), last_heartbeat=time.monotonic(),
+                      system_info=SystemInfo.from_dict(SYSTEM_INFO))
+
+
+class AgentStatusSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.snapshot = AgentStatusSnapshot()
+        self.states = [make_state(f"a{i}", 1000 + i) for i in range(3)]
+        for state in self.states:
+            self.snapshot.touch(state)
+
+    def test_delta_read_returns_changed_and_removed_agents(self):
+        version = self.snapshot.read()["version"]
+        self.states[1].status = "late"
+        self.snapshot.touch(self.states[1])
+        self.snapshot.remove("a2")
+
+        delta = self.snapshot.read(version)
+        self.assertFalse(delta["full"])
+        self.assertEqual(list(delta["agents"]), ["a1"])
+        self.assertEqual(delta["agents"]["a1"]["status"], "late")
+        self.assertEqual(delta["removed"], ["a2"])
+        self.assertEqual(delta["status_counts"], {"active": 1, "late": 1})
+
+    def test_entries_are_read_only(self):
+        agent = self.snapshot.read()["agents"]["a0"]
+        with self.assertRaises(TypeError):
+            agent["status"] = "dead"
+        with self.assertRaises(TypeError):
+            agent["system_info"]["memory"]["used"] = 0
+        with self.assertRaises(TypeError):
+            agent["system_info"].update(cpu_usage=0)
+        # 复制后可以修改，缓存不受影响
+        agent = copy.deepcopy(agent)
+        agent["system_info"]["memory"]["used"] = 0
+        self.assertEqual(self.snapshot.read()["agents"]["a0"]["system_info"]["memory"]["used"], 50)
+
+    def test_returned_entries_do_not_change_after_heartbeat(self):
+        before = self.snapshot.read()["agents"]["a0"]
+        last_heartbeat = before["last_heartbeat"]
+        self.states[0].last_heartbeat += 5
+        after = self.snapshot.read()["agents"]["a0"]
+        self.assertNotEqual(after["last_heartbeat"], last_heartbeat)
+        self.assertEqual(before["last_heartbeat"], last_heartbeat)
+
+    def test_seconds_since_heartbeat_only_when_requested(self):
+        self.assertNotIn("seconds_since_heartbeat", self.snapshot.read()["agents"]["a0"])
+        self.states[0].last_heartbeat = time.monotonic() - 30
+        agent = self.snapshot.read(with_age=True)["agents"]["a0"]
+        self.assertAlmostEqual(agent["seconds_since_heartbeat"], 30, delta=1)
+        agent["extra"] = True
+        self.assertNotIn("extra", self.snapshot.read()["agents"]["a0"])
+
+    def test_entries_serialize_as_json(self):
+        agent = json.loads(json.dumps(self.snapshot.read()["agents"]["a0"]))
+        self.assertEqual(agent["system_info"]["memory"]["usage_percent"], 50.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+批量领取和批量提交结果测试（/worker2/command?max=N、/worker2/results）
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, ROOT)
+# 日志写入临时目录，不写入仓库
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="mcp-test-logs-"))
+
+from server.http_server import HTTPServer
+
+
+class BatchDispatchTest(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(dispatch_mode="concurrent", max_tasks_per_worker=3)
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_batch_claim_respects_worker_slots(self):
+        task_ids = self.server.add_tasks([f"job-{i}" for i in range(5)])
+        claimed = self.server._claim_tasks("w1", max_count=10)
+        self.assertEqual([task["task_id"] for task in claimed], task_ids[:3])
+        # worker已满时不再分配
+        self.assertEqual(self.server._claim_tasks("w1", max_count=10), [])
+        self.assertEqual([task["task_id"] for task in self.server._claim_tasks("w2", max_count=10)], task_ids[3:])
+
+    def test_batch_claim_via_worker_command(self):
+        self.server.add_tasks(["a", "b"])
+        response, status = self.server.handle_worker_command({"worker_id": "w1", "max": "5"}, "127.0.0.1")
+        self.assertEqual(status, 200)
+        self.assertEqual([task["command"] for task in response["data"]["tasks"]], ["a", "b"])
+
+    def test_batch_results(self):
+        task_ids = self.server.add_tasks(["a", "b"])
+        self.server._claim_tasks("w1", max_count=2)
+        response, status = self.server.handle_worker_results({"results": [
+            {"task_id": task_ids[0], "command_result": "ok-a"},
+            {"task_id": task_ids[1], "command_result": "ok-b"},
+            {"task_id": 999, "command_result": "x"}
+        ]})
+        self.assertEqual(status, 200)
+        self.assertEqual(response["data"], {"completed": task_ids, "not_found": [999]})
+        self.assertEqual(self.server.get_task_result(task_ids[1])["result"], "ok-b")
+        # 已完成的任务再次提交视为不存在
+        self.assertEqual(self.server.complete_tasks([{"task_id": task_ids[0]}])["not_found"], [task_ids[0]])
+
+    def test_invalid_task_id_rejects_whole_batch(self):
+        task_id = self.server.add_task("a")
+        self.server._claim_tasks("w1")
+        for bad in (float(task_id), True, str(task_id), None):
+            response, status = self.server.handle_worker_results({"results": [
+                {"task_id": task_id, "command_result": "ok"},
+                {"task_id": bad, "command_result": "ok"}
+            ]})
+            self.assertEqual(status, 400, bad)
+        response, status = self.server.handle_worker_results({"results": ["not-an-object"]})
+        self.assertEqual(status, 400)
+        # 整批被拒绝，任务仍在进行中
+        self.assertEqual(self.server.get_task_result(task_id)["status"], "running")
+
+    def test_missing_results(self):
+        self.assertEqual(self.server.handle_worker_results({})[1], 400)
+        self.assertEqual(self.server.handle_worker_results([])[1], 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+专属队列和广播测试：指定target的任务只发给该agent，广播为每个agent创建子任务
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, ROOT)
+# 日志写入临时目录，不写入仓库
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="mcp-test-logs-"))
+
+from server.http_server import HTTPServer
+
+
+def claimed_ids(tasks):
+    return [task["task_id"] for task in tasks]
+
+
+class BroadcastTest(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(dispatch_mode="concurrent", max_tasks_per_worker=10)
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_targeted_task_goes_only_to_its_agent(self):
+        task_id = self.server.add_task("echo", target="a1")
+        self.assertEqual(self.server._claim_tasks("a2", max_count=10), [])
+        self.assertEqual(claimed_ids(self.server._claim_tasks("a1", max_count=10)), [task_id])
+        self.assertEqual(self.server.agent_queues, {})
+
+    def test_broadcast_fans_out_one_task_per_agent(self):
+        shared_id = self.server.add_task("shared")
+        result = self.server.broadcast_task("uptime", ["a1", "a2", "a1", ""])
+        task_ids = result["task_ids"]
+        self.assertEqual(list(task_ids), ["a1", "a2"])
+
+        # 每个agent领取到自己的子任务，共享任务只被领取一次
+        self.assertEqual(sorted(claimed_ids(self.server._claim_tasks("a1", max_count=10))),
+                         sorted([shared_id, task_ids["a1"]]))
+        self.assertEqual(claimed_ids(self.server._claim_tasks("a2", max_count=10)), [task_ids["a2"]])
+        self.assertEqual(self.server._claim_tasks("a3", max_count=10), [])
+
+        self.server.complete_tasks([{"task_id": task_ids["a1"], "command_result": "up 1 day"}])
+        status = self.server.get_broadcast_status(result["broadcast_id"])
+        self.assertEqual(status["total"], 2)
+        self.assertEqual(status["status_counts"], {"completed": 1, "running": 1})
+        self.assertEqual(status["results"]["a1"]["result"], "up 1 day")
+        self.assertEqual(self.server.get_task_result(task_ids["a1"])["broadcast_id"], result["broadcast_id"])
+
+    def test_broadcast_defaults_to_active_workers(self):
+        self.server._claim_tasks("a1")
+        self.server._claim_tasks("a2")
+        result = self.server.broadcast_task("uptime")
+        self.assertEqual(sorted(result["task_ids"]), ["a1", "a2"])
+
+    def test_broadcast_without_agents(self):
+        with self.assertRaises(ValueError):
+            self.server.broadcast_task("uptime")
+        with self.assertRaises(ValueError):
+            self.server.broadcast_task("uptime", [])
+        self.assertIsNone(self.server.get_broadcast_status(12345))
+
+
+if __name__ == "__main__":
+    unittest.main()
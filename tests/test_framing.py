@@ -0,0 +1,39 @@
+"""
+FrameDecoder分帧测试
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from utils.framing import FrameDecoder
+
+
+class FrameDecoderTest(unittest.TestCase):
+    def test_split_and_concatenated_frames(self):
+        decoder = FrameDecoder(100)
+        self.assertEqual(decoder.feed(b'{"a":"}{"'), [])
+        self.assertEqual(decoder.feed(b'}{"b":2}\n{"c"'), [b'{"a":"}{"}', b'{"b":2}'])
+        self.assertEqual(decoder.feed(b':3}'), [b'{"c":3}'])
+
+    def test_oversize_frame_split_across_feeds(self):
+        # 超长帧的剩余部分不能被当成新的输入解析
+        decoder = FrameDecoder(100)
+        self.assertEqual(decoder.feed(b'{"e":"' + b"y" * 150), [None])
+        self.assertEqual(decoder.feed(b'"}{"f":1}'), [b'{"f":1}'])
+
+    def test_oversize_frame_with_braces_and_escapes_in_strings(self):
+        decoder = FrameDecoder(100)
+        self.assertEqual(decoder.feed(b'{"e":{"x":"' + b"y" * 150 + b'\\'), [None])
+        self.assertEqual(decoder.feed(b'"}{\\\\"}'), [])
+        self.assertEqual(decoder.feed(b'}{"f":1}'), [b'{"f":1}'])
+
+    def test_oversize_frame_resyncs_at_newline(self):
+        decoder = FrameDecoder(100)
+        self.assertEqual(decoder.feed(b'{"e":"' + b"y" * 150), [None])
+        self.assertEqual(decoder.feed(b'yyy\n{"f":1}\n'), [b'{"f":1}'])
+
+
+if __name__ == "__main__":
+    unittest.main()
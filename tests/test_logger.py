@@ -0,0 +1,56 @@
+"""
+日志限速测试：只有标记为高频的日志被限速，任务审计日志从不丢弃
+"""
+import logging
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, ROOT)
+# 日志写入临时目录，不写入仓库
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="mcp-test-logs-"))
+
+from utils.logger import RateLimitFilter, RATE_LIMITED
+
+
+def make_record(msg, *args, level=logging.INFO, extra=None):
+    record = logging.LogRecord("HTTPServer", level, __file__, 0, msg, args, None)
+    record.__dict__.update(extra or {})
+    return record
+
+
+class RateLimitFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.filter = RateLimitFilter(rate=0.001, burst=2)
+
+    def passed(self, *args, **kwargs):
+        return sum(self.filter.filter(make_record(*args, **kwargs)) for _ in range(10))
+
+    def test_unmarked_records_are_never_dropped(self):
+        self.assertEqual(self.passed("任务 %d 完成: %s -> %s", 1, "echo", "ok"), 10)
+        self.assertEqual(self.passed("批量分配 %d 个任务给 %s: %s", 2, "w1", [1, 2]), 10)
+        self.assertEqual(self.filter.suppressed, 0)
+
+    def test_marked_records_are_limited_per_template(self):
+        self.assertEqual(self.passed("请求: %s %s", "GET", "/worker2/command", extra=RATE_LIMITED), 2)
+        self.assertEqual(self.passed("收到心跳 - 客户端: %s", "a1", extra=RATE_LIMITED), 2)
+        self.assertEqual(self.filter.suppressed, 16)
+
+    def test_marked_warnings_are_not_limited(self):
+        self.assertEqual(self.passed("请求: %s", "GET", level=logging.WARNING, extra=RATE_LIMITED), 10)
+
+    def test_next_record_reports_skipped_count(self):
+        self.filter = RateLimitFilter(rate=1000, burst=1)
+        self.filter.filter(make_record("请求: %s", "GET", extra=RATE_LIMITED))
+        self.assertFalse(self.filter.filter(make_record("请求: %s", "GET", extra=RATE_LIMITED)))
+        self.filter._buckets[("HTTPServer", "请求: %s")][0] = 1
+        record = make_record("请求: %s", "GET", extra=RATE_LIMITED)
+        self.assertTrue(self.filter.filter(record))
+        self.assertIn("已省略 1 条", record.getMessage())
+
+
+if __name__ == "__main__":
+    unittest.main()
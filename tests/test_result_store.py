@@ -0,0 +1,72 @@
+"""
+TaskResultStore测试：按条数/字节数的LRU淘汰、TTL过期、超长结果截断
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from server.result_store import TaskResultStore
+
+
+def record(task_id, result="ok"):
+    return {"task_id": task_id, "status": "completed", "command": "echo", "result": result}
+
+
+class TaskResultStoreTest(unittest.TestCase):
+    def test_evicts_least_recently_used_over_max_entries(self):
+        store = TaskResultStore(max_entries=2, max_bytes=1 << 20, ttl=60, max_result_bytes=1024)
+        store.put(1, record(1))
+        store.put(2, record(2))
+        store.get(1)  # 1变为最近访问
+        store.put(3, record(3))
+        self.assertIsNotNone(store.get(1))
+        self.assertIsNone(store.get(2))
+        self.assertIsNotNone(store.get(3))
+        self.assertEqual(store.evicted, 1)
+
+    def test_evicts_over_max_bytes(self):
+        size = TaskResultStore.ENTRY_OVERHEAD + len("echo") + 100
+        store = TaskResultStore(max_entries=100, max_bytes=size * 2, ttl=60, max_result_bytes=1024)
+        for task_id in range(1, 4):
+            store.put(task_id, record(task_id, "x" * 100))
+        self.assertEqual(len(store), 2)
+        self.assertIsNone(store.get(1))
+        self.assertEqual(store.total_bytes, size * 2)
+
+    def test_ttl_expiry(self):
+        store = TaskResultStore(max_entries=100, max_bytes=1 << 20, ttl=10, max_result_bytes=1024)
+        with mock.patch("server.result_store.time.monotonic", return_value=1000.0):
+            store.put(1, record(1))
+        with mock.patch("server.result_store.time.monotonic", return_value=1005.0):
+            store.put(2, record(2))
+            self.assertIsNotNone(store.get(1))
+        with mock.patch("server.result_store.time.monotonic", return_value=1011.0):
+            self.assertIsNone(store.get(1))
+            self.assertIsNotNone(store.get(2))
+        # 写入时也淘汰过期的结果
+        with mock.patch("server.result_store.time.monotonic", return_value=1020.0):
+            store.put(3, record(3))
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.get_stats()["evicted"], 2)
+
+    def test_truncates_long_results(self):
+        store = TaskResultStore(max_entries=100, max_bytes=1 << 20, ttl=60, max_result_bytes=8)
+        store.put(1, record(1, "结果结果结果"))  # 每个字符3字节，截断时不留下半个字符
+        stored = store.get(1)
+        self.assertEqual(stored["result"], "结果")
+        self.assertTrue(stored["result_truncated"])
+
+    def test_put_replaces_existing_entry(self):
+        store = TaskResultStore(max_entries=100, max_bytes=1 << 20, ttl=60, max_result_bytes=1024)
+        store.put(1, record(1, "a"))
+        store.put(1, record(1, "bb"))
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.get(1)["result"], "bb")
+        self.assertEqual(store.total_bytes, TaskResultStore.ENTRY_OVERHEAD + len("echo") + 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
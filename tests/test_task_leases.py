@@ -0,0 +1,71 @@
+"""
+任务租约测试：租约到期重新分配、超过max_attempts标记为失败
+"""
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, ROOT)
+# 日志写入临时目录，不写入仓库
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="mcp-test-logs-"))
+
+from server.http_server import HTTPServer
+
+LEASE = 0.05
+
+
+class TaskLeaseTest(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(dispatch_mode="concurrent", max_tasks_per_worker=10,
+                                 lease_timeout=LEASE, max_attempts=2)
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_expired_lease_is_redelivered(self):
+        task_id = self.server.add_task("echo")
+        first = self.server._claim_tasks("w1")
+        self.assertEqual([task["task_id"] for task in first], [task_id])
+        # 租约有效期内不会分配给其他worker
+        self.assertEqual(self.server._claim_tasks("w2"), [])
+
+        time.sleep(LEASE * 2)
+        second = self.server._claim_tasks("w2")
+        self.assertEqual([task["task_id"] for task in second], [task_id])
+        status = self.server.get_task_status()
+        self.assertEqual(status["redelivered_tasks"], 1)
+        self.assertEqual(status["pending_task_details"][task_id]["worker_id"], "w2")
+        self.assertEqual(status["pending_task_details"][task_id]["attempts"], 2)
+
+        self.assertEqual(self.server.complete_tasks([{"task_id": task_id, "command_result": "ok"}]),
+                         {"completed": [task_id], "not_found": []})
+        self.assertEqual(self.server.get_task_result(task_id)["status"], "completed")
+
+    def test_task_fails_after_max_attempts(self):
+        task_id = self.server.add_task("echo")
+        for worker_id in ("w1", "w2"):
+            self.assertEqual(len(self.server._claim_tasks(worker_id)), 1)
+            time.sleep(LEASE * 2)
+
+        self.assertEqual(self.server._claim_tasks("w3"), [])
+        result = self.server.get_task_result(task_id)
+        self.assertEqual(result["status"], "failed")
+        self.assertEqual(result["attempts"], 2)
+        self.assertEqual(self.server.get_task_status()["failed_tasks"], 1)
+
+    def test_completed_task_is_not_redelivered(self):
+        task_id = self.server.add_task("echo")
+        self.server._claim_tasks("w1")
+        self.server.complete_tasks([{"task_id": task_id, "command_result": "ok"}])
+
+        time.sleep(LEASE * 2)
+        self.assertEqual(self.server._claim_tasks("w2"), [])
+        self.assertEqual(self.server.get_task_status()["redelivered_tasks"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+PriorityTaskQueue测试：优先级顺序、有上限的老化、重新入队沿用入队时间
+"""
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, ROOT)
+# 日志写入临时目录，不写入仓库
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="mcp-test-logs-"))
+
+from server.http_server import HTTPServer
+from server.task_queue import PriorityTaskQueue
+
+AGING = 60
+
+
+def make_task(name, priority, waited=0.0):
+    """waited秒之前入队的任务"""
+    task = {"command": name, "priority": priority}
+    if waited:
+        task["_queued_since"] = time.monotonic() - waited
+    return task
+
+
+def drain(queue):
+    return [queue.pop()["command"] for _ in range(len(queue))]
+
+
+class PriorityTaskQueueTest(unittest.TestCase):
+    def test_priority_order_and_fifo_within_level(self):
+        queue = PriorityTaskQueue(AGING)
+        for name, priority in (("n1", "normal"), ("l1", "low"), ("h1", "high"), ("n2", "normal"), ("h2", "high")):
+            queue.push(make_task(name, priority))
+        self.assertEqual(queue.depth_by_priority(), {"high": 2, "normal": 2, "low": 1})
+        self.assertEqual(drain(queue), ["h1", "h2", "n1", "n2", "l1"])
+        self.assertFalse(queue)
+
+    def test_high_task_is_ahead_of_aged_backlog(self):
+        # 大量积压了很久的任务之后入队的内置命令仍然先出队
+        queue = PriorityTaskQueue(AGING)
+        for i in range(1000):
+            queue.push(make_task(f"bulk-{i}", "normal", waited=AGING * 10))
+            queue.push(make_task(f"low-{i}", "low", waited=AGING * 10))
+        queue.push(make_task("status", "high"))
+        self.assertEqual(queue.pop()["command"], "status")
+
+    def test_low_task_ages_up_to_normal(self):
+        queue = PriorityTaskQueue(AGING)
+        queue.push(make_task("n-new", "normal"))
+        queue.push(make_task("l-old", "low", waited=AGING + 1))
+        queue.push(make_task("l-new", "low"))
+        queue.push(make_task("h", "high"))
+        # 等待超过一个老化间隔的low任务与normal任务按入队时间排序，但不会越过high
+        self.assertEqual(drain(queue), ["h", "l-old", "n-new", "l-new"])
+
+    def test_requeued_task_keeps_its_position(self):
+        queue = PriorityTaskQueue(AGING)
+        first = make_task("first", "normal")
+        queue.push(first)
+        queue.push(make_task("second", "normal"))
+        self.assertIs(queue.pop(), first)
+        queue.push(first)
+        self.assertEqual(drain(queue), ["first", "second"])
+
+    def test_peek_key_compares_across_queues(self):
+        shared, agent = PriorityTaskQueue(AGING), PriorityTaskQueue(AGING)
+        self.assertIsNone(shared.peek_key())
+        shared.push(make_task("bulk", "normal", waited=AGING * 10))
+        agent.push(make_task("status", "high"))
+        self.assertLess(agent.peek_key(), shared.peek_key())
+
+
+class ServerPriorityTest(unittest.TestCase):
+    def test_builtin_status_is_dispatched_before_aged_jobs(self):
+        server = HTTPServer(dispatch_mode="concurrent", max_tasks_per_worker=1)
+        try:
+            server.add_tasks(["bulk"] * 100)
+            # 模拟已经排队很久的积压任务
+            for _, _, task in server.task_queue._heaps[1]:
+                task["_queued_since"] -= AGING * 10
+            status_id = server.add_task("status")
+            claimed = server._claim_tasks("w1")
+            self.assertEqual([task["task_id"] for task in claimed], [status_id])
+            self.assertEqual(claimed[0]["priority"], "high")
+        finally:
+            server.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
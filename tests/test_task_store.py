@@ -0,0 +1,114 @@
+"""
+SQLite任务存储测试：组提交落盘、关闭后快速失败、服务重启后恢复未结束的任务
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, ROOT)
+# 日志写入临时目录，不写入仓库
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="mcp-test-logs-"))
+
+from config.server_config import ServerConfig
+from server.http_server import HTTPServer
+from server.task_store import SQLiteTaskStore
+
+
+def make_task(task_id, command="echo"):
+    return {"task_id": task_id, "command": command, "priority": "normal", "attempts": 0}
+
+
+class SQLiteTaskStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="mcp-test-store-")
+        self.path = os.path.join(self.directory, "tasks.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_changes_are_durable_and_reloaded(self):
+        store = SQLiteTaskStore(self.path)
+        store.start()
+        store.enqueue(make_task(1))
+        store.enqueue(dict(make_task(2), metadata={"k": "v"}, target="a1"))
+        store.enqueue(make_task(3))
+        store.claim(dict(make_task(2), attempts=1, worker_id="a1"))
+        store.finish(3)
+        seq = store.set_counter("last_task_id", 3)
+        self.assertTrue(store.wait_durable(seq, 5))
+        store.close()
+
+        store = SQLiteTaskStore(self.path)
+        tasks, counters = store.load()
+        store.close()
+        self.assertEqual(counters, {"last_task_id": 3})
+        self.assertEqual([(task["task_id"], task["state"]) for task in tasks], [(1, "queued"), (2, "running")])
+        self.assertEqual(tasks[1]["metadata"], {"k": "v"})
+        self.assertEqual((tasks[1]["worker_id"], tasks[1]["attempts"], tasks[1]["target"]), ("a1", 1, "a1"))
+
+    def test_wait_durable_fails_fast_after_close(self):
+        store = SQLiteTaskStore(self.path)
+        store.start()
+        store.close()
+        seq = store.enqueue(make_task(1))
+        start = time.monotonic()
+        self.assertFalse(store.wait_durable(seq, 5))
+        self.assertLess(time.monotonic() - start, 1)
+
+
+class TaskRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="mcp-test-store-")
+        patcher = mock.patch.dict(ServerConfig.DB_CONFIG, {"path": os.path.join(self.directory, "heartbeat.db")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def make_server(self, **kwargs):
+        return HTTPServer(dispatch_mode="concurrent", max_tasks_per_worker=10, task_store="sqlite", **kwargs)
+
+    def run_first_server(self):
+        """排队3个任务，领取前两个，完成第二个，然后关闭（close写完领取和完成记录）"""
+        server = self.make_server()
+        task_ids = server.add_tasks(["a", "b", "c"])
+        server._claim_tasks("w1", max_count=2)
+        server.complete_tasks([{"task_id": task_ids[1], "command_result": "ok"}])
+        server.close()
+        return task_ids
+
+    def test_unfinished_tasks_are_recovered(self):
+        task_ids = self.run_first_server()
+
+        server = self.make_server()
+        try:
+            status = server.get_task_status()
+            self.assertEqual(status["queue_size"], 2)
+            self.assertEqual(status["redelivered_tasks"], 1)
+            claimed = server._claim_tasks("w2", max_count=10)
+            # 完成的任务不会再次下发；进行中的任务重新入队，分配次数累加
+            self.assertEqual(sorted(task["task_id"] for task in claimed), [task_ids[0], task_ids[2]])
+            self.assertEqual(server.get_task_status()["pending_task_details"][task_ids[0]]["attempts"], 2)
+            # 任务ID在重启后继续递增
+            self.assertEqual(server.add_task("d"), task_ids[-1] + 1)
+        finally:
+            server.close()
+
+    def test_running_task_over_max_attempts_fails_on_recovery(self):
+        task_ids = self.run_first_server()
+
+        server = self.make_server(max_attempts=1)
+        try:
+            self.assertEqual(server.get_task_result(task_ids[0])["status"], "failed")
+            self.assertEqual([task["task_id"] for task in server._claim_tasks("w2", max_count=10)], [task_ids[2]])
+        finally:
+            server.close()
+
+
+if __name__ == "__main__":
+    unittest.main()